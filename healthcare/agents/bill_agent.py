@@ -1,36 +1,103 @@
 # agents/bill_agent.py
-from ..ai_client import LLMClient # Note the '..'
-from ..schemas import BillData # Note the '..'
-from typing import Dict, Any
+from pydantic import ValidationError
+from ai_client import LLMClient
+from rule_extractors import RuleBasedExtractor, bill_extractor, normalize_llm_values
+from schemas import BillData
+from metrics import timed_stage
+from llm_resilience import ProviderDegradedError
+from model_cascade import ModelCascade, check_extraction
+from text_preprocessor import TextPreprocessor, bill_preprocessor
+from typing import Dict, Any, List, Optional
+
+# JSON schema for each field the LLM may be asked for
+BILL_FIELD_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    "hospital_name": {"type": "string", "description": "Name of the hospital."},
+    "total_amount": {"type": "number", "description": "Total amount of the bill."},
+    "date_of_service": {"type": "string", "format": "date", "description": "Date of service in YYYY-MM-DD format."},
+}
+
+BILL_FIELD_LABELS: Dict[str, str] = {
+    "hospital_name": "Hospital Name",
+    "total_amount": "Total Amount",
+    "date_of_service": "Date of Service (in YYYY-MM-DD format)",
+}
 
 class BillAgent:
     """
-    Agent responsible for extracting structured data from medical bill text using an LLM.
+    Agent responsible for extracting structured data from medical bill text.
+    Rule-based extractors run first; the LLM is asked only for the fields they did not find
+    with at least `rule_confidence_threshold` confidence, on text compacted by `text_preprocessor`.
+    `model_cascade` escalates to a stronger model when the answer is invalid, leaves required
+    fields empty or contradicts the rules.
     """
-    def __init__(self, llm_client: LLMClient):
+    def __init__(
+        self,
+        llm_client: LLMClient,
+        rule_extractor: Optional[RuleBasedExtractor] = None,
+        rule_confidence_threshold: float = 0.7,
+        text_preprocessor: Optional[TextPreprocessor] = None,
+        model_cascade: Optional[ModelCascade] = None,
+    ):
         self.llm_client = llm_client
+        self.rule_extractor = rule_extractor if rule_extractor is not None else bill_extractor()
+        self.rule_confidence_threshold = rule_confidence_threshold
+        # Rules see the full text; only the LLM prompt gets the compacted, budgeted text
+        self.text_preprocessor = text_preprocessor if text_preprocessor is not None else bill_preprocessor()
+        # Models to try, cheapest first; a single model means no escalation
+        self.model_cascade = model_cascade if model_cascade is not None else ModelCascade("bill", [llm_client.model_name])
+        self.stats = {"rules_only": 0, "llm_calls": 0, "llm_fields": 0}
 
+    @timed_stage("bill_extraction")
     async def process(self, bill_text: str) -> BillData:
         """
-        Extracts specific fields from the bill text and structures them into a BillData object.
+        Extracts specific fields from the medical bill text and structures them into a BillData object.
+        """
+        candidates = self.rule_extractor.extract(bill_text)
+        values: Dict[str, Any] = {
+            field: candidate.value for field, candidate in candidates.items()
+            if candidate.confidence >= self.rule_confidence_threshold
+        }
+        missing = [field for field in BILL_FIELD_SCHEMAS if field not in values]
+        if not missing:
+            self.stats["rules_only"] += 1
+            return BillData(**values)
+
+        self.stats["llm_calls"] += 1
+        self.stats["llm_fields"] += len(missing)
+        prompt_text = self.text_preprocessor.compact(bill_text).text
+        extracted_data = await self.model_cascade.run(
+            lambda model: self._extract_with_llm(prompt_text, missing, model),
+            lambda data: check_extraction(
+                BillData, data, values, candidates, self.model_cascade.rule_agreement_confidence
+            ),
+        )
+        for field in missing:
+            if extracted_data.get(field) is not None:
+                values[field] = extracted_data[field]
+            elif field in candidates:
+                # Better a low-confidence rule match than nothing
+                values[field] = candidates[field].value
+        return BillData(**values)
+
+    @timed_stage("bill_extraction_llm")
+    async def _extract_with_llm(self, bill_text: str, fields: List[str], model_name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Asks the LLM (`model_name`, or the client's model) for just the given fields, given the
+        compacted text, with dates and amounts normalised like the rules' values. Returns an
+        empty dict on failure.
         """
         # Define the JSON schema for the desired output
-        bill_schema = {
+        schema = {
             "type": "object",
-            "properties": {
-                "hospital_name": {"type": "string", "description": "Name of the hospital."},
-                "total_amount": {"type": "number", "description": "Total amount of the bill."},
-                "date_of_service": {"type": "string", "format": "date", "description": "Date of service in YYYY-MM-DD format."}
-            },
-            "required": ["hospital_name", "total_amount", "date_of_service"],
-            "propertyOrdering": ["hospital_name", "total_amount", "date_of_service"]
+            "properties": {field: BILL_FIELD_SCHEMAS[field] for field in fields},
+            "required": fields,
+            "propertyOrdering": fields
         }
+        field_list = "\n".join(f"        - {BILL_FIELD_LABELS[field]}" for field in fields)
 
         prompt = f"""
         Extract the following information from the provided medical bill text and return it as a JSON object:
-        - Hospital Name
-        - Total Amount
-        - Date of Service (in YYYY-MM-DD format)
+{field_list}
 
         If a field is not found, use null.
 
@@ -38,19 +105,15 @@ class BillAgent:
         {bill_text}
         """
         try:
-            extracted_data = await self.llm_client.generate_structured_json(prompt, bill_schema)
-            return BillData(**extracted_data)
+            extracted_data = await self.llm_client.generate_structured_json(prompt, schema, model_name=model_name)
+            extracted_data = normalize_llm_values(extracted_data)
+            BillData(**extracted_data)
+            return extracted_data
+        except ProviderDegradedError:
+            raise
         except ValidationError as e:
             print(f"Validation error for BillData: {e}")
-            return BillData(
-                hospital_name=None,
-                total_amount=None,
-                date_of_service=None
-            )
+            return {}
         except Exception as e:
             print(f"Error processing bill with LLM: {e}")
-            return BillData(
-                hospital_name=None,
-                total_amount=None,
-                date_of_service=None
-            )
\ No newline at end of file
+            return {}
@@ -1,16 +1,30 @@
 # agents/claim_decision_agent.py
-from ..schemas import ValidationResult, ClaimDecision # Note the '..'
+from typing import Optional, Sequence
+from schemas import ValidationResult, ClaimDecision, ProcessedDocument
+from metrics import timed_stage
+from llm_resilience import PROVIDER_DEGRADED
 
 class ClaimDecisionAgent:
     """
     Agent responsible for making the final claim decision (approve/reject)
     based on the validation results.
     """
-    async def decide(self, validation_result: ValidationResult) -> ClaimDecision:
+    @timed_stage("decision")
+    async def decide(
+        self, validation_result: ValidationResult, processed_documents: Optional[Sequence[ProcessedDocument]] = None
+    ) -> ClaimDecision:
         """
-        Determines the claim status and reason.
+        Determines the claim status and reason. A claim with documents the LLM provider could not
+        process is neither approved nor rejected: its status is provider_degraded.
         """
-        if validation_result.missing_documents or validation_result.discrepancies:
+        failed = [document for document in processed_documents or () if document.error]
+        if failed:
+            status = PROVIDER_DEGRADED
+            reason = (
+                f"The LLM provider is degraded; could not process {', '.join(document.filename for document in failed)}. "
+                f"{failed[0].error} Resubmit the claim later."
+            )
+        elif validation_result.missing_documents or validation_result.discrepancies:
             status = "rejected"
             reasons = []
             if validation_result.missing_documents:
@@ -0,0 +1,196 @@
+# agents/combined_extraction_agent.py
+from typing import Any, Dict, Optional, Tuple
+from pydantic import ValidationError
+from ai_client import LLMClient
+from schemas import DocumentType, BillData, DischargeSummaryData, DocumentSpecificData
+from metrics import timed_stage
+from llm_resilience import ProviderDegradedError
+from model_cascade import ModelCascade, INCONSISTENT, INVALID_OUTPUT, check_extraction
+from rule_extractors import FieldCandidate, RuleBasedExtractor, bill_extractor, discharge_extractor, normalize_llm_values
+from text_preprocessor import TextPreprocessor, combined_preprocessor
+
+# The structured data class for each document type that has fields to extract
+DATA_CLASSES = {DocumentType.BILL: BillData, DocumentType.DISCHARGE_SUMMARY: DischargeSummaryData}
+
+class CombinedExtractionAgent:
+    """
+    Agent that classifies a document and extracts its structured data in a single LLM call.
+    The rule-based extractors run on the full text first: fields they find with at least
+    `rule_confidence_threshold` confidence override the LLM's, and the LLM's other fields are
+    checked against them as in the two-step agents. Returns None when the response is malformed,
+    ambiguous or contradicts the rules so the caller can fall back to the separate
+    classification and extraction steps. `model_cascade` escalates to a stronger model when the
+    response is malformed, leaves required fields empty or contradicts the rules.
+    """
+    def __init__(
+        self,
+        llm_client: LLMClient,
+        text_preprocessor: Optional[TextPreprocessor] = None,
+        model_cascade: Optional[ModelCascade] = None,
+        rule_extractors: Optional[Dict[DocumentType, RuleBasedExtractor]] = None,
+        rule_confidence_threshold: float = 0.7,
+    ):
+        self.llm_client = llm_client
+        self.rule_extractors = rule_extractors if rule_extractors is not None else {
+            DocumentType.BILL: bill_extractor(), DocumentType.DISCHARGE_SUMMARY: discharge_extractor(),
+        }
+        self.rule_confidence_threshold = rule_confidence_threshold
+        self.text_preprocessor = text_preprocessor if text_preprocessor is not None else combined_preprocessor()
+        self.model_cascade = model_cascade if model_cascade is not None else ModelCascade("combined", [llm_client.model_name])
+        self.stats = {"accepted": 0, "fallback": 0}
+
+    def _schema(self) -> Dict[str, Any]:
+        return {
+            "type": "object",
+            "properties": {
+                "document_type": {
+                    "type": "string",
+                    "enum": [dt.value for dt in DocumentType],
+                    "description": "The classified type of the document."
+                },
+                "bill": {
+                    "type": "object",
+                    "nullable": True,
+                    "description": "Only for document_type 'bill'.",
+                    "properties": {
+                        "hospital_name": {"type": "string", "nullable": True, "description": "Name of the hospital."},
+                        "total_amount": {"type": "number", "nullable": True, "description": "Total amount of the bill."},
+                        "date_of_service": {"type": "string", "nullable": True, "description": "Date of service in YYYY-MM-DD format."}
+                    }
+                },
+                "discharge_summary": {
+                    "type": "object",
+                    "nullable": True,
+                    "description": "Only for document_type 'discharge_summary'.",
+                    "properties": {
+                        "patient_name": {"type": "string", "nullable": True, "description": "Name of the patient."},
+                        "diagnosis": {"type": "string", "nullable": True, "description": "Medical diagnosis."},
+                        "admission_date": {"type": "string", "nullable": True, "description": "Date of admission in YYYY-MM-DD format."},
+                        "discharge_date": {"type": "string", "nullable": True, "description": "Date of discharge in YYYY-MM-DD format."}
+                    }
+                }
+            },
+            "required": ["document_type"],
+            "propertyOrdering": ["document_type", "bill", "discharge_summary"]
+        }
+
+    def _parse(self, response: Dict[str, Any]) -> Optional[Tuple[DocumentType, Optional[DocumentSpecificData]]]:
+        """
+        Validates the discriminated response, normalising its dates and amounts like the rules'
+        values. Returns None if it is malformed or ambiguous.
+        """
+        try:
+            doc_type = DocumentType(str(response.get("document_type", "")).strip().lower())
+        except ValueError:
+            print(f"Combined extraction returned an unrecognized document type: {response.get('document_type')}")
+            return None
+
+        bill, discharge = response.get("bill"), response.get("discharge_summary")
+        if bill and discharge:
+            print("Combined extraction returned both bill and discharge summary fields.")
+            return None
+
+        try:
+            if doc_type == DocumentType.BILL:
+                if not isinstance(bill, dict) or discharge:
+                    return None
+                return doc_type, BillData(**normalize_llm_values(bill))
+            if doc_type == DocumentType.DISCHARGE_SUMMARY:
+                if not isinstance(discharge, dict) or bill:
+                    return None
+                return doc_type, DischargeSummaryData(**normalize_llm_values(discharge))
+        except ValidationError as e:
+            print(f"Validation error for combined extraction: {e}")
+            return None
+
+        # id_card / unknown carry no structured data
+        if bill or discharge:
+            return None
+        return doc_type, None
+
+    @timed_stage("combined_extraction")
+    async def process(self, text_content: str, filename: str) -> Optional[Tuple[DocumentType, Optional[DocumentSpecificData]]]:
+        """
+        Classifies the document and extracts the fields for its type in one call.
+        """
+        # Rules see the full text; only the prompt gets the compacted text
+        candidates = {doc_type: extractor.extract(text_content) for doc_type, extractor in self.rule_extractors.items()}
+        text_content = self.text_preprocessor.compact(text_content).text
+        prompt = f"""
+        Classify the following document into one of these types:
+        'bill', 'id_card', 'discharge_summary', 'unknown'.
+
+        Then extract the fields for that type only and return them as a JSON object:
+        - For 'bill', fill "bill" with Hospital Name, Total Amount and Date of Service (in YYYY-MM-DD format).
+        - For 'discharge_summary', fill "discharge_summary" with Patient Name, Diagnosis,
+          Admission Date and Discharge Date (in YYYY-MM-DD format).
+        - For 'id_card' or 'unknown', leave both "bill" and "discharge_summary" null.
+
+        If a field is not found, use null.
+
+        Filename: {filename}
+
+        Document Text:
+        {text_content}
+        """
+        def check(parsed: Optional[Tuple[DocumentType, Optional[DocumentSpecificData]]]) -> Optional[str]:
+            return self._check(parsed, candidates)
+
+        parsed = await self.model_cascade.run(lambda model: self._call(prompt, model), check)
+        if check(parsed) in (INVALID_OUTPUT, INCONSISTENT):
+            self.stats["fallback"] += 1
+            return None
+        self.stats["accepted"] += 1
+        doc_type, data = parsed
+        if data is None:
+            return parsed
+        return doc_type, self._merge(data, candidates.get(doc_type, {}))
+
+    async def _call(self, prompt: str, model_name: Optional[str]) -> Optional[Tuple[DocumentType, Optional[DocumentSpecificData]]]:
+        """
+        Sends the prompt to `model_name` and parses the response; None if it failed or is malformed.
+        """
+        try:
+            response = await self.llm_client.generate_structured_json(prompt, self._schema(), model_name=model_name)
+        except ProviderDegradedError:
+            raise
+        except Exception as e:
+            print(f"Error in combined classification and extraction with LLM: {e}")
+            return None
+        return self._parse(response) if isinstance(response, dict) else None
+
+    def _rule_values(self, candidates: Dict[str, FieldCandidate]) -> Dict[str, Any]:
+        return {
+            field: candidate.value for field, candidate in candidates.items()
+            if candidate.confidence >= self.rule_confidence_threshold
+        }
+
+    def _check(
+        self,
+        parsed: Optional[Tuple[DocumentType, Optional[DocumentSpecificData]]],
+        candidates: Dict[DocumentType, Dict[str, FieldCandidate]],
+    ) -> Optional[str]:
+        if parsed is None:
+            return INVALID_OUTPUT
+        doc_type, data = parsed
+        if data is None:
+            return None
+        type_candidates = candidates.get(doc_type, {})
+        return check_extraction(
+            DATA_CLASSES[doc_type], data.model_dump(), self._rule_values(type_candidates), type_candidates,
+            self.model_cascade.rule_agreement_confidence,
+        )
+
+    def _merge(self, data: DocumentSpecificData, candidates: Dict[str, FieldCandidate]) -> DocumentSpecificData:
+        """
+        Confident rule values win; the LLM fills the rest, then low-confidence rule matches.
+        """
+        values = self._rule_values(candidates)
+        for field, value in data.model_dump().items():
+            if field in values:
+                continue
+            if value is not None:
+                values[field] = value
+            elif field in candidates:
+                values[field] = candidates[field].value
+        return type(data)(**values)
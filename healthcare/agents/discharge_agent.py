@@ -1,38 +1,104 @@
 # agents/discharge_agent.py
-from ..ai_client import LLMClient # Note the '..'
-from ..schemas import DischargeSummaryData # Note the '..'
-from typing import Dict, Any
+from pydantic import ValidationError
+from ai_client import LLMClient
+from rule_extractors import RuleBasedExtractor, discharge_extractor, normalize_llm_values
+from schemas import DischargeSummaryData
+from metrics import timed_stage
+from llm_resilience import ProviderDegradedError
+from model_cascade import ModelCascade, check_extraction
+from text_preprocessor import TextPreprocessor, discharge_preprocessor
+from typing import Dict, Any, List, Optional
+
+# JSON schema for each field the LLM may be asked for
+DISCHARGE_FIELD_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    "patient_name": {"type": "string", "description": "Name of the patient."},
+    "diagnosis": {"type": "string", "description": "Medical diagnosis."},
+    "admission_date": {"type": "string", "format": "date", "description": "Date of admission in YYYY-MM-DD format."},
+    "discharge_date": {"type": "string", "format": "date", "description": "Date of discharge in YYYY-MM-DD format."},
+}
+
+DISCHARGE_FIELD_LABELS: Dict[str, str] = {
+    "patient_name": "Patient Name",
+    "diagnosis": "Diagnosis",
+    "admission_date": "Admission Date (in YYYY-MM-DD format)",
+    "discharge_date": "Discharge Date (in YYYY-MM-DD format)",
+}
 
 class DischargeAgent:
     """
-    Agent responsible for extracting structured data from discharge summary text using an LLM.
+    Agent responsible for extracting structured data from discharge summary text.
+    Rule-based extractors run first; the LLM is asked only for the fields they did not find
+    with at least `rule_confidence_threshold` confidence, on text compacted by `text_preprocessor`.
+    `model_cascade` escalates to a stronger model when the answer is invalid, leaves required
+    fields empty or contradicts the rules.
     """
-    def __init__(self, llm_client: LLMClient):
+    def __init__(
+        self,
+        llm_client: LLMClient,
+        rule_extractor: Optional[RuleBasedExtractor] = None,
+        rule_confidence_threshold: float = 0.7,
+        text_preprocessor: Optional[TextPreprocessor] = None,
+        model_cascade: Optional[ModelCascade] = None,
+    ):
         self.llm_client = llm_client
+        self.rule_extractor = rule_extractor if rule_extractor is not None else discharge_extractor()
+        self.rule_confidence_threshold = rule_confidence_threshold
+        # Rules see the full text; only the LLM prompt gets the compacted, budgeted text
+        self.text_preprocessor = text_preprocessor if text_preprocessor is not None else discharge_preprocessor()
+        # Models to try, cheapest first; a single model means no escalation
+        self.model_cascade = model_cascade if model_cascade is not None else ModelCascade("discharge_summary", [llm_client.model_name])
+        self.stats = {"rules_only": 0, "llm_calls": 0, "llm_fields": 0}
 
+    @timed_stage("discharge_extraction")
     async def process(self, discharge_text: str) -> DischargeSummaryData:
         """
         Extracts specific fields from the discharge summary text and structures them into a DischargeSummaryData object.
         """
+        candidates = self.rule_extractor.extract(discharge_text)
+        values: Dict[str, Any] = {
+            field: candidate.value for field, candidate in candidates.items()
+            if candidate.confidence >= self.rule_confidence_threshold
+        }
+        missing = [field for field in DISCHARGE_FIELD_SCHEMAS if field not in values]
+        if not missing:
+            self.stats["rules_only"] += 1
+            return DischargeSummaryData(**values)
+
+        self.stats["llm_calls"] += 1
+        self.stats["llm_fields"] += len(missing)
+        prompt_text = self.text_preprocessor.compact(discharge_text).text
+        extracted_data = await self.model_cascade.run(
+            lambda model: self._extract_with_llm(prompt_text, missing, model),
+            lambda data: check_extraction(
+                DischargeSummaryData, data, values, candidates, self.model_cascade.rule_agreement_confidence
+            ),
+        )
+        for field in missing:
+            if extracted_data.get(field) is not None:
+                values[field] = extracted_data[field]
+            elif field in candidates:
+                # Better a low-confidence rule match than nothing
+                values[field] = candidates[field].value
+        return DischargeSummaryData(**values)
+
+    @timed_stage("discharge_extraction_llm")
+    async def _extract_with_llm(self, discharge_text: str, fields: List[str], model_name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Asks the LLM (`model_name`, or the client's model) for just the given fields, given the
+        compacted text, with dates normalised like the rules' values. Returns an empty dict on failure.
+        """
         # Define the JSON schema for the desired output
-        discharge_schema = {
+        schema = {
             "type": "object",
-            "properties": {
-                "patient_name": {"type": "string", "description": "Name of the patient."},
-                "diagnosis": {"type": "string", "description": "Medical diagnosis."},
-                "admission_date": {"type": "string", "format": "date", "description": "Date of admission in YYYY-MM-DD format."},
-                "discharge_date": {"type": "string", "format": "date", "description": "Date of discharge in YYYY-MM-DD format."}
-            },
-            "required": ["patient_name", "diagnosis", "admission_date", "discharge_date"],
-            "propertyOrdering": ["patient_name", "diagnosis", "admission_date", "discharge_date"]
+            "properties": {field: DISCHARGE_FIELD_SCHEMAS[field] for field in fields},
+            "required": fields,
+            "propertyOrdering": fields
         }
+        field_list = "\n".join(f"        - {DISCHARGE_FIELD_LABELS[field]}" for field in fields)
 
         prompt = f"""
         Extract the following information from the provided discharge summary text and return it as a JSON object:
-        - Patient Name
-        - Diagnosis
-        - Admission Date (in YYYY-MM-DD format)
-        - Discharge Date (in YYYY-MM-DD format)
+{field_list}
 
         If a field is not found, use null.
 
@@ -40,21 +106,15 @@ class DischargeAgent:
         {discharge_text}
         """
         try:
-            extracted_data = await self.llm_client.generate_structured_json(prompt, discharge_schema)
-            return DischargeSummaryData(**extracted_data)
+            extracted_data = await self.llm_client.generate_structured_json(prompt, schema, model_name=model_name)
+            extracted_data = normalize_llm_values(extracted_data)
+            DischargeSummaryData(**extracted_data)
+            return extracted_data
+        except ProviderDegradedError:
+            raise
         except ValidationError as e:
             print(f"Validation error for DischargeSummaryData: {e}")
-            return DischargeSummaryData(
-                patient_name=None,
-                diagnosis=None,
-                admission_date=None,
-                discharge_date=None
-            )
+            return {}
         except Exception as e:
             print(f"Error processing discharge summary with LLM: {e}")
-            return DischargeSummaryData(
-                patient_name=None,
-                diagnosis=None,
-                admission_date=None,
-                discharge_date=None
-            )
\ No newline at end of file
+            return {}
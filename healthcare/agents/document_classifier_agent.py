@@ -1,20 +1,80 @@
 # agents/document_classifier_agent.py
-from typing import Literal
-from ..ai_client import LLMClient # Note the '..'
-from ..schemas import DocumentType # Note the '..'
+from typing import Literal, Optional, Tuple
+from ai_client import LLMClient
+from local_classifier import LocalDocumentClassifier
+from llm_resilience import ProviderDegradedError
+from llm_scheduler import RequestStage
+from model_cascade import ModelCascade, INVALID_OUTPUT, INCONSISTENT
+from schemas import DocumentType
+from metrics import timed_stage
 
 class DocumentClassifierAgent:
     """
     Agent responsible for classifying the type of a document (e.g., bill, discharge summary)
-    based on its content and filename using an LLM.
+    based on its content and filename. A local keyword classifier decides confident cases
+    in-process; only low-confidence documents are sent to the LLM, through `model_cascade`,
+    which escalates when the answer is unrecognized or contradicts a fairly confident local guess.
     """
-    def __init__(self, llm_client: LLMClient):
+    def __init__(
+        self,
+        llm_client: LLMClient,
+        local_classifier: Optional[LocalDocumentClassifier] = None,
+        confidence_threshold: float = 0.6,
+        model_cascade: Optional[ModelCascade] = None,
+    ):
         self.llm_client = llm_client
+        self.local_classifier = local_classifier if local_classifier is not None else LocalDocumentClassifier()
+        # Set above 1.0 to always use the LLM
+        self.confidence_threshold = confidence_threshold
+        self.model_cascade = model_cascade if model_cascade is not None else ModelCascade("classifier", [llm_client.model_name])
+        self.stats = {"local": 0, "llm_fallback": 0}
 
+    def _classify_locally(self, text_content: str, filename: str) -> Tuple[Optional[DocumentType], DocumentType, float]:
+        """
+        Returns the local decision (None below the confidence threshold), its best guess and confidence.
+        """
+        doc_type, confidence = self.local_classifier.classify(text_content, filename)
+        if confidence >= self.confidence_threshold:
+            self.stats["local"] += 1
+            return doc_type, doc_type, confidence
+        print(f"Local classifier unsure about {filename} ({doc_type.value}, confidence {confidence}).")
+        return None, doc_type, confidence
+
+    def classify_locally(self, text_content: str, filename: str) -> Optional[DocumentType]:
+        """
+        Returns the local classifier's decision, or None if it is below the confidence threshold.
+        """
+        return self._classify_locally(text_content, filename)[0]
+
+    @timed_stage("classification")
     async def classify(self, text_content: str, filename: str) -> DocumentType:
         """
         Classifies the document type.
         """
+        doc_type, guess, confidence = self._classify_locally(text_content, filename)
+        if doc_type is not None:
+            return doc_type
+
+        self.stats["llm_fallback"] += 1
+
+        def check(answer: Optional[DocumentType]) -> Optional[str]:
+            if answer is None:
+                return INVALID_OUTPUT
+            if answer != guess and confidence >= self.model_cascade.rule_agreement_confidence:
+                return INCONSISTENT
+            return None
+
+        answer = await self.model_cascade.run(
+            lambda model: self._classify_with_llm(text_content, filename, model), check
+        )
+        return answer if answer is not None else DocumentType.UNKNOWN
+
+    @timed_stage("classification_llm")
+    async def _classify_with_llm(self, text_content: str, filename: str, model_name: Optional[str] = None) -> Optional[DocumentType]:
+        """
+        Classifies the document type with the LLM (`model_name`, or the client's model).
+        Returns None when the answer is unrecognized or the call fails.
+        """
         prompt = f"""
         Given the following document content and filename, classify the document into one of these types:
         'bill', 'id_card', 'discharge_summary', 'unknown'.
@@ -28,14 +88,18 @@ class DocumentClassifierAgent:
         """
         
         try:
-            classification_str = await self.llm_client.generate_text(prompt)
+            classification_str = await self.llm_client.generate_text(
+                prompt, stage=RequestStage.CLASSIFICATION, model_name=model_name
+            )
             classification_str = classification_str.strip().lower().replace("'", "")
             
             if classification_str in [dt.value for dt in DocumentType]:
                 return DocumentType(classification_str)
             else:
-                print(f"LLM returned an unrecognized document type: {classification_str}. Defaulting to UNKNOWN.")
-                return DocumentType.UNKNOWN
+                print(f"LLM returned an unrecognized document type: {classification_str}.")
+                return None
+        except ProviderDegradedError:
+            raise
         except Exception as e:
             print(f"Error classifying document with LLM: {e}")
-            return DocumentType.UNKNOWN
\ No newline at end of file
+            return None
\ No newline at end of file
@@ -1,20 +1,80 @@
 # agents/text_extraction_agent.py
-from fastapi import UploadFile
-from ..pdf_parser import extract_text_from_pdf # Note the '..'
+from typing import Optional
+from pdf_parser import PAGE_SEPARATOR, LazyPDFDocument, PDFParserPool
+from uploads import SpooledUpload
+from metrics import timed_stage
 
 class TextExtractionAgent:
     """
     Agent responsible for extracting raw text content from PDF files.
     This agent uses a PDF parsing library, not an LLM, for raw text extraction.
+    Parsing runs in a process pool so it does not block the event loop, and pages are
+    parsed lazily so callers only pay for the pages they need. The text it returns joins pages
+    with `pdf_parser.PAGE_SEPARATOR` so the extraction agents can tell pages apart.
     """
-    async def extract(self, pdf_file: UploadFile) -> str:
+    def __init__(
+        self,
+        parser_pool: Optional[PDFParserPool] = None,
+        leading_text_min_chars: int = 500,
+        leading_pages_per_batch: int = 2,
+        max_leading_pages: int = 8,
+    ):
+        self.parser_pool = parser_pool if parser_pool is not None else PDFParserPool()
+        # Classification needs about as much text as the classifier reads; scanned cover pages
+        # carry no text, so keep reading small batches until enough text turns up
+        self.leading_text_min_chars = leading_text_min_chars
+        self.leading_pages_per_batch = leading_pages_per_batch
+        self.max_leading_pages = max_leading_pages
+
+    def open(self, upload: SpooledUpload) -> LazyPDFDocument:
         """
-        Extracts all readable text from the provided PDF file.
+        Opens the spooled upload as a lazy, page-indexed document without reading or parsing
+        any pages; parser workers are handed only its path.
+        """
+        return LazyPDFDocument(upload.path)
+
+    @timed_stage("pdf_parse_leading")
+    async def extract_leading_text(self, document: LazyPDFDocument, filename: str) -> str:
+        """
+        Parses only the first pages of the document, until enough text for classification is found.
         """
         try:
-            file_content = await pdf_file.read()
-            extracted_text = extract_text_from_pdf(file_content)
-            return extracted_text
+            stop = 0
+            while True:
+                stop += self.leading_pages_per_batch
+                await self.parser_pool.load_pages(document, 0, stop)
+                text = document.parsed_text(PAGE_SEPARATOR)
+                if (len(text.strip()) >= self.leading_text_min_chars
+                        or stop >= min(document.page_count, self.max_leading_pages)):
+                    return text
         except Exception as e:
             print(f"Error in TextExtractionAgent: {e}")
-            raise ValueError(f"Failed to extract text from PDF: {pdf_file.filename}. Error: {e}")
\ No newline at end of file
+            raise ValueError(f"Failed to extract text from PDF: {filename}. Error: {e}")
+
+    @timed_stage("pdf_parse_full")
+    async def extract_full_text(self, document: LazyPDFDocument, filename: str) -> str:
+        """
+        Parses every remaining page of the document and returns its full text.
+        """
+        try:
+            await self.parser_pool.load_pages(document)
+            return document.parsed_text(PAGE_SEPARATOR)
+        except Exception as e:
+            print(f"Error in TextExtractionAgent: {e}")
+            raise ValueError(f"Failed to extract text from PDF: {filename}. Error: {e}")
+
+    async def extract(self, upload: SpooledUpload) -> str:
+        """
+        Extracts all readable text from the provided PDF file.
+        """
+        document = self.open(upload)
+        try:
+            return await self.extract_full_text(document, upload.filename)
+        finally:
+            document.close()
+
+    def shutdown(self, wait: bool = False) -> None:
+        """
+        Stops the parser worker processes.
+        """
+        self.parser_pool.shutdown(wait)
@@ -1,12 +1,55 @@
 # agents/validation_agent.py
-from typing import List
-from ..schemas import ProcessedDocument, ValidationResult, DocumentType, BillData, DischargeSummaryData # Note the '..'
+import asyncio
+from typing import List, Optional
+from schemas import (
+    ProcessedDocument, ValidationResult, DocumentType, BillData, DischargeSummaryData,
+    REQUIRED_FIELDS, missing_required_fields,
+)
+from duplicate_index import DuplicateIndex, bill_fingerprints
+from metrics import timed_stage
 
 class ValidationAgent:
     """
     Agent responsible for validating the extracted data and checking for inconsistencies.
+    With a duplicate index, bills are also checked against those of earlier claims.
     """
-    async def validate(self, processed_documents: List[ProcessedDocument]) -> ValidationResult:
+    def __init__(self, duplicate_index: Optional[DuplicateIndex] = None):
+        self.duplicate_index = duplicate_index
+
+    async def _check_duplicates(self, processed_documents: List[ProcessedDocument], claim_id: Optional[str]) -> List[str]:
+        """
+        Reports bills already seen in other claims or uploaded twice in this one, and indexes
+        this claim's bills in the same step. Bills of `claim_id` itself are ignored, so a retried
+        claim is not flagged against its own earlier attempt. Without a `claim_id` nothing is indexed.
+        """
+        # SimHashing a long bill takes milliseconds, and the index may write to SQLite; keep both off the event loop
+        bills = await asyncio.to_thread(bill_fingerprints, processed_documents)
+        matches = await asyncio.to_thread(
+            self.duplicate_index.find_and_add,
+            claim_id, [(document.filename, key, fingerprint) for document, key, fingerprint in bills],
+        )
+        discrepancies = []
+        seen_keys = {}
+        for (document, key, _), bill_matches in zip(bills, matches):
+            if key is not None and key in seen_keys:
+                discrepancies.append(f"Bill {document.filename} duplicates bill {seen_keys[key]} in the same claim.")
+            elif key is not None:
+                seen_keys[key] = document.filename
+            for match in bill_matches:
+                if match.kind == "exact":
+                    discrepancies.append(
+                        f"Bill {document.filename} duplicates bill {match.filename} of claim {match.claim_id} "
+                        f"(same hospital, total amount and date of service)."
+                    )
+                else:
+                    discrepancies.append(
+                        f"Bill {document.filename} is a near-duplicate of bill {match.filename} of claim {match.claim_id} "
+                        f"(text fingerprint {match.distance} bits apart)."
+                    )
+        return discrepancies
+
+    @timed_stage("validation")
+    async def validate(self, processed_documents: List[ProcessedDocument], claim_id: Optional[str] = None) -> ValidationResult:
         """
         Performs validation checks on the processed documents.
         """
@@ -50,14 +93,16 @@ class ValidationAgent:
         # Check for missing critical fields within extracted data
         for doc in processed_documents:
             if doc.type == DocumentType.BILL and isinstance(doc.data, BillData):
-                if not doc.data.hospital_name: discrepancies.append(f"Missing hospital name in bill document: {doc.filename}")
-                if not doc.data.total_amount: discrepancies.append(f"Missing total amount in bill document: {doc.filename}")
-                if not doc.data.date_of_service: discrepancies.append(f"Missing date of service in bill document: {doc.filename}")
+                where = "bill document"
             elif doc.type == DocumentType.DISCHARGE_SUMMARY and isinstance(doc.data, DischargeSummaryData):
-                if not doc.data.patient_name: discrepancies.append(f"Missing patient name in discharge summary: {doc.filename}")
-                if not doc.data.diagnosis: discrepancies.append(f"Missing diagnosis in discharge summary: {doc.filename}")
-                if not doc.data.admission_date: discrepancies.append(f"Missing admission date in discharge summary: {doc.filename}")
-                if not doc.data.discharge_date: discrepancies.append(f"Missing discharge date in discharge summary: {doc.filename}")
+                where = "discharge summary"
+            else:
+                continue
+            for field in missing_required_fields(doc.data):
+                discrepancies.append(f"Missing {REQUIRED_FIELDS[type(doc.data)][field]} in {where}: {doc.filename}")
+
+        if self.duplicate_index is not None:
+            discrepancies.extend(await self._check_duplicates(processed_documents, claim_id))
 
         return ValidationResult(
             missing_documents=list(set(missing_docs)), # Use set to remove duplicates
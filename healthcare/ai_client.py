@@ -1,57 +1,366 @@
 # ai_client.py
 import asyncio
 import json
-import requests
-from typing import Dict, Any, List, Optional
+import time
+import httpx
+from typing import Callable, Dict, Any, Optional
+
+from cache import ResultCache, llm_cache_key
+from metrics import (
+    LLM_CACHE_HITS_TOTAL, LLM_CIRCUIT_STATE, LLM_HEDGED_REQUESTS_TOTAL, LLM_QUEUE_WAIT_SECONDS,
+    LLM_REQUEST_SECONDS, LLM_RETRIES_TOTAL, LLM_TOKENS_TOTAL,
+)
+from llm_resilience import (
+    CircuitBreaker, LatencyTracker, LLMDeadlineExceededError, ProviderDegradedError, backoff_delay, remaining_seconds,
+)
+from llm_scheduler import LLMRequestScheduler, RequestStage, estimate_tokens
+
+try:
+    import h2  # noqa: F401 -- only needed to negotiate HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Provider responses and errors worth another attempt; other 4xx errors are the request's fault
+RETRYABLE_STATUS_CODES = {500, 502, 503, 504}
+RETRYABLE_EXCEPTIONS = (httpx.TransportError, asyncio.TimeoutError)
+_CIRCUIT_STATE_VALUES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+def _min_timeout(*timeouts: Optional[float]) -> Optional[float]:
+    bounded = [timeout for timeout in timeouts if timeout is not None]
+    return max(0.0, min(bounded)) if bounded else None
+
+def _retry_after_seconds(response: httpx.Response, default: float) -> float:
+    try:
+        return max(0.0, float(response.headers.get("retry-after", default)))
+    except ValueError:
+        return default
 
 class LLMClient:
     """
     A client to interact with the Gemini LLM API for text generation and structured JSON output.
+
+    All calls share one keep-alive connection pool (HTTP/2 when the `h2` package is installed).
+    Calls are admitted by an LLMRequestScheduler, which keeps at most `max_in_flight` requests
+    in flight, enforces the optional requests/tokens-per-minute budgets and orders waiting calls
+    by priority; a 429 from the provider pauses the scheduler and the call waits to be retried.
+    Call `aclose()` on shutdown. When a `cache` is given, responses are memoised by
+    (model_name, prompt, schema).
+
+    Each attempt must finish within `request_timeout` and before the claim's deadline
+    (`llm_resilience.deadline_scope`). Timeouts, transport errors and 5xx responses are retried
+    up to `max_retries` times with jittered exponential backoff. With `hedge_percentile` set, an
+    attempt still running after that percentile of recent latencies is duplicated and the first
+    answer wins. Each model gets its own circuit breaker, built by `circuit_breaker_factory`, which
+    fails calls to that model fast while the provider keeps failing it. Calls that cannot be
+    served raise ProviderDegradedError.
     """
-    def __init__(self, model_name: str = "gemini-2.0-flash"):
+    def __init__(
+        self,
+        model_name: str = "gemini-2.0-flash",
+        max_connections: int = 20,
+        max_keepalive_connections: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        request_timeout: Optional[float] = 30.0,
+        cache: Optional[ResultCache] = None,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_rate_limit_retries: int = 5,
+        output_token_allowance: int = 512,
+        api_url_base: Optional[str] = None,
+        max_retries: int = 2,
+        retry_base_seconds: float = 0.5,
+        retry_max_seconds: float = 8.0,
+        hedge_percentile: Optional[float] = None,
+        hedge_min_delay_seconds: float = 0.1,
+        circuit_breaker_factory: Optional[Callable[[], CircuitBreaker]] = None,
+    ):
         self.model_name = model_name
         # API key is intentionally left empty as per instructions; Canvas will provide it at runtime.
         self.api_key = ""
-        self.api_url_base = "https://generativelanguage.googleapis.com/v1beta/models"
+        # Overridable so tests and benchmarks can point the client at a local stand-in
+        self.api_url_base = api_url_base or "https://generativelanguage.googleapis.com/v1beta/models"
+
+        self.max_connections = max_connections
+        self.max_keepalive_connections = (
+            max_keepalive_connections if max_keepalive_connections is not None else max_connections
+        )
+        self.max_in_flight = max_in_flight if max_in_flight is not None else max_connections
+        self.request_timeout = request_timeout
+        self.cache = cache
+        self.scheduler = LLMRequestScheduler(
+            max_concurrency=self.max_in_flight,
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+        )
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay_seconds = hedge_min_delay_seconds
+        # Recent latencies per model, for the hedging delay
+        self.latency_trackers: Dict[str, LatencyTracker] = {}
+        # One breaker per model, so a failing model in a cascade does not cut off the others
+        self.circuit_breaker_factory = circuit_breaker_factory or CircuitBreaker
+        self.circuit_breakers: Dict[str, CircuitBreaker] = {}
+        # Tokens budgeted for the response on top of the prompt estimate
+        self.output_token_allowance = output_token_allowance
+        self._http_client: Optional[httpx.AsyncClient] = None
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """
+        Returns the shared HTTP client, creating it on first use so it binds to the running event loop.
+        """
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                ),
+                timeout=httpx.Timeout(self.request_timeout, connect=10.0),
+                headers={'Content-Type': 'application/json'},
+            )
+        return self._http_client
+
+    async def aclose(self) -> None:
+        """
+        Closes the shared connection pool. Safe to call more than once.
+        """
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+    def _circuit_breaker(self, model: str) -> CircuitBreaker:
+        breaker = self.circuit_breakers.get(model)
+        if breaker is None:
+            breaker = self.circuit_breakers[model] = self.circuit_breaker_factory()
+        return breaker
+
+    def _update_circuit_gauge(self, model: str) -> None:
+        LLM_CIRCUIT_STATE.set(_CIRCUIT_STATE_VALUES[self._circuit_breaker(model).state], model=model)
+
+    def circuit_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the circuit breaker state of every model called so far.
+        """
+        return {model: breaker.stats() for model, breaker in self.circuit_breakers.items()}
 
-    async def _call_llm(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+    def _latency_tracker(self, model: str) -> LatencyTracker:
+        tracker = self.latency_trackers.get(model)
+        if tracker is None:
+            tracker = self.latency_trackers[model] = LatencyTracker()
+        return tracker
+
+    async def _send(
+        self, client: httpx.AsyncClient, url: str, payload: Dict[str, Any], estimated_tokens: int, stage: RequestStage,
+        model: str,
+    ) -> httpx.Response:
+        """
+        Sends one attempt: waits for a scheduler slot (until the deadline at most), then posts
+        within the per-call timeout. Records the outcome with the model's circuit breaker.
+        """
+        circuit_breaker = self._circuit_breaker(model)
+        queued_at = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.scheduler.acquire(estimated_tokens, stage), timeout=remaining_seconds())
+        except asyncio.TimeoutError:
+            raise LLMDeadlineExceededError("Claim deadline expired while the LLM call was queued.")
+        try:
+            sent_at = time.perf_counter()
+            LLM_QUEUE_WAIT_SECONDS.observe(sent_at - queued_at, model=model)
+            remaining = remaining_seconds()
+            timeout = _min_timeout(self.request_timeout, remaining)
+            try:
+                response = await asyncio.wait_for(
+                    client.post(url, params={"key": self.api_key}, json=payload), timeout=timeout
+                )
+            except asyncio.TimeoutError:
+                LLM_REQUEST_SECONDS.observe(time.perf_counter() - sent_at, model=model, status="timeout")
+                if remaining is not None and timeout == max(0.0, remaining):
+                    # Cut short by the claim's deadline rather than by a slow provider
+                    raise LLMDeadlineExceededError("Claim deadline expired while waiting for the LLM.")
+                circuit_breaker.record_failure()
+                raise
+            except RETRYABLE_EXCEPTIONS:
+                LLM_REQUEST_SECONDS.observe(time.perf_counter() - sent_at, model=model, status="error")
+                circuit_breaker.record_failure()
+                raise
+        finally:
+            self.scheduler.release()
+            self._update_circuit_gauge(model)
+
+        elapsed = time.perf_counter() - sent_at
+        LLM_REQUEST_SECONDS.observe(elapsed, model=model, status=str(response.status_code))
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            circuit_breaker.record_failure()
+        elif response.status_code != 429:
+            circuit_breaker.record_success()
+            self._latency_tracker(model).record(elapsed)
+        self._update_circuit_gauge(model)
+        return response
+
+    def _hedge_delay(self, model: str) -> Optional[float]:
+        if self.hedge_percentile is None:
+            return None
+        delay = self._latency_tracker(model).percentile(self.hedge_percentile)
+        if delay is None:
+            return None
+        delay = max(delay, self.hedge_min_delay_seconds)
+        remaining = remaining_seconds()
+        return delay if remaining is None or remaining > delay else None
+
+    async def _send_hedged(
+        self, client: httpx.AsyncClient, url: str, payload: Dict[str, Any], estimated_tokens: int, stage: RequestStage,
+        model: str,
+    ) -> httpx.Response:
+        """
+        Sends an attempt and, if it is still running after the hedging delay, a second identical
+        one. The first good response wins and the other request is cancelled.
+        """
+        delay = self._hedge_delay(model)
+        if delay is None:
+            return await self._send(client, url, payload, estimated_tokens, stage, model)
+
+        primary = asyncio.create_task(self._send(client, url, payload, estimated_tokens, stage, model))
+        hedge: Optional[asyncio.Task] = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return primary.result()
+            LLM_HEDGED_REQUESTS_TOTAL.inc(model=model, outcome="sent")
+            hedge = asyncio.create_task(self._send(client, url, payload, estimated_tokens, stage, model))
+            pending = {primary, hedge}
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Good responses first; a failure only counts once both attempts are done
+                finished = sorted(done, key=lambda task: (
+                    task.exception() is not None or task.result().status_code in RETRYABLE_STATUS_CODES
+                ))
+                task = finished[0]
+                if task.exception() is None and task.result().status_code not in RETRYABLE_STATUS_CODES:
+                    if task is hedge:
+                        LLM_HEDGED_REQUESTS_TOTAL.inc(model=model, outcome="won")
+                    return task.result()
+                if not pending:
+                    return task.result()
+        finally:
+            for task in (primary, hedge):
+                if task is not None:
+                    task.cancel()
+
+    async def _call_llm(self, payload: Dict[str, Any], prompt: str, stage: RequestStage, model: str) -> Dict[str, Any]:
         """
         Internal helper to make the API call to the LLM.
         """
-        url = f"{self.api_url_base}/{self.model_name}:generateContent?key={self.api_key}"
+        url = f"{self.api_url_base}/{model}:generateContent"
+        client = self._get_http_client()
+        estimated_tokens = estimate_tokens(prompt) + self.output_token_allowance
+        circuit_breaker = self._circuit_breaker(model)
+        attempt = 0
+        rate_limited = 0
         try:
-            # Using requests.post directly within asyncio.to_thread
-            response = await asyncio.to_thread(
-                requests.post, url, headers={'Content-Type': 'application/json'}, json=payload
-            )
-            response.raise_for_status()  # Raise an exception for HTTP errors
-            return response.json()
+            while True:
+                remaining = remaining_seconds()
+                if remaining is not None and remaining <= 0:
+                    raise LLMDeadlineExceededError("Claim deadline expired before the LLM call could complete.")
+                if not circuit_breaker.allow():
+                    self._update_circuit_gauge(model)
+                    raise ProviderDegradedError(
+                        f"LLM provider circuit for {model} is open after repeated failures; "
+                        f"retrying in {circuit_breaker.retry_after():.0f}s."
+                    )
+
+                try:
+                    response = await self._send_hedged(client, url, payload, estimated_tokens, stage, model)
+                except RETRYABLE_EXCEPTIONS as e:
+                    is_timeout = isinstance(e, (asyncio.TimeoutError, httpx.TimeoutException))
+                    reason = "timeout" if is_timeout else "transport_error"
+                    error = f"timed out after {self.request_timeout}s" if is_timeout else f"{type(e).__name__}: {e}"
+                else:
+                    if response.status_code == 429 and rate_limited < self.max_rate_limit_retries:
+                        # Hold back every caller until the provider's window resets, then queue again
+                        LLM_RETRIES_TOTAL.inc(model=model, reason="rate_limited")
+                        self.scheduler.pause(_retry_after_seconds(response, default=2.0 * (rate_limited + 1)))
+                        rate_limited += 1
+                        continue
+                    if response.status_code not in RETRYABLE_STATUS_CODES:
+                        response.raise_for_status()  # Raise an exception for HTTP errors
+                        result = response.json()
+                        self._record_usage(result, estimated_tokens, model)
+                        return result
+                    reason, error = "server_error", f"HTTP {response.status_code}"
+
+                if attempt >= self.max_retries:
+                    raise ProviderDegradedError(f"LLM call failed after {attempt + 1} attempts: {error}.")
+                delay = backoff_delay(attempt, self.retry_base_seconds, self.retry_max_seconds)
+                remaining = remaining_seconds()
+                if remaining is not None and delay >= remaining:
+                    raise LLMDeadlineExceededError(f"Claim deadline leaves no time to retry the LLM call ({error}).")
+                LLM_RETRIES_TOTAL.inc(model=model, reason=reason)
+                attempt += 1
+                await asyncio.sleep(delay)
         except Exception as e:
             print(f"Error calling LLM API: {e}")
             raise
 
-    async def generate_text(self, prompt: str) -> str:
+    def _record_usage(self, result: Dict[str, Any], estimated_tokens: int, model: str) -> None:
+        usage = result.get("usageMetadata") or {}
+        if usage.get("promptTokenCount"):
+            LLM_TOKENS_TOTAL.inc(usage["promptTokenCount"], model=model, kind="prompt")
+        if usage.get("candidatesTokenCount"):
+            LLM_TOKENS_TOTAL.inc(usage["candidatesTokenCount"], model=model, kind="response")
+        if usage.get("totalTokenCount"):
+            self.scheduler.record_usage(estimated_tokens, usage["totalTokenCount"])
+
+    async def generate_text(
+        self, prompt: str, stage: RequestStage = RequestStage.EXTRACTION, model_name: Optional[str] = None
+    ) -> str:
         """
-        Generates text using the LLM based on a given prompt.
+        Generates text using the LLM based on a given prompt. `model_name` overrides the client's model.
         """
+        model = model_name or self.model_name
+        cache_key = llm_cache_key(model, prompt) if self.cache is not None else None
+        if cache_key is not None:
+            cached = await self.cache.aget(cache_key)
+            if cached is not None:
+                LLM_CACHE_HITS_TOTAL.inc(model=model)
+                return cached
+
         chat_history = []
         chat_history.append({ "role": "user", "parts": [{ "text": prompt }] })
         payload = { "contents": chat_history }
 
-        result = await self._call_llm(payload)
+        result = await self._call_llm(payload, prompt, stage, model)
 
         if result.get("candidates") and result["candidates"][0].get("content") and \
            result["candidates"][0]["content"].get("parts") and \
            result["candidates"][0]["content"]["parts"][0].get("text"):
-            return result["candidates"][0]["content"]["parts"][0]["text"]
+            text = result["candidates"][0]["content"]["parts"][0]["text"]
+            if cache_key is not None:
+                await self.cache.aset(cache_key, text)
+            return text
         else:
             print(f"Unexpected LLM response structure for text generation: {result}")
             raise ValueError("Failed to generate text from LLM.")
 
-    async def generate_structured_json(self, prompt: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    async def generate_structured_json(
+        self, prompt: str, schema: Dict[str, Any], stage: RequestStage = RequestStage.EXTRACTION,
+        model_name: Optional[str] = None,
+    ) -> Dict[str, Any]:
         """
         Generates structured JSON output using the LLM based on a given prompt and JSON schema.
+        `model_name` overrides the client's model.
         """
+        model = model_name or self.model_name
+        cache_key = llm_cache_key(model, prompt, schema) if self.cache is not None else None
+        if cache_key is not None:
+            cached = await self.cache.aget(cache_key)
+            if cached is not None:
+                LLM_CACHE_HITS_TOTAL.inc(model=model)
+                return cached
+
         chat_history = []
         chat_history.append({ "role": "user", "parts": [{ "text": prompt }] })
         payload = {
@@ -62,17 +371,20 @@ class LLMClient:
             }
         }
 
-        result = await self._call_llm(payload)
+        result = await self._call_llm(payload, prompt, stage, model)
 
         if result.get("candidates") and result["candidates"][0].get("content") and \
            result["candidates"][0]["content"].get("parts") and \
            result["candidates"][0]["content"]["parts"][0].get("text"):
             try:
                 # The response is a stringified JSON, so parse it
-                return json.loads(result["candidates"][0]["content"]["parts"][0].get("text", "{}"))
+                parsed = json.loads(result["candidates"][0]["content"]["parts"][0].get("text", "{}"))
             except json.JSONDecodeError as e:
                 print(f"Failed to parse JSON from LLM response: {e}. Response: {result['candidates'][0]['content']['parts'][0].get('text', '')}")
                 raise ValueError("LLM returned malformed JSON.")
+            if cache_key is not None:
+                await self.cache.aset(cache_key, parsed)
+            return parsed
         else:
             print(f"Unexpected LLM response structure for structured JSON generation: {result}")
             raise ValueError("Failed to generate structured JSON from LLM.")
\ No newline at end of file
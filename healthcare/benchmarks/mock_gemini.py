@@ -0,0 +1,173 @@
+# benchmarks/mock_gemini.py
+"""
+Local stand-in for the Gemini `generateContent` endpoint, for offline benchmarks.
+
+Usage (from the healthcare directory):
+    python -m benchmarks.mock_gemini --port 8089 --latency-ms 400 --jitter-ms 150 --error-rate 0.02
+
+Point the service at it with LLM_API_URL_BASE=http://127.0.0.1:8089/v1beta/models (or pass
+`api_url_base` to LLMClient). Structured requests get a canned object built from their
+responseSchema; plain text requests get `text_response`. `model_field_values` overrides the
+canned values for a given model, e.g. to make a cheap model leave fields empty in cascade tests.
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Values returned for schema properties of these names; other properties get a value by type
+DEFAULT_FIELD_VALUES: Dict[str, Any] = {
+    "document_type": "bill",
+    "hospital_name": "Sample Hospital",
+    "total_amount": 125000.0,
+    "date_of_service": "2025-02-03",
+    "patient_name": "Sample Patient",
+    "diagnosis": "Sample Diagnosis",
+    "admission_date": "2025-02-03",
+    "discharge_date": "2025-02-07",
+}
+
+class MockGeminiSettings:
+    """
+    Behaviour of the mock endpoint. Mutable so a running benchmark can change it between scenarios.
+    """
+    def __init__(
+        self,
+        latency_ms: float = 300.0,
+        jitter_ms: float = 100.0,
+        error_rate: float = 0.0,
+        error_status: int = 500,
+        text_response: str = "bill",
+        field_values: Optional[Dict[str, Any]] = None,
+        seed: Optional[int] = None,
+        slow_rate: float = 0.0,
+        slow_ms: float = 5000.0,
+        model_field_values: Optional[Dict[str, Dict[str, Any]]] = None,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.text_response = text_response
+        self.field_values = dict(DEFAULT_FIELD_VALUES, **(field_values or {}))
+        self.random = random.Random(seed)
+        # Fraction of calls that take `slow_ms` instead, to reproduce a provider's latency tail
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.model_field_values = model_field_values or {}
+        self.stats = {"requests": 0, "errors": 0, "structured": 0, "prompt_chars": 0, "by_model": {}}
+
+def canned_value(schema: Dict[str, Any], name: Optional[str], field_values: Dict[str, Any]) -> Any:
+    """
+    Builds a value that satisfies `schema`, preferring the canned value for the property name.
+    """
+    if schema.get("type") == "object":
+        return {
+            prop: canned_value(prop_schema, prop, field_values)
+            for prop, prop_schema in schema.get("properties", {}).items()
+        }
+    if name in field_values:
+        return field_values[name]
+    if schema.get("enum"):
+        return schema["enum"][0]
+    return {"number": 1.0, "integer": 1, "boolean": True, "array": []}.get(schema.get("type"), "sample")
+
+def create_app(settings: MockGeminiSettings) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1beta/models/{model_action}")
+    async def generate_content(model_action: str, request: Request):
+        payload = await request.json()
+        settings.stats["requests"] += 1
+        model = model_action.split(":", 1)[0]
+        settings.stats["by_model"][model] = settings.stats["by_model"].get(model, 0) + 1
+        prompt = "".join(
+            part.get("text", "") for content in payload.get("contents", []) for part in content.get("parts", [])
+        )
+        settings.stats["prompt_chars"] += len(prompt)
+
+        delay_ms = settings.latency_ms + settings.random.uniform(-settings.jitter_ms, settings.jitter_ms)
+        if settings.random.random() < settings.slow_rate:
+            delay_ms = settings.slow_ms
+        await asyncio.sleep(max(0.0, delay_ms) / 1000)
+        if settings.random.random() < settings.error_rate:
+            settings.stats["errors"] += 1
+            return JSONResponse(
+                status_code=settings.error_status,
+                content={"error": {"code": settings.error_status, "message": "Injected mock error"}},
+                headers={"Retry-After": "1"} if settings.error_status == 429 else None,
+            )
+
+        schema = payload.get("generationConfig", {}).get("responseSchema")
+        if schema is not None:
+            settings.stats["structured"] += 1
+            field_values = dict(settings.field_values, **settings.model_field_values.get(model, {}))
+            text = json.dumps(canned_value(schema, None, field_values))
+        else:
+            text = settings.text_response
+        prompt_tokens = max(1, len(prompt) // 4)
+        output_tokens = max(1, len(text) // 4)
+        return {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": output_tokens,
+                "totalTokenCount": prompt_tokens + output_tokens,
+            },
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return settings.stats
+
+    return app
+
+def serve_in_thread(app: FastAPI, port: int = 0) -> Tuple[uvicorn.Server, threading.Thread, int]:
+    """
+    Runs `app` with uvicorn on a background thread and returns (server, thread, bound_port).
+    Stop it with `server.should_exit = True` followed by `thread.join()`.
+    """
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("Benchmark server failed to start.")
+        time.sleep(0.01)
+    bound_port = server.servers[0].sockets[0].getsockname()[1]
+    return server, thread, bound_port
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a local mock of the Gemini generateContent endpoint.")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--text-response", default="bill", help="Reply to plain text (classification) requests.")
+    parser.add_argument("--field-values", default=None, help="JSON file overriding the canned field values.")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of calls answered after --slow-ms.")
+    parser.add_argument("--slow-ms", type=float, default=5000.0)
+    args = parser.parse_args()
+
+    field_values = None
+    if args.field_values:
+        with open(args.field_values, "r", encoding="utf-8") as f:
+            field_values = json.load(f)
+    settings = MockGeminiSettings(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        error_status=args.error_status, text_response=args.text_response, field_values=field_values, seed=args.seed,
+        slow_rate=args.slow_rate, slow_ms=args.slow_ms,
+    )
+    uvicorn.run(create_app(settings), host="127.0.0.1", port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
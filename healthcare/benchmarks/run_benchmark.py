@@ -0,0 +1,338 @@
+# benchmarks/run_benchmark.py
+"""
+Offline load benchmark for the claim pipeline against the local mock Gemini server.
+
+Usage (from the healthcare directory):
+    python -m benchmarks.run_benchmark --concurrency 1,2,4,8 --claims-per-level 16 \
+        --output ../benchmark_results/$(git rev-parse --short HEAD).json [--baseline previous.json]
+
+Each scenario replays the PDFs in --pdf-dir as claims (--claim-size files per claim) through
+`ClaimOrchestrator.process_claim` ("orchestrator" mode) and/or through POST /process-claim of the
+FastAPI app ("http" mode), at each concurrency level. Caches are disabled so every claim does the
+full work. The JSON report records the git commit and settings, so results from different commits
+can be compared with --baseline.
+"""
+import argparse
+import asyncio
+import io
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import UploadFile
+
+from ai_client import LLMClient
+from benchmarks.mock_gemini import MockGeminiSettings, create_app, serve_in_thread
+from metrics import STAGE_SECONDS
+from orchestrator import ClaimOrchestrator
+from pdf_parser import PDFParserPool, available_cpu_count
+
+Claim = List[Tuple[str, bytes]]
+
+def stage_totals() -> Dict[str, Tuple[float, int]]:
+    """
+    Returns (total seconds, calls) per pipeline stage from the process-wide stage histogram,
+    whatever the outcome.
+    """
+    totals: Dict[str, Tuple[float, int]] = {}
+    for (stage, _), (seconds, calls) in STAGE_SECONDS.totals().items():
+        total, count = totals.get(stage, (0.0, 0))
+        totals[stage] = (total + seconds, count + calls)
+    return totals
+
+def stage_report(before: Dict[str, Tuple[float, int]], after: Dict[str, Tuple[float, int]]) -> Dict[str, Dict[str, float]]:
+    """
+    Per-stage calls, total and mean time between two `stage_totals()` snapshots. Concurrent calls
+    overlap, so totals can exceed the scenario's duration.
+    """
+    report = {}
+    for stage, (seconds, calls) in sorted(after.items()):
+        previous_seconds, previous_calls = before.get(stage, (0.0, 0))
+        calls -= previous_calls
+        if calls:
+            total = seconds - previous_seconds
+            report[stage] = {"calls": calls, "total_s": round(total, 4), "mean_ms": round(total / calls * 1000, 2)}
+    return report
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+def peak_rss_mb() -> Dict[str, float]:
+    """
+    Peak resident set size of this process and of its live child processes (the PDF parser
+    workers), in MB. Peaks are process-lifetime values, not per scenario.
+    """
+    main_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    child_peaks = []
+    for child in multiprocessing.active_children():
+        try:
+            with open(f"/proc/{child.pid}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        child_peaks.append(int(line.split()[1]) / 1024)
+        except OSError:
+            # Not Linux, or the worker already exited
+            continue
+    return {
+        "main": round(main_mb, 1),
+        "parser_workers_max": round(max(child_peaks), 1) if child_peaks else 0.0,
+        "parser_workers_total": round(sum(child_peaks), 1),
+    }
+
+def git_revision() -> Dict[str, Any]:
+    def run(*args: str) -> Optional[str]:
+        try:
+            return subprocess.run(
+                ["git", *args], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    status = run("status", "--porcelain", "--untracked-files=no")
+    return {"commit": run("rev-parse", "HEAD"), "dirty": bool(status) if status is not None else None}
+
+def load_claims(pdf_dir: str, claim_size: int, count: int) -> List[Claim]:
+    """
+    Builds `count` claims of `claim_size` PDFs each, cycling through the PDFs in `pdf_dir`.
+    """
+    pdfs = []
+    for filename in sorted(os.listdir(pdf_dir)):
+        if filename.lower().endswith(".pdf"):
+            with open(os.path.join(pdf_dir, filename), "rb") as f:
+                pdfs.append((filename, f.read()))
+    if not pdfs:
+        raise ValueError(f"No PDF files found in {pdf_dir}.")
+    return [[pdfs[(i * claim_size + j) % len(pdfs)] for j in range(claim_size)] for i in range(count)]
+
+async def run_level(submit: Callable[[Claim], Awaitable[None]], claims: List[Claim], concurrency: int) -> Dict[str, Any]:
+    """
+    Submits every claim with at most `concurrency` in flight and returns latency statistics.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors: List[str] = []
+
+    async def one(claim: Claim) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await submit(claim)
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one(claim) for claim in claims])
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "claims": len(claims),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "duration_s": round(duration, 3),
+        "claims_per_sec": round(len(latencies) / duration, 3) if duration else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 1),
+            "p95": round(percentile(latencies, 0.95) * 1000, 1),
+            "p99": round(percentile(latencies, 0.99) * 1000, 1),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+            "max": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        },
+    }
+
+def build_benchmark_orchestrator(args: argparse.Namespace, api_url_base: str) -> ClaimOrchestrator:
+    return ClaimOrchestrator(
+        llm_client=LLMClient(
+            api_url_base=api_url_base, max_connections=args.llm_max_connections,
+            hedge_percentile=args.hedge_percentile or None,
+        ),
+        pipeline_mode=args.pipeline_mode,
+        pdf_parser_pool=PDFParserPool(max_workers=args.parser_workers or None),
+    )
+
+async def run_scenarios(
+    mode: str,
+    submit: Callable[[Claim], Awaitable[None]],
+    args: argparse.Namespace,
+    mock_settings: MockGeminiSettings,
+) -> List[Dict[str, Any]]:
+    # Warm up the parser pool and connection pool outside the measured levels
+    await submit(load_claims(args.pdf_dir, args.claim_size, 1)[0])
+
+    results = []
+    for concurrency in args.concurrency:
+        claims = load_claims(args.pdf_dir, args.claim_size, args.claims_per_level)
+        stages_before = stage_totals()
+        llm_requests_before = mock_settings.stats["requests"]
+        prompt_chars_before = mock_settings.stats["prompt_chars"]
+        result = await run_level(submit, claims, concurrency)
+        result.update({
+            "mode": mode,
+            "stages": stage_report(stages_before, stage_totals()),
+            "llm_requests": mock_settings.stats["requests"] - llm_requests_before,
+            "llm_prompt_chars": mock_settings.stats["prompt_chars"] - prompt_chars_before,
+            "peak_rss_mb": peak_rss_mb(),
+        })
+        results.append(result)
+        print(
+            f"[{mode}] concurrency={concurrency:<3} claims/s={result['claims_per_sec']:<8} "
+            f"p50={result['latency_ms']['p50']}ms p95={result['latency_ms']['p95']}ms "
+            f"p99={result['latency_ms']['p99']}ms errors={result['errors']} "
+            f"rss={result['peak_rss_mb']['main']}MB",
+            file=sys.stderr,
+        )
+    return results
+
+async def run_orchestrator_mode(args: argparse.Namespace, api_url_base: str, mock_settings: MockGeminiSettings) -> List[Dict[str, Any]]:
+    orchestrator = build_benchmark_orchestrator(args, api_url_base)
+
+    async def submit(claim: Claim) -> None:
+        await orchestrator.process_claim([UploadFile(file=io.BytesIO(content), filename=name) for name, content in claim])
+
+    try:
+        return await run_scenarios("orchestrator", submit, args, mock_settings)
+    finally:
+        await orchestrator.aclose()
+
+async def run_http_mode(args: argparse.Namespace, api_url_base: str, mock_settings: MockGeminiSettings) -> List[Dict[str, Any]]:
+    # The app reads its settings from the environment when it starts
+    state_dir = tempfile.mkdtemp(prefix="claim-benchmark-")
+    os.environ.update({
+        "LLM_API_URL_BASE": api_url_base,
+        "LLM_MAX_CONNECTIONS": str(args.llm_max_connections),
+        "DOCUMENT_CACHE_SIZE": "0",
+        "LLM_CACHE_SIZE": "0",
+        "CACHE_SQLITE_PATH": "",
+        "CLAIM_PIPELINE_MODE": args.pipeline_mode,
+        "PDF_PARSER_WORKERS": str(args.parser_workers),
+        "JOB_DB_PATH": os.path.join(state_dir, "claim_jobs.sqlite3"),
+        "JOB_SPOOL_DIR": os.path.join(state_dir, "claim_job_files"),
+        "JOB_WORKERS": "0",
+        "LLM_HEDGE_PERCENTILE": str(args.hedge_percentile),
+    })
+    import my_app
+
+    server, thread, port = serve_in_thread(my_app.app)
+    client = httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}",
+        timeout=None,
+        limits=httpx.Limits(max_connections=max(args.concurrency)),
+    )
+
+    async def submit(claim: Claim) -> None:
+        response = await client.post(
+            "/process-claim", files=[("files", (name, content, "application/pdf")) for name, content in claim]
+        )
+        response.raise_for_status()
+
+    try:
+        return await run_scenarios("http", submit, args, mock_settings)
+    finally:
+        await client.aclose()
+        server.should_exit = True
+        thread.join()
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """
+    Prints throughput and tail-latency changes against a previous report.
+    """
+    previous = {(r["mode"], r["concurrency"]): r for r in baseline.get("scenarios", [])}
+    print(f"Compared with {baseline.get('git', {}).get('commit')}:", file=sys.stderr)
+    for result in report["scenarios"]:
+        before = previous.get((result["mode"], result["concurrency"]))
+        if before is None:
+            continue
+        def change(new: float, old: float) -> str:
+            return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        print(
+            f"  [{result['mode']}] concurrency={result['concurrency']:<3} "
+            f"claims/s {change(result['claims_per_sec'], before['claims_per_sec'])} "
+            f"p95 {change(result['latency_ms']['p95'], before['latency_ms']['p95'])} "
+            f"p99 {change(result['latency_ms']['p99'], before['latency_ms']['p99'])}",
+            file=sys.stderr,
+        )
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    mock_settings = MockGeminiSettings(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        error_status=args.error_status, seed=args.seed, slow_rate=args.slow_rate, slow_ms=args.slow_ms,
+    )
+    mock_server, mock_thread, mock_port = serve_in_thread(create_app(mock_settings))
+    api_url_base = f"http://127.0.0.1:{mock_port}/v1beta/models"
+    try:
+        scenarios = []
+        if args.mode in ("orchestrator", "both"):
+            scenarios += await run_orchestrator_mode(args, api_url_base, mock_settings)
+        if args.mode in ("http", "both"):
+            scenarios += await run_http_mode(args, api_url_base, mock_settings)
+    finally:
+        mock_server.should_exit = True
+        mock_thread.join()
+
+    return {
+        "git": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus_available": available_cpu_count(),
+        },
+        "settings": {
+            key: value for key, value in vars(args).items() if key not in ("output", "baseline")
+        },
+        "scenarios": scenarios,
+    }
+
+def main() -> None:
+    default_pdf_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "test_pdfs")
+    parser = argparse.ArgumentParser(description="Benchmark the claim pipeline against a local mock LLM.")
+    parser.add_argument("--mode", choices=("orchestrator", "http", "both"), default="both")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="Comma-separated concurrency levels.")
+    parser.add_argument("--claims-per-level", type=int, default=16)
+    parser.add_argument("--claim-size", type=int, default=1, help="PDFs per claim.")
+    parser.add_argument("--pdf-dir", default=default_pdf_dir)
+    parser.add_argument("--pipeline-mode", choices=("two_step", "combined"), default="two_step")
+    parser.add_argument("--parser-workers", type=int, default=0, help="0 sizes the pool to the available CPUs.")
+    parser.add_argument("--llm-max-connections", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Mock LLM latency.")
+    parser.add_argument("--jitter-ms", type=float, default=100.0, help="Mock LLM latency jitter (+/-).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock LLM calls that fail.")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of mock LLM calls answered after --slow-ms.")
+    parser.add_argument("--slow-ms", type=float, default=5000.0)
+    parser.add_argument("--hedge-percentile", type=float, default=0.0, help="LLM hedging percentile, e.g. 0.95 (0 = off).")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", default=None, help="Write the JSON report here (default: stdout).")
+    parser.add_argument("--baseline", default=None, help="Previous JSON report to compare against.")
+    args = parser.parse_args()
+    args.concurrency = [int(level) for level in args.concurrency.split(",") if level]
+
+    report = asyncio.run(run(args))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
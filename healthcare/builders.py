@@ -0,0 +1,130 @@
+# builders.py
+"""
+Builds the claim pipeline's components from deployment settings in the environment. Shared by the
+API (my_app.py) and the offline tools, so they do not have to import the FastAPI app.
+"""
+import os
+from functools import partial
+from typing import Optional
+
+from ai_client import LLMClient
+from cache import ResultCache
+from claim_sessions import ClaimSessionStore
+from duplicate_index import DuplicateIndex
+from job_queue import ClaimJobQueue
+from llm_resilience import CircuitBreaker
+from model_cascade import ModelCascade, parse_models
+from orchestrator import ClaimOrchestrator
+from pdf_parser import PDFParserPool
+from uploads import UploadSpooler
+
+def build_upload_spooler() -> UploadSpooler:
+    """
+    Builds the upload spooler and its size limits from deployment settings in the environment.
+    """
+    return UploadSpooler(
+        spool_dir=os.getenv("UPLOAD_SPOOL_DIR") or None,
+        max_file_bytes=int(float(os.getenv("UPLOAD_MAX_FILE_MB", "50")) * 1024 * 1024),
+        max_request_bytes=int(float(os.getenv("UPLOAD_MAX_REQUEST_MB", "200")) * 1024 * 1024),
+    )
+
+def build_orchestrator(
+    upload_spooler: Optional[UploadSpooler] = None,
+    pdf_parser_workers: Optional[int] = None,
+    duplicate_index_path: Optional[str] = None,
+) -> ClaimOrchestrator:
+    """
+    Builds the claim orchestrator from deployment settings in the environment. `pdf_parser_workers`
+    and `duplicate_index_path` override PDF_PARSER_WORKERS and DUPLICATE_INDEX_PATH.
+    """
+    cache_ttl = os.getenv("CACHE_TTL_SECONDS")
+    cache_ttl = float(cache_ttl) if cache_ttl else None
+    cache_sqlite_path = os.getenv("CACHE_SQLITE_PATH") or None
+    document_cache = ResultCache(
+        "documents",
+        max_entries=int(os.getenv("DOCUMENT_CACHE_SIZE", "256")),
+        ttl_seconds=cache_ttl,
+        sqlite_path=cache_sqlite_path,
+    )
+    llm_cache = ResultCache(
+        "llm_responses",
+        max_entries=int(os.getenv("LLM_CACHE_SIZE", "4096")),
+        ttl_seconds=cache_ttl,
+        sqlite_path=cache_sqlite_path,
+    )
+    duplicate_index_path = duplicate_index_path or os.getenv("DUPLICATE_INDEX_PATH")
+    duplicate_index = DuplicateIndex(
+        duplicate_index_path, max_distance=int(os.getenv("DUPLICATE_MAX_DISTANCE", "4"))
+    ) if duplicate_index_path else None
+    model_name = os.getenv("LLM_MODEL_NAME", "gemini-2.0-flash")
+    # Per-agent cascades, e.g. BILL_LLM_MODELS=gemini-2.0-flash-lite,gemini-2.0-flash (cheapest first)
+    model_cascades = {
+        agent: ModelCascade(
+            agent,
+            parse_models(os.getenv(f"{prefix}_LLM_MODELS"), model_name),
+            rule_agreement_confidence=float(os.getenv(f"{prefix}_CASCADE_RULE_AGREEMENT", "0.5")),
+        )
+        for agent, prefix in (
+            ("classifier", "CLASSIFIER"), ("bill", "BILL"),
+            ("discharge_summary", "DISCHARGE"), ("combined", "COMBINED"),
+        )
+    }
+    llm_client = LLMClient(
+        model_name=model_name,
+        api_url_base=os.getenv("LLM_API_URL_BASE") or None,
+        max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "20")),
+        max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", os.getenv("LLM_MAX_CONNECTIONS", "20"))),
+        cache=llm_cache,
+        requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0")) or None,
+        tokens_per_minute=float(os.getenv("LLM_TOKENS_PER_MINUTE", "0")) or None,
+        request_timeout=float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "30")) or None,
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+        retry_base_seconds=float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5")),
+        hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "0")) or None,
+        circuit_breaker_factory=partial(
+            CircuitBreaker,
+            failure_threshold=int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5")),
+            recovery_seconds=float(os.getenv("LLM_CIRCUIT_RECOVERY_SECONDS", "30")),
+        ),
+    )
+    pdf_parser_pool = PDFParserPool(
+        max_workers=pdf_parser_workers or int(os.getenv("PDF_PARSER_WORKERS", "0")) or None,
+        timeout_seconds=float(os.getenv("PDF_PARSE_TIMEOUT_SECONDS", "60")),
+    )
+    return ClaimOrchestrator(
+        llm_client=llm_client,
+        document_cache=document_cache,
+        classifier_confidence_threshold=float(os.getenv("CLASSIFIER_CONFIDENCE_THRESHOLD", "0.6")),
+        pipeline_mode=os.getenv("CLAIM_PIPELINE_MODE", "two_step"),
+        pdf_parser_pool=pdf_parser_pool,
+        rule_confidence_threshold=float(os.getenv("EXTRACTION_RULE_CONFIDENCE_THRESHOLD", "0.7")),
+        upload_spooler=upload_spooler,
+        duplicate_index=duplicate_index,
+        bill_prompt_max_tokens=int(os.getenv("BILL_PROMPT_MAX_TOKENS", "3000")) or None,
+        discharge_prompt_max_tokens=int(os.getenv("DISCHARGE_PROMPT_MAX_TOKENS", "3000")) or None,
+        combined_prompt_max_tokens=int(os.getenv("COMBINED_PROMPT_MAX_TOKENS", "4000")) or None,
+        claim_deadline_seconds=float(os.getenv("CLAIM_DEADLINE_SECONDS", "0")) or None,
+        model_cascades=model_cascades,
+    )
+
+def build_job_queue(upload_spooler: Optional[UploadSpooler] = None) -> ClaimJobQueue:
+    """
+    Builds the persistent claim job queue from deployment settings in the environment.
+    """
+    return ClaimJobQueue(
+        db_path=os.getenv("JOB_DB_PATH", "claim_jobs.sqlite3"),
+        spool_dir=os.getenv("JOB_SPOOL_DIR", "claim_job_files"),
+        max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+        max_queued_jobs=int(os.getenv("JOB_MAX_QUEUED", "10000")),
+        upload_spooler=upload_spooler,
+    )
+
+def build_claim_session_store() -> ClaimSessionStore:
+    """
+    Builds the claim session store from deployment settings in the environment.
+    """
+    ttl = os.getenv("CLAIM_SESSION_TTL_SECONDS")
+    return ClaimSessionStore(
+        db_path=os.getenv("CLAIM_SESSION_DB_PATH") or None,
+        ttl_seconds=float(ttl) if ttl else None,
+    )
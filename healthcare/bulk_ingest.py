@@ -0,0 +1,370 @@
+# bulk_ingest.py
+"""
+Offline bulk ingestion of claim PDFs, for backfilling and re-scoring historical claims without
+going through the API.
+
+Usage (from the healthcare directory):
+    python bulk_ingest.py --pdf-dir ../test_pdfs --output results.ndjson [--processes 4] [--concurrency 8]
+    python bulk_ingest.py --pdf-dir /data/claims --output results.parquet --format parquet
+
+Files are grouped into claims by the claim-id prefix of their filename (`25020300401-3_...`
+belongs to claim 25020300401) and each claim runs through `ClaimOrchestrator.process_claim`,
+configured from the same environment variables as the API. Claims are spread over --processes
+worker processes in batches, each worker keeping up to --concurrency claims in flight and starting
+the next claim of its batch as soon as one finishes.
+
+Finished claims are appended to an NDJSON journal (the output itself for NDJSON, or
+`<output>.partial.ndjson` for Parquet) that doubles as the checkpoint: a rerun skips the claims
+already in it. Claims that fail or come back provider_degraded are left out, so the next run
+retries them, as does a batch whose worker process crashed. Parquet output needs pyarrow.
+
+All processes share one SQLite duplicate index (--duplicate-index, else DUPLICATE_INDEX_PATH,
+else `<output>.duplicates.sqlite3`), so a bill filed under two claims is caught whichever
+processes handle them.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing.util
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+from builders import build_orchestrator
+from llm_resilience import PROVIDER_DEGRADED
+from metrics import correlation_id
+from orchestrator import ClaimOrchestrator, shape_raw_text
+from pdf_parser import available_cpu_count
+from schemas import RawTextMode
+from uploads import SpooledUpload
+
+OUTPUT_FORMATS = ("ndjson", "parquet")
+
+# Leading claim id of a filename such as "25020300401-3_20250427_120739-max health.pdf"
+CLAIM_ID_PATTERN = re.compile(r"^([A-Za-z0-9]+)[-_]")
+
+Claim = Tuple[str, List[str]]
+
+# Claims per batch, as a multiple of --concurrency: enough for the in-flight window to keep sliding
+# past slow claims, while a crashed worker only loses one batch
+BATCH_CONCURRENCY_MULTIPLE = 4
+
+def claim_id_for(filename: str) -> str:
+    """
+    Returns the claim id prefix of a filename, or the whole name (without extension) if it has none.
+    """
+    match = CLAIM_ID_PATTERN.match(filename)
+    return match.group(1) if match else os.path.splitext(filename)[0]
+
+def group_claims(pdf_dir: str) -> List[Claim]:
+    """
+    Groups the PDFs in `pdf_dir` into (claim_id, paths) by filename prefix, sorted by claim id.
+    """
+    claims: Dict[str, List[str]] = {}
+    for filename in sorted(os.listdir(pdf_dir)):
+        path = os.path.join(pdf_dir, filename)
+        if filename.lower().endswith(".pdf") and os.path.isfile(path):
+            claims.setdefault(claim_id_for(filename), []).append(path)
+    return sorted(claims.items())
+
+def load_checkpoint(journal_path: str) -> Set[str]:
+    """
+    Returns the claim ids already in the journal. A last line cut off by an interrupted run is
+    truncated away so appending resumes on a clean line.
+    """
+    if not os.path.exists(journal_path):
+        return set()
+    with open(journal_path, "rb+") as f:
+        data = f.read()
+        complete = data[:data.rfind(b"\n") + 1]
+        if len(complete) != len(data):
+            f.truncate(len(complete))
+    return {json.loads(line)["claim_id"] for line in complete.splitlines() if line.strip()}
+
+# Per-process pipeline, created once by _init_worker and reused for every batch
+_worker: Dict[str, Any] = {}
+
+def _init_worker(parser_workers: int, duplicate_index_path: str) -> None:
+    _worker["loop"] = asyncio.new_event_loop()
+    _worker["orchestrator"] = build_orchestrator(
+        pdf_parser_workers=parser_workers, duplicate_index_path=duplicate_index_path
+    )
+    # A worker waits for its own children before exiting, so its parser pool must be stopped first;
+    # the priority runs this ahead of the finalizers that close the pool's queues
+    multiprocessing.util.Finalize(None, _close_worker, exitpriority=100)
+
+def _close_worker() -> None:
+    if _worker:
+        _worker["orchestrator"].text_extraction_agent.shutdown(wait=True)
+        _worker["loop"].run_until_complete(_worker["orchestrator"].aclose())
+        _worker["loop"].close()
+        _worker.clear()
+
+async def _process_claim(orchestrator: ClaimOrchestrator, claim: Claim, raw_text_mode: RawTextMode) -> Dict[str, Any]:
+    claim_id, paths = claim
+    filenames = [os.path.basename(path) for path in paths]
+    token = correlation_id.set(claim_id)
+    started = time.perf_counter()
+    try:
+        # The files are read in place; nothing is copied to the spool directory
+        uploads = [await SpooledUpload.from_path(path) for path in paths]
+        result = await orchestrator.process_claim(uploads, claim_id=claim_id)
+        result = result.model_copy(update={
+            "documents": [shape_raw_text(document, raw_text_mode) for document in result.documents]
+        })
+        row = {"claim_id": claim_id, "files": filenames}
+        row.update(result.model_dump(mode="json"))
+    except Exception as e:
+        print(f"Claim {claim_id} failed: {e}")
+        row = {"claim_id": claim_id, "files": filenames, "error": str(e)}
+    finally:
+        correlation_id.reset(token)
+    row["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return row
+
+async def _process_batch(batch: List[Claim], raw_text_mode: RawTextMode, concurrency: int) -> List[Dict[str, Any]]:
+    orchestrator = _worker["orchestrator"]
+    # A sliding window: a slow claim holds one slot, not the whole batch
+    slots = asyncio.Semaphore(concurrency)
+
+    async def process(claim: Claim) -> Dict[str, Any]:
+        async with slots:
+            return await _process_claim(orchestrator, claim, raw_text_mode)
+
+    return [await row for row in asyncio.as_completed([process(claim) for claim in batch])]
+
+def _run_batch(batch: List[Claim], raw_text_mode: RawTextMode, concurrency: int) -> List[Dict[str, Any]]:
+    """
+    Processes a batch of claims on the worker's event loop, up to `concurrency` at a time.
+    """
+    return _worker["loop"].run_until_complete(_process_batch(batch, raw_text_mode, concurrency))
+
+def _failed_rows(batch: List[Claim], error: str) -> List[Dict[str, Any]]:
+    return [
+        {"claim_id": claim_id, "files": [os.path.basename(path) for path in paths], "error": error}
+        for claim_id, paths in batch
+    ]
+
+def _is_finished(row: Dict[str, Any]) -> bool:
+    return "error" not in row and row["claim_decision"]["status"] != PROVIDER_DEGRADED
+
+def _format_seconds(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+class Progress:
+    """
+    Prints a progress line with throughput and ETA to stderr, rewriting it in place on a terminal.
+    """
+    def __init__(self, total: int, skipped: int = 0):
+        self.total = total
+        self.skipped = skipped
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._inline = sys.stderr.isatty()
+
+    def update(self, done: int, failed: int) -> None:
+        self.done += done
+        self.failed += failed
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = _format_seconds((self.total - self.done) / rate) if rate > 0 else "?"
+        line = (
+            f"[ingest] {self.done}/{self.total} claims ({self.done / self.total:.1%}), "
+            f"{rate:.2f} claims/s, ETA {eta}, failed {self.failed}, skipped {self.skipped}"
+        )
+        print(("\r" + line) if self._inline else line, end="" if self._inline else "\n", file=sys.stderr, flush=True)
+
+    def close(self) -> None:
+        if self._inline:
+            print(file=sys.stderr)
+
+def _parquet_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    # Flat columns; documents stay JSON since bills and discharge summaries have different fields
+    return {
+        "claim_id": row["claim_id"],
+        "files": row["files"],
+        "status": row["claim_decision"]["status"],
+        "reason": row["claim_decision"]["reason"],
+        "missing_documents": row["validation"]["missing_documents"],
+        "discrepancies": row["validation"]["discrepancies"],
+        "documents": json.dumps(row["documents"]),
+        "duration_ms": row["duration_ms"],
+    }
+
+def write_parquet(journal_path: str, output_path: str) -> int:
+    """
+    Writes every claim in the journal to a Parquet file. Returns the number of rows.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Fixed so files from different runs line up even when, say, no claim had discrepancies
+    schema = pa.schema([
+        ("claim_id", pa.string()),
+        ("files", pa.list_(pa.string())),
+        ("status", pa.string()),
+        ("reason", pa.string()),
+        ("missing_documents", pa.list_(pa.string())),
+        ("discrepancies", pa.list_(pa.string())),
+        ("documents", pa.string()),
+        ("duration_ms", pa.float64()),
+    ])
+    with open(journal_path, "r", encoding="utf-8") as f:
+        rows = [_parquet_row(json.loads(line)) for line in f if line.strip()]
+    pq.write_table(pa.Table.from_pylist(rows, schema=schema), output_path)
+    return len(rows)
+
+def ingest(
+    pdf_dir: str,
+    output_path: str,
+    output_format: str = "ndjson",
+    processes: int = 1,
+    concurrency: int = 4,
+    raw_text_mode: RawTextMode = RawTextMode.OMIT,
+    resume: bool = True,
+    duplicate_index_path: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Processes every claim in `pdf_dir` not yet in the checkpoint and returns a summary.
+    `processes=0` runs in this process, without a pool. `duplicate_index_path` defaults to
+    DUPLICATE_INDEX_PATH, else to a file next to the output that a rerun without `resume` resets.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        print(f"Unknown output format '{output_format}'.")
+        raise ValueError(f"Unknown output format '{output_format}'. Expected one of: {', '.join(OUTPUT_FORMATS)}.")
+    if output_format == "parquet":
+        try:
+            import pyarrow  # noqa: F401 -- checked up front rather than after the whole run
+        except ImportError:
+            print("Parquet output requires pyarrow.")
+            raise ValueError("Parquet output requires pyarrow (pip install pyarrow).")
+
+    journal_path = output_path if output_format == "ndjson" else output_path + ".partial.ndjson"
+    if not resume and os.path.exists(journal_path):
+        os.remove(journal_path)
+    duplicate_index_path = duplicate_index_path or os.getenv("DUPLICATE_INDEX_PATH")
+    if duplicate_index_path is None:
+        duplicate_index_path = output_path + ".duplicates.sqlite3"
+        if not resume:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(duplicate_index_path + suffix):
+                    os.remove(duplicate_index_path + suffix)
+    finished = load_checkpoint(journal_path)
+    claims = [claim for claim in group_claims(pdf_dir) if claim[0] not in finished]
+    batch_size = concurrency * BATCH_CONCURRENCY_MULTIPLE
+    batches = [claims[i:i + batch_size] for i in range(0, len(claims), batch_size)]
+    # An explicit PDF_PARSER_WORKERS wins; otherwise the CPUs are shared between ingestion processes
+    # instead of giving each a full-size parser pool
+    parser_workers = int(os.getenv("PDF_PARSER_WORKERS", "0")) or max(1, available_cpu_count() // max(1, processes))
+    progress = Progress(len(claims), skipped=len(finished))
+
+    started = time.monotonic()
+    with open(journal_path, "a", encoding="utf-8") as journal:
+        def record(rows: List[Dict[str, Any]]) -> None:
+            done = [row for row in rows if _is_finished(row)]
+            for row in done:
+                journal.write(json.dumps(row) + "\n")
+            # Make the checkpoint durable before counting the batch as done
+            journal.flush()
+            os.fsync(journal.fileno())
+            progress.update(len(rows), len(rows) - len(done))
+
+        if processes == 0:
+            _init_worker(parser_workers, duplicate_index_path)
+            try:
+                for batch in batches:
+                    record(_run_batch(batch, raw_text_mode, concurrency))
+            finally:
+                _close_worker()
+        else:
+            executor: Optional[ProcessPoolExecutor] = None
+            # Keep a couple of batches queued per process rather than pickling the whole backlog up front
+            pending: Dict[Future, List[Claim]] = {}
+            remaining = iter(batches)
+            try:
+                while True:
+                    if executor is None:
+                        executor = ProcessPoolExecutor(
+                            processes, initializer=_init_worker, initargs=(parser_workers, duplicate_index_path)
+                        )
+                    for batch in remaining:
+                        pending[executor.submit(_run_batch, batch, raw_text_mode, concurrency)] = batch
+                        if len(pending) >= processes * 2:
+                            break
+                    if not pending:
+                        break
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    broken = False
+                    for future in done:
+                        batch = pending.pop(future)
+                        try:
+                            rows = future.result()
+                        except Exception as e:
+                            # E.g. a worker killed for running out of memory; the batch's claims are
+                            # counted as failed and retried on the next run
+                            print(f"Batch of {len(batch)} claims failed: {e!r}", file=sys.stderr)
+                            rows = _failed_rows(batch, str(e) or type(e).__name__)
+                            broken = broken or isinstance(e, BrokenProcessPool)
+                        record(rows)
+                    if broken:
+                        # A broken pool fails everything still queued on it; carry on with a fresh one
+                        executor.shutdown(wait=True, cancel_futures=True)
+                        executor = None
+            finally:
+                if executor is not None:
+                    executor.shutdown(wait=True)
+    progress.close()
+
+    summary = {
+        "claims": len(claims) + len(finished),
+        "processed": progress.done,
+        "failed": progress.failed,
+        "skipped": len(finished),
+        "seconds": round(time.monotonic() - started, 3),
+        "output": output_path,
+    }
+    if output_format == "parquet":
+        summary["rows"] = write_parquet(journal_path, output_path)
+    return summary
+
+def main() -> None:
+    load_dotenv()
+    default_pdf_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test_pdfs")
+    parser = argparse.ArgumentParser(description="Process a directory of claim PDFs offline.")
+    parser.add_argument("--pdf-dir", default=default_pdf_dir, help="Directory containing the claim PDFs.")
+    parser.add_argument("--output", required=True, help="Output file (NDJSON or Parquet).")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default=None,
+                        help="Output format (defaults from the output file's extension, else ndjson).")
+    parser.add_argument("--processes", type=int, default=available_cpu_count(),
+                        help="Worker processes; 0 runs everything in this process.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Claims in flight per process.")
+    parser.add_argument("--raw-text", choices=[mode.value for mode in RawTextMode], default=RawTextMode.OMIT.value,
+                        help="How much raw document text to keep in the output.")
+    parser.add_argument("--no-resume", action="store_true", help="Discard the checkpoint and start over.")
+    parser.add_argument("--duplicate-index", default=None,
+                        help="SQLite duplicate index shared by the workers (default: DUPLICATE_INDEX_PATH, "
+                             "else <output>.duplicates.sqlite3).")
+    args = parser.parse_args()
+
+    output_format = args.format or ("parquet" if args.output.endswith(".parquet") else "ndjson")
+    summary = ingest(
+        args.pdf_dir, args.output, output_format,
+        processes=args.processes, concurrency=max(1, args.concurrency),
+        raw_text_mode=RawTextMode(args.raw_text), resume=not args.no_resume,
+        duplicate_index_path=args.duplicate_index,
+    )
+    print(json.dumps(summary, indent=2))
+    # Failed claims are not checkpointed; a non-zero exit tells a scheduler to run again
+    sys.exit(1 if summary["failed"] else 0)
+
+if __name__ == "__main__":
+    main()
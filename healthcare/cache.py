@@ -0,0 +1,193 @@
+# cache.py
+import asyncio
+import copy
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+def sha256_bytes(data: bytes) -> str:
+    """
+    Returns the hex SHA-256 digest of raw bytes (e.g. an uploaded PDF).
+    """
+    return hashlib.sha256(data).hexdigest()
+
+def llm_cache_key(model_name: str, prompt: str, schema: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Builds a stable cache key for an LLM call from the model, prompt and response schema.
+    """
+    material = json.dumps(
+        {"model": model_name, "prompt": prompt, "schema": schema},
+        sort_keys=True, separators=(",", ":"),
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+class ResultCache:
+    """
+    A two-tier key/value cache: an in-memory LRU backed by an optional SQLite table.
+
+    Values must be JSON-serialisable so they survive the round trip through the disk tier. Values
+    are copied in and out, so callers may mutate what they get back. Async code should use
+    `aget`/`aset`, which run disk-tier SQLite calls in a worker thread. Entries are evicted when a tier exceeds its size limit or when they are older than `ttl_seconds`.
+    """
+    def __init__(
+        self,
+        name: str,
+        max_entries: int = 1024,
+        ttl_seconds: Optional[float] = None,
+        sqlite_path: Optional[str] = None,
+        max_disk_entries: int = 100_000,
+    ):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        # Disk eviction runs every `disk_evict_interval` writes rather than on every write
+        self.disk_evict_interval = 256
+        self._writes_since_evict = 0
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0, "evictions": 0}
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._table = f"cache_{name}"
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {self._table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Returns the cached value for `key`, or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if not self._is_expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["memory_hits"] += 1
+                    return copy.deepcopy(value)
+                del self._memory[key]
+                self._stats["evictions"] += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    f"SELECT value, created_at FROM {self._table} WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value_json, created_at = row
+                    if not self._is_expired(created_at, now):
+                        self._db.execute(
+                            f"UPDATE {self._table} SET accessed_at = ? WHERE key = ?", (now, key)
+                        )
+                        value = json.loads(value_json)
+                        self._put_memory(key, created_at, value)
+                        self._stats["hits"] += 1
+                        self._stats["disk_hits"] += 1
+                        return copy.deepcopy(value)
+                    self._db.execute(f"DELETE FROM {self._table} WHERE key = ?", (key,))
+                    self._stats["evictions"] += 1
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        Stores `value` under `key` in both tiers.
+        """
+        now = time.time()
+        with self._lock:
+            self._put_memory(key, now, copy.deepcopy(value))
+            if self._db is not None:
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO {self._table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now, now),
+                )
+                self._writes_since_evict += 1
+                if self._writes_since_evict >= self.disk_evict_interval:
+                    self._writes_since_evict = 0
+                    self._evict_disk(now)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """
+        Async form of `get`; with a disk tier the lookup runs in a worker thread.
+        """
+        if self._db is None:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any) -> None:
+        """
+        Async form of `set`; with a disk tier the write runs in a worker thread.
+        """
+        if self._db is None:
+            self.set(key, value)
+        else:
+            await asyncio.to_thread(self.set, key, value)
+
+    def _put_memory(self, key: str, created_at: float, value: Any) -> None:
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _evict_disk(self, now: float) -> None:
+        if self.ttl_seconds is not None:
+            cursor = self._db.execute(
+                f"DELETE FROM {self._table} WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+            self._stats["evictions"] += max(cursor.rowcount, 0)
+        (count,) = self._db.execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()
+        overflow = count - self.max_disk_entries
+        if overflow > 0:
+            # Drop the least recently used rows
+            cursor = self._db.execute(
+                f"DELETE FROM {self._table} WHERE key IN "
+                f"(SELECT key FROM {self._table} ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,),
+            )
+            self._stats["evictions"] += max(cursor.rowcount, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns hit/miss counters and current tier sizes.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            if self._db is not None:
+                (stats["disk_entries"],) = self._db.execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self) -> None:
+        """
+        Removes every entry from both tiers.
+        """
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute(f"DELETE FROM {self._table}")
+
+    def close(self) -> None:
+        """
+        Closes the disk tier, if any.
+        """
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,215 @@
+# claim_sessions.py
+import asyncio
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from typing import Dict, Optional, Sequence
+from fastapi import UploadFile
+
+from metrics import claim_trace, log_event
+from orchestrator import ClaimOrchestrator
+from schemas import ClaimSession, ClaimSessionDocument, ClaimSessionResponse
+
+class ClaimSessionNotFoundError(KeyError):
+    """Raised when a claim session does not exist or has expired."""
+
+class ClaimSessionStore:
+    """
+    Keeps claim sessions in memory, or in SQLite when `db_path` is given so they survive restarts.
+    Sessions not updated for `ttl_seconds` are dropped.
+    """
+    def __init__(self, db_path: Optional[str] = None, ttl_seconds: Optional[float] = None):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._memory: Dict[str, str] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS claim_sessions ("
+                "id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _is_expired(self, session: ClaimSession) -> bool:
+        return self.ttl_seconds is not None and time.time() - session.updated_at > self.ttl_seconds
+
+    def get(self, session_id: str) -> Optional[ClaimSession]:
+        with self._lock:
+            if self._db is not None:
+                row = self._db.execute("SELECT state FROM claim_sessions WHERE id = ?", (session_id,)).fetchone()
+                state = row[0] if row is not None else None
+            else:
+                state = self._memory.get(session_id)
+        if state is None:
+            return None
+        session = ClaimSession.model_validate_json(state)
+        if self._is_expired(session):
+            self.delete(session_id)
+            return None
+        return session
+
+    def save(self, session: ClaimSession) -> None:
+        state = session.model_dump_json()
+        with self._lock:
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO claim_sessions (id, state, updated_at) VALUES (?, ?, ?)",
+                    (session.session_id, state, session.updated_at),
+                )
+            else:
+                self._memory[session.session_id] = state
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            if self._db is not None:
+                return self._db.execute("DELETE FROM claim_sessions WHERE id = ?", (session_id,)).rowcount > 0
+            return self._memory.pop(session_id, None) is not None
+
+    def purge_expired(self) -> int:
+        """
+        Deletes expired sessions and returns how many were removed.
+        """
+        if self.ttl_seconds is None:
+            return 0
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            if self._db is not None:
+                return max(self._db.execute("DELETE FROM claim_sessions WHERE updated_at < ?", (cutoff,)).rowcount, 0)
+            expired = [
+                session_id for session_id, state in self._memory.items()
+                if ClaimSession.model_validate_json(state).updated_at < cutoff
+            ]
+            for session_id in expired:
+                del self._memory[session_id]
+            return len(expired)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+class ClaimSessionManager:
+    """
+    Incremental claim processing. A session keeps each document's ProcessedDocument, so when
+    documents are added, replaced or removed only the new or changed files go through the
+    pipeline; validation and the claim decision are then rerun on the whole updated set.
+
+    Documents are identified by filename. An upload whose bytes match a document already in the
+    session (same SHA-256) reuses that result instead of being processed again. Results with an
+    `error` (e.g. the LLM provider was degraded) are never reused: an upload with the same bytes is
+    processed again, and until then the document stays in the session, is not reported as reused
+    and keeps the claim provider_degraded.
+    """
+    def __init__(self, orchestrator: ClaimOrchestrator, store: Optional[ClaimSessionStore] = None):
+        self.orchestrator = orchestrator
+        self.store = store if store is not None else ClaimSessionStore()
+        # One update at a time per session; concurrent updates would overwrite each other
+        self._session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def _lock_for(self, session_id: str) -> asyncio.Lock:
+        lock = self._session_locks.get(session_id)
+        if lock is None:
+            lock = self._session_locks[session_id] = asyncio.Lock()
+        return lock
+
+    async def get(self, session_id: str) -> ClaimSession:
+        session = await asyncio.to_thread(self.store.get, session_id)
+        if session is None:
+            raise ClaimSessionNotFoundError(f"Claim session {session_id} not found.")
+        return session
+
+    async def create(self, files: Sequence[UploadFile], claim_id: Optional[str] = None) -> ClaimSessionResponse:
+        """
+        Starts a session with the given documents and assesses the claim.
+        """
+        if not files:
+            raise ValueError("No files provided for claim processing.")
+        await asyncio.to_thread(self.store.purge_expired)
+        now = time.time()
+        session_id = uuid.uuid4().hex
+        session = ClaimSession(session_id=session_id, claim_id=claim_id or session_id, created_at=now, updated_at=now)
+        async with self._lock_for(session_id):
+            return await self._apply(session, files, [])
+
+    async def update(
+        self, session_id: str, files: Sequence[UploadFile] = (), remove: Sequence[str] = ()
+    ) -> ClaimSessionResponse:
+        """
+        Adds `files` (replacing documents with the same filename) and removes the documents named
+        in `remove`, then reassesses the claim. Only new or changed files are processed.
+        """
+        async with self._lock_for(session_id):
+            session = await self.get(session_id)
+            return await self._apply(session, files, remove)
+
+    async def delete(self, session_id: str) -> None:
+        if not await asyncio.to_thread(self.store.delete, session_id):
+            raise ClaimSessionNotFoundError(f"Claim session {session_id} not found.")
+
+    async def _apply(self, session: ClaimSession, files: Sequence[UploadFile], remove: Sequence[str]) -> ClaimSessionResponse:
+        current = {entry.document.filename: entry for entry in session.documents}
+        unknown = [filename for filename in remove if filename not in current]
+        if unknown:
+            raise ValueError(f"Cannot remove documents not in the session: {', '.join(unknown)}.")
+        if not files and len(set(remove)) == len(current):
+            raise ValueError("A claim session must keep at least one document.")
+
+        with claim_trace():
+            started = time.perf_counter()
+            uploads = await self.orchestrator.spool_uploads(files)
+            try:
+                # Documents the LLM provider could not process are never reused
+                by_hash = {entry.sha256: entry for entry in session.documents if not entry.document.error}
+                documents = {filename: entry for filename, entry in current.items() if filename not in remove}
+                # Kept documents count as reused unless they failed; uploads below override by filename
+                reused = {filename for filename, entry in documents.items() if not entry.document.error}
+                to_process = []
+                for upload in uploads:
+                    existing = by_hash.get(upload.sha256)
+                    if existing is not None:
+                        # Same bytes as a document we already have, possibly under another name
+                        documents[upload.filename] = ClaimSessionDocument(
+                            sha256=upload.sha256,
+                            document=existing.document.model_copy(update={"filename": upload.filename}),
+                        )
+                        reused.add(upload.filename)
+                    else:
+                        to_process.append(upload)
+                        reused.discard(upload.filename)
+
+                processed = await self.orchestrator.process_documents(to_process)
+                for upload, document in zip(to_process, processed):
+                    documents[upload.filename] = ClaimSessionDocument(sha256=upload.sha256, document=document)
+            finally:
+                self.orchestrator.upload_spooler.remove(uploads)
+
+            processed_filenames = [upload.filename for upload in to_process]
+            reused_filenames = [filename for filename in documents if filename in reused]
+            session.documents = list(documents.values())
+            processed_documents = [entry.document for entry in session.documents]
+            session.validation, session.claim_decision = await self.orchestrator.assess_claim(
+                processed_documents, session.claim_id
+            )
+            session.updated_at = time.time()
+            await asyncio.to_thread(self.store.save, session)
+            log_event(
+                "claim_session_updated", session_id=session.session_id, processed=len(to_process),
+                reused=len(reused_filenames), removed=len(remove), status=session.claim_decision.status,
+                duration_ms=round((time.perf_counter() - started) * 1000, 1),
+            )
+
+        return ClaimSessionResponse(
+            session_id=session.session_id,
+            documents=processed_documents,
+            validation=session.validation,
+            claim_decision=session.claim_decision,
+            processed=processed_filenames,
+            reused=reused_filenames,
+        )
+
+    def close(self) -> None:
+        self.store.close()
@@ -0,0 +1,299 @@
+# duplicate_index.py
+import argparse
+import contextlib
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from schemas import BillData, DocumentType, ProcessedDocument
+
+SIMHASH_BITS = 64
+_MASK = (1 << SIMHASH_BITS) - 1
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_PARENTHETICAL_PATTERN = re.compile(r"\([^)]*\)")
+# Words that vary between spellings of the same hospital's name
+_NAME_NOISE = {"the", "pvt", "private", "ltd", "limited", "llp", "inc"}
+
+def bill_key(bill: BillData) -> Optional[str]:
+    """
+    Returns the normalised (hospital name, total amount, date of service) key of a bill, or
+    None when any of the three is missing.
+    """
+    if not bill.hospital_name or not bill.total_amount or not bill.date_of_service:
+        return None
+    name = _PARENTHETICAL_PATTERN.sub(" ", bill.hospital_name.lower())
+    tokens = [
+        "hospital" if token == "hospitals" else token
+        for token in _TOKEN_PATTERN.findall(name) if token not in _NAME_NOISE
+    ]
+    if not tokens:
+        return None
+    return f"{' '.join(tokens)}|{bill.total_amount:.2f}|{bill.date_of_service}"
+
+# _BIT_TABLES[j] maps a byte to 1 if its bit j is set, so bytes.translate + count tallies one bit
+_BIT_TABLES = [bytes((value >> bit) & 1 for value in range(256)) for bit in range(8)]
+
+def simhash(text: str, shingle_size: int = 3, min_tokens: int = 50) -> Optional[int]:
+    """
+    Returns the 64-bit SimHash of the text's set of word shingles, or None when the text is too
+    short to fingerprint reliably. Near-identical texts get hashes a few bits apart.
+    """
+    tokens = _TOKEN_PATTERN.findall(text.lower())
+    if len(tokens) < min_tokens:
+        return None
+    # Page headers repeat on every page; each distinct shingle counts once
+    shingles = {" ".join(tokens[start:start + shingle_size]) for start in range(len(tokens) - shingle_size + 1)}
+    digests = b"".join(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest() for shingle in shingles)
+    # Count set bits column by column over the packed digests instead of bit by bit in Python
+    fingerprint = 0
+    for byte_index in range(8):
+        column = digests[byte_index::8]
+        for bit in range(8):
+            if 2 * column.translate(_BIT_TABLES[bit]).count(1) > len(shingles):
+                fingerprint |= 1 << ((7 - byte_index) * 8 + bit)
+    return fingerprint
+
+def _to_signed(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << SIMHASH_BITS) if value >= 1 << (SIMHASH_BITS - 1) else value
+
+class DuplicateMatch(NamedTuple):
+    """A previously indexed bill that matches a new one."""
+    kind: str  # "exact" (same normalised fields) or "near" (similar text)
+    claim_id: str
+    filename: str
+    distance: int  # SimHash bit distance; 0 for exact matches
+
+class DuplicateIndex:
+    """
+    Index of every bill seen in earlier claims, for catching the same bill submitted twice.
+
+    Bills are keyed on their normalised (hospital name, total amount, date of service) and on a
+    SimHash of their raw text. Both live in memory for lookups that take microseconds: exact keys
+    in a dict, and SimHashes in LSH bands so that any hash within `max_distance` bits shares at
+    least one band with the query (pigeonhole), and only those candidates are compared.
+    Entries are persisted to SQLite and loaded back on start-up. Several processes can share one
+    SQLite file: each lookup first loads the rows the others added, and `find_and_add` checks and
+    indexes a claim inside one write transaction, so two submissions of the same bill cannot both
+    pass the check.
+    """
+    def __init__(self, db_path: Optional[str] = None, max_distance: int = 4):
+        self.max_distance = max_distance
+        self._band_count = max_distance + 1
+        self._band_bits = SIMHASH_BITS // self._band_count
+        self._lock = threading.Lock()
+        # entry id -> (claim_id, filename, simhash)
+        self._entries: Dict[int, Tuple[str, str, Optional[int]]] = {}
+        self._exact: Dict[str, List[int]] = {}
+        self._bands: List[Dict[int, List[int]]] = [{} for _ in range(self._band_count)]
+        # claim id -> (key, simhash) of its bills, so re-validating a claim does not index them twice
+        self._claims: Dict[str, Set[Tuple[Optional[str], Optional[int]]]] = {}
+        # Without SQLite, entry ids are assigned here; with it they are the rows' ids
+        self._next_id = 1
+        self._last_row_id = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            # Other processes may hold the write lock for a moment
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30.0)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS bill_fingerprints ("
+                "id INTEGER PRIMARY KEY, claim_id TEXT NOT NULL, filename TEXT NOT NULL, "
+                "bill_key TEXT, simhash INTEGER, created_at REAL NOT NULL)"
+            )
+            self._refresh()
+
+    def _refresh(self) -> None:
+        # Loads rows added since the last call, including those written by other processes
+        for entry_id, claim_id, filename, key, signed_hash in self._db.execute(
+            "SELECT id, claim_id, filename, bill_key, simhash FROM bill_fingerprints WHERE id > ? ORDER BY id",
+            (self._last_row_id,),
+        ):
+            fingerprint = signed_hash & _MASK if signed_hash is not None else None
+            self._put_memory(entry_id, claim_id, filename, key, fingerprint)
+            self._last_row_id = entry_id
+
+    def _band_values(self, fingerprint: int) -> Iterator[Tuple[int, int]]:
+        band_mask = (1 << self._band_bits) - 1
+        for band in range(self._band_count):
+            yield band, (fingerprint >> (band * self._band_bits)) & band_mask
+
+    def _put_memory(self, entry_id: int, claim_id: str, filename: str, key: Optional[str], fingerprint: Optional[int]) -> None:
+        self._entries[entry_id] = (claim_id, filename, fingerprint)
+        self._claims.setdefault(claim_id, set()).add((key, fingerprint))
+        if key is not None:
+            self._exact.setdefault(key, []).append(entry_id)
+        if fingerprint is not None:
+            for band, value in self._band_values(fingerprint):
+                self._bands[band].setdefault(value, []).append(entry_id)
+
+    def _find(self, key: Optional[str], fingerprint: Optional[int], exclude_claim_id: Optional[str]) -> List[DuplicateMatch]:
+        matches: List[DuplicateMatch] = []
+        seen: Set[int] = set()
+        for entry_id in self._exact.get(key, ()) if key is not None else ():
+            claim_id, filename, _ = self._entries[entry_id]
+            if claim_id != exclude_claim_id:
+                seen.add(entry_id)
+                matches.append(DuplicateMatch("exact", claim_id, filename, 0))
+        if fingerprint is not None:
+            for band, value in self._band_values(fingerprint):
+                for entry_id in self._bands[band].get(value, ()):
+                    if entry_id in seen:
+                        continue
+                    seen.add(entry_id)
+                    claim_id, filename, other = self._entries[entry_id]
+                    distance = (fingerprint ^ other).bit_count()
+                    if distance <= self.max_distance and claim_id != exclude_claim_id:
+                        matches.append(DuplicateMatch("near", claim_id, filename, distance))
+        return matches
+
+    def _add(self, bills: Iterable[Tuple[str, str, Optional[str], Optional[int]]]) -> int:
+        now = time.time()
+        added = 0
+        for claim_id, filename, key, fingerprint in bills:
+            if (key is None and fingerprint is None) or (key, fingerprint) in self._claims.get(claim_id, ()):
+                continue
+            if self._db is not None:
+                cursor = self._db.execute(
+                    "INSERT INTO bill_fingerprints (claim_id, filename, bill_key, simhash, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (claim_id, filename, key, _to_signed(fingerprint) if fingerprint is not None else None, now),
+                )
+                entry_id = self._last_row_id = cursor.lastrowid
+            else:
+                entry_id = self._next_id
+                self._next_id += 1
+            self._put_memory(entry_id, claim_id, filename, key, fingerprint)
+            added += 1
+        return added
+
+    @contextlib.contextmanager
+    def _write_transaction(self) -> Iterator[None]:
+        """
+        Holds the lock and, with SQLite, its write lock, after catching up with other processes.
+        """
+        with self._lock:
+            if self._db is None:
+                yield
+                return
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                yield
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                # Rows added to memory in the rolled-back transaction must go too
+                self._reload()
+                raise
+            self._db.execute("COMMIT")
+
+    def _reload(self) -> None:
+        self._entries.clear()
+        self._exact.clear()
+        self._claims.clear()
+        for band in self._bands:
+            band.clear()
+        self._last_row_id = 0
+        self._refresh()
+
+    def find(self, key: Optional[str], fingerprint: Optional[int], exclude_claim_id: Optional[str] = None) -> List[DuplicateMatch]:
+        """
+        Returns indexed bills with the same key or a SimHash within `max_distance` bits,
+        ignoring those of `exclude_claim_id` (e.g. the claim itself on a retry).
+        """
+        with self._lock:
+            if self._db is not None:
+                self._refresh()
+            return self._find(key, fingerprint, exclude_claim_id)
+
+    def add_many(self, bills: Iterable[Tuple[str, str, Optional[str], Optional[int]]]) -> int:
+        """
+        Indexes (claim_id, filename, key, simhash) records in one transaction; returns how many were
+        added. Bills already indexed for the same claim are skipped.
+        """
+        with self._write_transaction():
+            return self._add(bills)
+
+    def find_and_add(
+        self, claim_id: Optional[str], bills: List[Tuple[str, Optional[str], Optional[int]]]
+    ) -> List[List[DuplicateMatch]]:
+        """
+        Looks up each (filename, key, simhash) of a claim, ignoring the claim's own bills, then
+        indexes them under `claim_id`, as one step. Returns the matches per bill. Without a
+        `claim_id` the bills are only looked up.
+        """
+        with self._write_transaction():
+            matches = [self._find(key, fingerprint, claim_id) for _, key, fingerprint in bills]
+            if claim_id is not None:
+                self._add((claim_id, filename, key, fingerprint) for filename, key, fingerprint in bills)
+            return matches
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"bills": len(self._entries), "claims": len(self._claims), "exact_keys": len(self._exact)}
+
+    def close(self) -> None:
+        """
+        Closes the SQLite store, if any.
+        """
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+def bill_fingerprints(documents: Iterable[ProcessedDocument]) -> List[Tuple[ProcessedDocument, Optional[str], Optional[int]]]:
+    """
+    Returns (document, key, simhash) for each bill among the documents.
+    """
+    return [
+        (document, bill_key(document.data), simhash(document.raw_text) if document.raw_text else None)
+        for document in documents
+        if document.type == DocumentType.BILL and isinstance(document.data, BillData)
+    ]
+
+def load_ndjson(index: DuplicateIndex, path: str, batch_size: int = 1000) -> int:
+    """
+    Bulk-loads historical claims from an NDJSON file with one claim per line:
+    `{"claim_id": ..., "documents": [...]}`, documents shaped like ProcessedDocument.
+    """
+    loaded = 0
+    batch: List[Tuple[str, str, Optional[str], Optional[int]]] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                claim = json.loads(line)
+                documents = [ProcessedDocument(**document) for document in claim["documents"]]
+                claim_id = str(claim["claim_id"])
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Skipping line {line_number} of {path}: {e}")
+                continue
+            batch.extend(
+                (claim_id, document.filename, key, fingerprint)
+                for document, key, fingerprint in bill_fingerprints(documents)
+            )
+            if len(batch) >= batch_size:
+                loaded += index.add_many(batch)
+                batch = []
+    return loaded + index.add_many(batch)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the duplicate bill index from historical claims.")
+    parser.add_argument("db_path", help="SQLite file of the index (DUPLICATE_INDEX_PATH).")
+    parser.add_argument("claims", nargs="+", help="NDJSON files with one {claim_id, documents} record per line.")
+    parser.add_argument("--max-distance", type=int, default=4, help="SimHash bit distance counted as a near duplicate.")
+    args = parser.parse_args()
+
+    index = DuplicateIndex(args.db_path, max_distance=args.max_distance)
+    started = time.perf_counter()
+    loaded = sum(load_ndjson(index, path) for path in args.claims)
+    print(f"Indexed {loaded} bills in {time.perf_counter() - started:.1f}s; index now holds {index.stats()['bills']} bills.")
+    index.close()
+
+if __name__ == "__main__":
+    main()
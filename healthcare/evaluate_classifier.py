@@ -0,0 +1,110 @@
+# evaluate_classifier.py
+"""
+Offline evaluation of the local document classifier against labelled PDFs.
+
+Usage (from the healthcare directory):
+    python evaluate_classifier.py --pdf-dir ../test_pdfs --threshold 0.6 [--json]
+
+Labels are read from `<pdf-dir>/labels.json`, which maps each filename to its document-level
+type and, optionally, page ranges with per-page types. Pages without extractable text
+(scanned images) are skipped. A prediction "falls back" when its confidence is below the
+threshold, i.e. when the pipeline would have asked the LLM instead.
+"""
+import argparse
+import json
+import os
+import time
+from typing import Any, Dict, List
+
+from local_classifier import LocalDocumentClassifier
+from pdf_parser import LazyPDFDocument
+from schemas import DocumentType
+
+def _summarise(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    total = len(results)
+    if not total:
+        return {"samples": 0}
+    local = [r for r in results if not r["fallback"]]
+    return {
+        "samples": total,
+        "accuracy": sum(r["correct"] for r in results) / total,
+        "fallback_rate": (total - len(local)) / total,
+        # Accuracy of the decisions the pipeline would actually take locally
+        "local_accuracy": sum(r["correct"] for r in local) / len(local) if local else None,
+        "mean_latency_us": sum(r["latency_us"] for r in results) / total,
+    }
+
+def _evaluate(classifier: LocalDocumentClassifier, text: str, filename: str, expected: str, threshold: float,
+              use_filename: bool = True) -> Dict[str, Any]:
+    started = time.perf_counter()
+    predicted, confidence = classifier.classify(text, filename if use_filename else "")
+    latency_us = (time.perf_counter() - started) * 1_000_000
+    return {
+        "filename": filename,
+        "expected": expected,
+        "predicted": predicted.value,
+        "confidence": confidence,
+        "correct": predicted.value == expected,
+        "fallback": confidence < threshold,
+        "latency_us": latency_us,
+    }
+
+def evaluate(pdf_dir: str, labels_path: str, threshold: float) -> Dict[str, Any]:
+    """
+    Runs the classifier over every labelled PDF and returns document- and page-level metrics.
+    """
+    with open(labels_path, "r", encoding="utf-8") as f:
+        labels = json.load(f)
+
+    classifier = LocalDocumentClassifier()
+    document_results, page_results = [], []
+    for filename, label in sorted(labels.items()):
+        document = LazyPDFDocument(os.path.join(pdf_dir, filename))
+        text = document.text()
+        document_results.append(_evaluate(classifier, text, filename, label["type"], threshold))
+
+        for page_range in label.get("pages", []):
+            for index in range(page_range["start"], page_range["end"] + 1):
+                page_text = document.page_text(index)
+                if not page_text.strip():
+                    continue
+                # Pages are scored on their text alone; the filename describes the whole upload
+                result = _evaluate(classifier, page_text, filename, page_range["type"], threshold, use_filename=False)
+                result["page"] = index
+                page_results.append(result)
+        document.close()
+
+    return {
+        "threshold": threshold,
+        "labels": [dt.value for dt in DocumentType],
+        "documents": {"summary": _summarise(document_results), "results": document_results},
+        "pages": {"summary": _summarise(page_results), "results": page_results},
+    }
+
+def main() -> None:
+    default_pdf_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test_pdfs")
+    parser = argparse.ArgumentParser(description="Evaluate the local document classifier.")
+    parser.add_argument("--pdf-dir", default=default_pdf_dir, help="Directory containing the labelled PDFs.")
+    parser.add_argument("--labels", default=None, help="Labels file (defaults to <pdf-dir>/labels.json).")
+    parser.add_argument("--threshold", type=float, default=0.6, help="Confidence below which the LLM would be used.")
+    parser.add_argument("--json", action="store_true", help="Print the full report as JSON.")
+    args = parser.parse_args()
+
+    report = evaluate(args.pdf_dir, args.labels or os.path.join(args.pdf_dir, "labels.json"), args.threshold)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    for level in ("documents", "pages"):
+        summary = report[level]["summary"]
+        print(f"[{level}] samples={summary['samples']} accuracy={summary.get('accuracy', 0):.3f} "
+              f"fallback_rate={summary.get('fallback_rate', 0):.3f} "
+              f"local_accuracy={summary.get('local_accuracy') or 0:.3f} "
+              f"mean_latency={summary.get('mean_latency_us', 0):.1f}us")
+        for result in report[level]["results"]:
+            if not result["correct"]:
+                where = f"{result['filename']} page {result['page']}" if "page" in result else result["filename"]
+                print(f"  miss: {where}: expected {result['expected']}, got {result['predicted']} ({result['confidence']})")
+
+if __name__ == "__main__":
+    main()
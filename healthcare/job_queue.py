@@ -0,0 +1,298 @@
+# job_queue.py
+import asyncio
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+from fastapi import UploadFile
+
+from llm_resilience import PROVIDER_DEGRADED, ProviderDegradedError
+from llm_scheduler import RequestClass, llm_request_class
+from metrics import correlation_id
+from orchestrator import ClaimOrchestrator
+from schemas import ClaimJobStatus, ClaimProcessingResponse
+from uploads import SpooledUpload, UploadSpooler
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+class QueueFullError(Exception):
+    """Raised when a submission would exceed the queue's backpressure limit."""
+
+class ClaimJobQueue:
+    """
+    Persistent claim job queue backed by SQLite, with uploaded files spooled to disk.
+
+    Jobs are handed out round-robin across tenants so one tenant's batch cannot starve the
+    others, and failed jobs are retried with exponential backoff up to `max_attempts` times.
+    The synchronous methods block on SQLite; call them from the event loop via `asyncio.to_thread`.
+    """
+    def __init__(
+        self,
+        db_path: str = "claim_jobs.sqlite3",
+        spool_dir: str = "claim_job_files",
+        max_attempts: int = 3,
+        retry_backoff_seconds: float = 5.0,
+        max_queued_jobs: int = 10_000,
+        upload_spooler: Optional[UploadSpooler] = None,
+    ):
+        self.spool_dir = spool_dir
+        # Applies the upload size limits while job files are streamed into the spool directory
+        self.upload_spooler = upload_spooler if upload_spooler is not None else UploadSpooler()
+        self.max_attempts = max_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.max_queued_jobs = max_queued_jobs
+        os.makedirs(spool_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # When each tenant was last handed a job; drives the round-robin between tenants
+        self._tenant_last_served: Dict[str, float] = {}
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS claim_jobs ("
+            "id TEXT PRIMARY KEY, tenant_id TEXT NOT NULL, status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL, next_attempt_at REAL NOT NULL, "
+            "error TEXT, result TEXT)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS claim_job_files ("
+            "job_id TEXT NOT NULL, position INTEGER NOT NULL, filename TEXT NOT NULL, path TEXT NOT NULL, "
+            "PRIMARY KEY (job_id, position))"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_claim_jobs_dispatch ON claim_jobs (status, tenant_id, next_attempt_at, created_at)"
+        )
+        # Jobs that were running when the process stopped are picked up again
+        self._db.execute(
+            "UPDATE claim_jobs SET status = ?, updated_at = ? WHERE status = ?",
+            (JOB_QUEUED, time.time(), JOB_RUNNING),
+        )
+
+    def queued_count(self) -> int:
+        with self._lock:
+            (count,) = self._db.execute(
+                "SELECT COUNT(*) FROM claim_jobs WHERE status IN (?, ?)", (JOB_QUEUED, JOB_RUNNING)
+            ).fetchone()
+        return count
+
+    async def submit(self, files: List[UploadFile], tenant_id: str = "default") -> ClaimJobStatus:
+        """
+        Spools the uploaded files to disk and enqueues a claim job for them.
+        """
+        return (await self.submit_many([files], tenant_id))[0]
+
+    async def submit_many(self, claims: List[List[UploadFile]], tenant_id: str = "default") -> List[ClaimJobStatus]:
+        """
+        Enqueues one job per claim. Either every claim is accepted or none is.
+        """
+        if not claims or any(not files for files in claims):
+            raise ValueError("No files provided for claim processing.")
+        if await asyncio.to_thread(self.queued_count) + len(claims) > self.max_queued_jobs:
+            raise QueueFullError(f"Claim queue is full ({self.max_queued_jobs} jobs pending). Retry later.")
+
+        now = time.time()
+        jobs: List[Tuple[str, List[Tuple[int, str, str]]]] = []
+        try:
+            for files in claims:
+                job_id = uuid.uuid4().hex
+                job_dir = os.path.join(self.spool_dir, job_id)
+                os.makedirs(job_dir)
+                jobs.append((job_id, []))
+                uploads = await self.upload_spooler.spool(files, directory=job_dir)
+                jobs[-1][1].extend(
+                    (position, upload.filename, upload.path) for position, upload in enumerate(uploads)
+                )
+        except Exception:
+            for job_id, _ in jobs:
+                shutil.rmtree(os.path.join(self.spool_dir, job_id), ignore_errors=True)
+            raise
+
+        return await asyncio.to_thread(self._insert_jobs, jobs, tenant_id, now)
+
+    def _insert_jobs(
+        self, jobs: List[Tuple[str, List[Tuple[int, str, str]]]], tenant_id: str, now: float
+    ) -> List[ClaimJobStatus]:
+        with self._lock:
+            self._db.execute("BEGIN")
+            for job_id, job_files in jobs:
+                self._db.execute(
+                    "INSERT INTO claim_jobs (id, tenant_id, status, attempts, max_attempts, created_at, updated_at, next_attempt_at) "
+                    "VALUES (?, ?, ?, 0, ?, ?, ?, ?)",
+                    (job_id, tenant_id, JOB_QUEUED, self.max_attempts, now, now, now),
+                )
+                self._db.executemany(
+                    "INSERT INTO claim_job_files (job_id, position, filename, path) VALUES (?, ?, ?, ?)",
+                    [(job_id, position, filename, path) for position, filename, path in job_files],
+                )
+            self._db.execute("COMMIT")
+        return [self.get_status(job_id) for job_id, _ in jobs]
+
+    def get_status(self, job_id: str) -> Optional[ClaimJobStatus]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, tenant_id, status, attempts, max_attempts, created_at, updated_at, error "
+                "FROM claim_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return ClaimJobStatus(
+            job_id=row[0], tenant_id=row[1], status=row[2], attempts=row[3], max_attempts=row[4],
+            created_at=row[5], updated_at=row[6], error=row[7],
+        )
+
+    def get_result(self, job_id: str) -> Optional[ClaimProcessingResponse]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT result FROM claim_jobs WHERE id = ? AND status = ?", (job_id, JOB_SUCCEEDED)
+            ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return ClaimProcessingResponse.model_validate_json(row[0])
+
+    def get_files(self, job_id: str) -> List[Tuple[str, str]]:
+        with self._lock:
+            return self._db.execute(
+                "SELECT filename, path FROM claim_job_files WHERE job_id = ? ORDER BY position", (job_id,)
+            ).fetchall()
+
+    def claim_next(self) -> Optional[str]:
+        """
+        Marks the next due job as running and returns its id. Tenants are served round-robin:
+        the tenant that was served least recently goes first.
+        """
+        now = time.time()
+        with self._lock:
+            tenants = [
+                tenant_id for (tenant_id,) in self._db.execute(
+                    "SELECT DISTINCT tenant_id FROM claim_jobs WHERE status = ? AND next_attempt_at <= ?",
+                    (JOB_QUEUED, now),
+                )
+            ]
+            if not tenants:
+                return None
+            tenant_id = min(tenants, key=lambda tenant: self._tenant_last_served.get(tenant, 0.0))
+            (job_id,) = self._db.execute(
+                "SELECT id FROM claim_jobs WHERE status = ? AND tenant_id = ? AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at, created_at LIMIT 1",
+                (JOB_QUEUED, tenant_id, now),
+            ).fetchone()
+            self._db.execute(
+                "UPDATE claim_jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (JOB_RUNNING, now, job_id),
+            )
+            self._tenant_last_served[tenant_id] = now
+        return job_id
+
+    def complete(self, job_id: str, result: ClaimProcessingResponse) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE claim_jobs SET status = ?, result = ?, error = NULL, updated_at = ? WHERE id = ?",
+                (JOB_SUCCEEDED, result.model_dump_json(), time.time(), job_id),
+            )
+        self._remove_files(job_id)
+
+    def fail(self, job_id: str, error: str) -> None:
+        """
+        Records a failed attempt: the job is requeued with exponential backoff, or marked
+        failed once it has used all of its attempts.
+        """
+        now = time.time()
+        with self._lock:
+            attempts, max_attempts = self._db.execute(
+                "SELECT attempts, max_attempts FROM claim_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if attempts < max_attempts:
+                delay = self.retry_backoff_seconds * (2 ** (attempts - 1))
+                self._db.execute(
+                    "UPDATE claim_jobs SET status = ?, error = ?, next_attempt_at = ?, updated_at = ? WHERE id = ?",
+                    (JOB_QUEUED, error, now + delay, now, job_id),
+                )
+                return
+            self._db.execute(
+                "UPDATE claim_jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                (JOB_FAILED, error, now, job_id),
+            )
+        self._remove_files(job_id)
+
+    def _remove_files(self, job_id: str) -> None:
+        shutil.rmtree(os.path.join(self.spool_dir, job_id), ignore_errors=True)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+class ClaimJobWorkerPool:
+    """
+    Runs `concurrency` asyncio workers that pull jobs from a ClaimJobQueue and process them
+    with the claim orchestrator.
+    """
+    def __init__(self, queue: ClaimJobQueue, orchestrator: ClaimOrchestrator, concurrency: int = 4, poll_interval_seconds: float = 1.0):
+        self.queue = queue
+        self.orchestrator = orchestrator
+        self.concurrency = concurrency
+        self.poll_interval_seconds = poll_interval_seconds
+        self._wakeup = asyncio.Event()
+        self._workers: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._workers = [asyncio.create_task(self._run_worker()) for _ in range(self.concurrency)]
+
+    def notify(self) -> None:
+        """
+        Wakes idle workers after new jobs were submitted.
+        """
+        self._wakeup.set()
+
+    async def stop(self) -> None:
+        """
+        Cancels the workers. Jobs they were running are requeued when the queue is reopened.
+        """
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _run_worker(self) -> None:
+        # Queued claims yield LLM capacity to interactive /process-claim requests
+        llm_request_class.set(RequestClass.BATCH)
+        while True:
+            job_id = await asyncio.to_thread(self.queue.claim_next)
+            if job_id is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run_job(job_id)
+
+    async def _run_job(self, job_id: str) -> None:
+        # The job id doubles as the claim's correlation id in logs
+        token = correlation_id.set(job_id)
+        try:
+            # Job files are already on disk; the parser reads them in place
+            uploads = [
+                await SpooledUpload.from_path(path, filename)
+                for filename, path in await asyncio.to_thread(self.queue.get_files, job_id)
+            ]
+            # Jobs carry no claim id, so their bills are checked against the duplicate index but
+            # never added to it; a retried job is not flagged against its own earlier attempt
+            result = await self.orchestrator.process_claim(uploads)
+            if result.claim_decision.status == PROVIDER_DEGRADED:
+                # Retry the job with backoff once the provider recovers instead of storing the result
+                raise ProviderDegradedError(result.claim_decision.reason)
+            await asyncio.to_thread(self.queue.complete, job_id, result)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Claim job {job_id} failed: {e}")
+            await asyncio.to_thread(self.queue.fail, job_id, str(e))
+        finally:
+            correlation_id.reset(token)
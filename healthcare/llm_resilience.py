@@ -0,0 +1,174 @@
+# llm_resilience.py
+import contextlib
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, Optional
+
+# Claim decision status used when the LLM provider could not serve the claim
+PROVIDER_DEGRADED = "provider_degraded"
+
+# Absolute time.monotonic() by which LLM calls of the current claim must finish; tasks spawned
+# for the claim's documents inherit it
+llm_deadline: contextvars.ContextVar = contextvars.ContextVar("llm_deadline", default=None)
+
+class ProviderDegradedError(RuntimeError):
+    """
+    Raised by LLMClient when a call cannot be served: the circuit breaker is open, retryable
+    errors persisted through every retry, or the deadline ran out. Agents let it propagate so
+    the claim is reported as provider_degraded instead of being decided on empty extractions.
+    """
+
+class LLMDeadlineExceededError(ProviderDegradedError):
+    """Raised when the per-claim deadline expires before an LLM call completes."""
+
+@contextlib.contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[Optional[float]]:
+    """
+    Gives the LLM calls inside the block at most `seconds` (None = no limit). Nested scopes can
+    only shorten an outer deadline. Yields the effective absolute deadline.
+    """
+    current = llm_deadline.get()
+    if seconds is None:
+        yield current
+        return
+    deadline = time.monotonic() + seconds
+    if current is not None:
+        deadline = min(deadline, current)
+    token = llm_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        try:
+            llm_deadline.reset(token)
+        except ValueError:
+            # An abandoned streaming generator is finalised in another context; nothing to restore
+            pass
+
+def remaining_seconds() -> Optional[float]:
+    """
+    Seconds left before the current deadline, or None when there is none.
+    """
+    deadline = llm_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+def backoff_delay(attempt: int, base_seconds: float, max_seconds: float) -> float:
+    """
+    Full-jitter exponential backoff: a random delay up to base * 2**attempt, capped at max_seconds.
+    Spreads out retries so callers that failed together do not retry together.
+    """
+    return random.uniform(0.0, min(max_seconds, base_seconds * (2 ** attempt)))
+
+class LatencyTracker:
+    """
+    Keeps the most recent request latencies to derive the hedging delay from their percentile.
+    """
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """
+        Returns the given percentile (0-1) of recent latencies, or None with too few samples.
+        """
+        if len(self._samples) < self.min_samples:
+            return None
+        samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+class CircuitBreaker:
+    """
+    Fails LLM calls fast while the provider is unhealthy.
+
+    After `failure_threshold` consecutive failed attempts (timeouts, transport errors, 5xx) the
+    circuit opens and calls are rejected for `recovery_seconds`. Then it goes half-open and lets
+    `half_open_max_calls` probe calls through: a success closes it, a failure opens it again.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_seconds: float = 30.0, half_open_max_calls: int = 1):
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probed_at = 0.0
+        self._rejected = 0
+        self._times_opened = 0
+
+    def _refresh(self) -> None:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_seconds:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def allow(self) -> bool:
+        """
+        Returns whether a call may be sent now; counts it as a probe when half-open.
+        """
+        with self._lock:
+            self._refresh()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN:
+                now = time.monotonic()
+                if self._probes >= self.half_open_max_calls and now - self._probed_at >= self.recovery_seconds:
+                    # The probes never reported back (e.g. cancelled); let new ones through
+                    self._probes = 0
+                if self._probes < self.half_open_max_calls:
+                    self._probes += 1
+                    self._probed_at = now
+                    return True
+            self._rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._consecutive_failures = 0
+            self._state = self.CLOSED
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == self.HALF_OPEN or (
+                self._state == self.CLOSED and self._consecutive_failures >= self.failure_threshold
+            ):
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._times_opened += 1
+
+    def retry_after(self) -> float:
+        """
+        Seconds until the circuit lets a probe through (0 unless open).
+        """
+        with self._lock:
+            self._refresh()
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self.recovery_seconds - (time.monotonic() - self._opened_at))
+
+    def stats(self) -> Dict[str, Any]:
+        retry_after = self.retry_after()
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._consecutive_failures,
+                "times_opened": self._times_opened,
+                "rejected_calls": self._rejected,
+                "retry_after_seconds": round(retry_after, 3),
+            }
@@ -0,0 +1,208 @@
+# llm_scheduler.py
+import asyncio
+import contextvars
+import enum
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+class RequestClass(enum.IntEnum):
+    """Who is waiting for an LLM call. Lower values are served first."""
+    INTERACTIVE = 0
+    BATCH = 1
+
+class RequestStage(enum.IntEnum):
+    """Pipeline stage issuing an LLM call. Lower values are served first."""
+    CLASSIFICATION = 0
+    EXTRACTION = 1
+
+# Set to RequestClass.BATCH by background workers; tasks spawned from there inherit it
+llm_request_class: contextvars.ContextVar = contextvars.ContextVar("llm_request_class", default=RequestClass.INTERACTIVE)
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token estimate for budgeting (about four characters per token).
+    """
+    return max(1, len(text) // 4)
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `rate_per_minute`, holding at most `capacity` tokens.
+    The level may go negative when actual usage turns out higher than estimated.
+    """
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_second)
+        self._updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Seconds until `amount` tokens are available (0 if they are available now).
+        """
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self._tokens >= amount:
+            return 0.0
+        return (amount - self._tokens) / self.rate_per_second
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self._tokens -= min(amount, self.capacity)
+
+    def adjust(self, amount: float) -> None:
+        """
+        Debits (positive) or credits (negative) tokens after the fact.
+        """
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens - amount)
+
+class LLMRequestScheduler:
+    """
+    Admits LLM calls in priority order while keeping within requests-per-minute and
+    tokens-per-minute budgets and a cap on concurrent calls.
+
+    Callers wait in a priority queue instead of failing when the budgets are exhausted:
+    interactive requests go before batch requests, and classification before extraction.
+    """
+    def __init__(
+        self,
+        max_concurrency: int = 20,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+        self._waiters: List[Tuple[int, int, int, float, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        self._admitted = 0
+        self._rate_limited = 0
+        self._wait_times: Deque[float] = deque(maxlen=1000)
+
+    def _admission_delay(self, tokens: int) -> float:
+        delay = max(0.0, self._paused_until - time.monotonic())
+        if self.request_bucket is not None:
+            delay = max(delay, self.request_bucket.wait_time(1))
+        if self.token_bucket is not None:
+            delay = max(delay, self.token_bucket.wait_time(tokens))
+        return delay
+
+    def _wake(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        while self._waiters:
+            self._wakeup.clear()
+            request_class, stage, _, enqueued_at, tokens, future = self._waiters[0]
+            if future.done():
+                # The caller gave up while queued
+                heapq.heappop(self._waiters)
+                continue
+            if self._in_flight >= self.max_concurrency:
+                await self._wakeup.wait()
+                continue
+            delay = self._admission_delay(tokens)
+            if delay > 0:
+                # Sleep until the budget refills, or until a higher-priority call or a free slot shows up
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._waiters)
+            if self.request_bucket is not None:
+                self.request_bucket.consume(1)
+            if self.token_bucket is not None:
+                self.token_bucket.consume(tokens)
+            self._in_flight += 1
+            self._admitted += 1
+            self._wait_times.append(time.monotonic() - enqueued_at)
+            future.set_result(None)
+
+    async def acquire(self, estimated_tokens: int, stage: RequestStage = RequestStage.EXTRACTION) -> None:
+        """
+        Waits until the call may be sent. Every successful acquire must be paired with `release()`.
+        """
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(
+            self._waiters,
+            (int(llm_request_class.get()), int(stage), next(self._sequence), time.monotonic(), estimated_tokens, future),
+        )
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as we were cancelled; hand the slot back
+                self.release()
+            raise
+
+    def release(self) -> None:
+        self._in_flight -= 1
+        if self._waiters:
+            self._wake()
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int, stage: RequestStage = RequestStage.EXTRACTION):
+        await self.acquire(estimated_tokens, stage)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """
+        Corrects the token budget once the provider reports actual usage.
+        """
+        if self.token_bucket is not None:
+            self.token_bucket.adjust(actual_tokens - min(estimated_tokens, self.token_bucket.capacity))
+
+    def pause(self, seconds: float) -> None:
+        """
+        Holds back all admissions for `seconds`, e.g. after the provider answered 429.
+        """
+        self._rate_limited += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns queue depth, in-flight count and recent queue wait times for monitoring.
+        """
+        depth_by_priority: Dict[str, int] = {}
+        for request_class, stage, _, _, _, future in self._waiters:
+            if not future.done():
+                key = f"{RequestClass(request_class).name.lower()}:{RequestStage(stage).name.lower()}"
+                depth_by_priority[key] = depth_by_priority.get(key, 0) + 1
+        waits = sorted(self._wait_times)
+        return {
+            "queue_depth": sum(depth_by_priority.values()),
+            "queue_depth_by_priority": depth_by_priority,
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "admitted": self._admitted,
+            "rate_limited_pauses": self._rate_limited,
+            "paused_for_seconds": max(0.0, self._paused_until - time.monotonic()),
+            "wait_seconds_avg": sum(waits) / len(waits) if waits else 0.0,
+            "wait_seconds_p95": waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+            "wait_seconds_max": waits[-1] if waits else 0.0,
+        }
@@ -0,0 +1,109 @@
+# local_classifier.py
+import re
+from typing import Dict, List, Pattern, Tuple
+from schemas import DocumentType
+
+# (anchors, pattern, weight) rules scored against the lower-cased document text. The regex only
+# runs when one of the plain-substring anchors occurs, which keeps a miss at C `in` speed.
+# PyPDF2 often drops the spaces between words on a line, so phrases allow zero or more spaces.
+TEXT_RULES: Dict[DocumentType, List[Tuple[Tuple[str, ...], str, float]]] = {
+    DocumentType.BILL: [
+        (("final",), r"final\s*(?:invoice|bill)", 3.0),
+        (("supply", "s u p p l y"), r"bill\s*of\s*s\s*u\s*p\s*p\s*l\s*y", 3.0),
+        (("itemi", "inpatient", "interim"),
+         r"itemi[sz]ed\s*bill|inpatient\s*bill|interim\s*(?:running\s*)?(?:payable\s*|non-payable\s*)?bill", 3.0),
+        (("invoice",), r"tax\s*invoice|\binvoice\s*(?:no|number)", 2.0),
+        (("bill",), r"\bbill\s*no\b|\bbill\s*number", 2.0),
+        (("gst",), r"\bgst\s*i?n\b|\bgst\s*no\b|\bgst1n\b", 2.0),
+        (("sac",), r"\bsac\s*(?:code)?\s*:?\s*\d{4,6}", 1.5),
+        (("total", "net", "gross"), r"(?:grand|net|gross)\s*(?:total|amount|payable)|total\s*amount|net\s*amt", 2.0),
+        (("(",), r"amo?u?n?t\s*\(\s*(?:rs|inr|`)", 1.5),
+        (("total",), r"\bdept\.?\s*(?:sub\s*)?total|sub\s*total", 1.0),
+        (("qty", "quantity"), r"\bqty\b|\bquantity\b", 0.5),
+        (("bill",), r"\bbill\b", 1.0),
+    ],
+    DocumentType.DISCHARGE_SUMMARY: [
+        (("summary",), r"discharge\s*summary", 5.0),
+        (("discharge",), r"date\s*of\s*discharge|discharge\s*date", 2.0),
+        (("discharge",), r"condition\s*(?:on|at)\s*discharge", 3.0),
+        (("discharge",), r"advice\s*on\s*discharge|discharge\s*(?:medications?|advice|instructions?)", 2.0),
+        (("diagnosis",), r"\bdiagnosis\b", 2.0),
+        (("complaint",), r"chief\s*complaints?|presenting\s*complaints?", 2.0),
+        (("history",), r"history\s*of\s*present\s*illness|past\s*history", 1.5),
+        (("course",), r"course\s*in\s*(?:the\s*)?hospital|hospital\s*course", 2.0),
+        (("follow",), r"follow[\s-]*up", 1.0),
+        (("admission", "surgery"), r"date\s*of\s*(?:admission|surgery)", 1.0),
+    ],
+    DocumentType.ID_CARD: [
+        (("card",), r"(?:health|insurance|e-?|mediclaim|member)\s*card", 3.0),
+        (("card",), r"\bcard\s*(?:no|number)", 2.0),
+        (("member", "employee", "uhid"), r"member\s*id|employee\s*id|\buhid\s*card", 1.5),
+        (("valid",), r"valid\s*(?:from|till|upto|up\s*to)|validity", 2.0),
+        (("aadha", "pan"), r"\baadhaa?r\b|\bpan\s*card\b", 2.0),
+        (("birth", "dob", "d.o.b"), r"date\s*of\s*birth|\bd\.?o\.?b\b", 1.0),
+    ],
+}
+
+FILENAME_RULES: Dict[DocumentType, List[Tuple[Tuple[str, ...], str, float]]] = {
+    DocumentType.BILL: [(("bill", "invoice", "receipt"), r"bill|invoice|receipt", 2.0)],
+    DocumentType.DISCHARGE_SUMMARY: [(("discharge", "summary", "ds"), r"discharge|summary|\bds\b", 2.0)],
+    DocumentType.ID_CARD: [(("card", "id", "aadha"), r"card|\bid\b|aadhaa?r", 2.0)],
+}
+
+CompiledRule = Tuple[Tuple[str, ...], Pattern, float]
+
+def _compile(rules: Dict[DocumentType, List[Tuple[Tuple[str, ...], str, float]]]) -> Dict[DocumentType, List[CompiledRule]]:
+    # Patterns are matched against lower-cased text; re.IGNORECASE is several times slower here
+    return {
+        doc_type: [(anchors, re.compile(pattern), weight) for anchors, pattern, weight in patterns]
+        for doc_type, patterns in rules.items()
+    }
+
+def _rule_score(rules: List[CompiledRule], text: str) -> float:
+    return sum(
+        weight for anchors, pattern, weight in rules
+        if any(anchor in text for anchor in anchors) and pattern.search(text)
+    )
+
+class LocalDocumentClassifier:
+    """
+    In-process document classifier that scores weighted keyword/regex rules.
+
+    Returns a document type together with a confidence in [0, 1]; callers decide whether the
+    confidence is high enough to skip the LLM classifier.
+    """
+    def __init__(self, max_chars: int = 2000, saturation_score: float = 6.0):
+        # Scanning a little more than the LLM's 500 characters is still only microseconds locally
+        self.max_chars = max_chars
+        # Score at which evidence for a type is considered conclusive
+        self.saturation_score = saturation_score
+        self._text_rules = _compile(TEXT_RULES)
+        self._filename_rules = _compile(FILENAME_RULES)
+
+    def score(self, text_content: str, filename: str) -> Dict[DocumentType, float]:
+        """
+        Returns the summed rule weights for each candidate document type.
+        """
+        text = text_content[:self.max_chars].lower()
+        filename = (filename or "").lower()
+        scores: Dict[DocumentType, float] = {}
+        for doc_type, rules in self._text_rules.items():
+            scores[doc_type] = _rule_score(rules, text)
+        for doc_type, rules in self._filename_rules.items():
+            scores[doc_type] += _rule_score(rules, filename)
+        return scores
+
+    def classify(self, text_content: str, filename: str) -> Tuple[DocumentType, float]:
+        """
+        Classifies the document and returns (document_type, confidence).
+        """
+        scores = self.score(text_content, filename)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        (best_type, best_score), (_, runner_up_score) = ranked[0], ranked[1]
+        if best_score <= 0:
+            return DocumentType.UNKNOWN, 0.0
+
+        # Confidence grows with the margin over the runner-up and with the absolute evidence
+        margin = (best_score - runner_up_score) / best_score
+        strength = min(1.0, best_score / self.saturation_score)
+        return best_type, round(margin * strength, 3)
@@ -0,0 +1,305 @@
+# metrics.py
+import bisect
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; spans from sub-millisecond local work up to slow LLM calls
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally split by labels."""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        super().__init__(name, help_text, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in items]
+
+class Gauge(Counter):
+    """Value that can go up and down, e.g. a queue depth sampled when metrics are scraped."""
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values in fixed buckets. Observing is a bisect and two additions;
+    cumulative bucket counts are only computed when the metrics are rendered.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last slot is +Inf), sum, count]
+        self._data: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._data.get(key)
+            if data is None:
+                data = self._data[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            data[0][index] += 1
+            data[1] += value
+            data[2] += 1
+
+    def totals(self) -> Dict[Tuple[str, ...], Tuple[float, int]]:
+        """
+        Returns (sum, count) per label combination, e.g. to diff the observations of a time window.
+        """
+        with self._lock:
+            return {key: (data[1], data[2]) for key, data in self._data.items()}
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(data[0]), data[1], data[2])) for key, data in self._data.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Holds the process's metrics and renders them in the Prometheus text exposition format.
+    """
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> Any:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, label_names))
+
+    def gauge(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, label_names))
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, label_names, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "claim_stage_duration_seconds", "Time spent in each pipeline stage.", ("stage", "outcome")
+)
+CLAIM_SECONDS = REGISTRY.histogram(
+    "claim_processing_duration_seconds", "End-to-end time to process a claim.", ("outcome",)
+)
+DOCUMENTS_TOTAL = REGISTRY.counter(
+    "claim_documents_processed_total", "Documents processed, by classified type and source.", ("type", "source")
+)
+LLM_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "llm_scheduler_wait_seconds", "Time LLM calls waited in the scheduler queue.", ("model",)
+)
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "llm_request_duration_seconds", "Duration of HTTP calls to the LLM provider.", ("model", "status")
+)
+LLM_RETRIES_TOTAL = REGISTRY.counter(
+    "llm_retries_total", "LLM calls sent again after a failed attempt.", ("model", "reason")
+)
+LLM_HEDGED_REQUESTS_TOTAL = REGISTRY.counter(
+    "llm_hedged_requests_total", "Hedged LLM requests sent, and how many answered before the original.", ("model", "outcome")
+)
+LLM_CIRCUIT_STATE = REGISTRY.gauge(
+    "llm_circuit_state", "LLM provider circuit breaker state: 0 closed, 1 half-open, 2 open.", ("model",)
+)
+LLM_CASCADE_TOTAL = REGISTRY.counter(
+    "llm_cascade_total", "Model cascade steps per agent and model: accepted, escalated to the next model, or kept as last.",
+    ("agent", "model", "outcome", "reason"),
+)
+LLM_TOKENS_TOTAL = REGISTRY.counter(
+    "llm_tokens_total", "Tokens reported in the provider's usageMetadata.", ("model", "kind")
+)
+LLM_CACHE_HITS_TOTAL = REGISTRY.counter(
+    "llm_cache_hits_total", "LLM calls answered from the response cache.", ("model",)
+)
+PROMPT_TEXT_TOKENS_TOTAL = REGISTRY.counter(
+    "prompt_text_tokens_total", "Estimated tokens of document text before and after prompt compaction.", ("agent", "stage")
+)
+LLM_SCHEDULER_QUEUE_DEPTH = REGISTRY.gauge(
+    "llm_scheduler_queue_depth", "LLM calls waiting in the scheduler queue when scraped."
+)
+LLM_SCHEDULER_IN_FLIGHT = REGISTRY.gauge(
+    "llm_scheduler_in_flight", "LLM calls in flight when scraped."
+)
+
+# Correlation id of the claim being processed; tasks spawned for its documents inherit it
+correlation_id: contextvars.ContextVar = contextvars.ContextVar("correlation_id", default=None)
+# Per-claim stage totals, shared by reference with the claim's document tasks
+_claim_stage_seconds: contextvars.ContextVar = contextvars.ContextVar("claim_stage_seconds", default=None)
+
+def new_correlation_id() -> str:
+    return uuid.uuid4().hex
+
+def record_stage(stage: str, seconds: float, outcome: str = "ok") -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage, outcome=outcome)
+    totals = _claim_stage_seconds.get()
+    if totals is not None:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+
+@contextlib.contextmanager
+def claim_trace() -> Iterator[Dict[str, float]]:
+    """
+    Scopes one claim: yields the live dict of per-stage totals for the claim, and assigns a
+    correlation id unless the caller (HTTP request, job worker) already set one.
+    """
+    totals: Dict[str, float] = {}
+    totals_token = _claim_stage_seconds.set(totals)
+    id_token = correlation_id.set(new_correlation_id()) if correlation_id.get() is None else None
+    try:
+        yield totals
+    finally:
+        try:
+            _claim_stage_seconds.reset(totals_token)
+            if id_token is not None:
+                correlation_id.reset(id_token)
+        except ValueError:
+            # An abandoned streaming generator is finalised in another context; nothing to restore
+            pass
+
+def timed_stage(stage: str) -> Callable[[Callable[..., Awaitable[Any]]], Callable[..., Awaitable[Any]]]:
+    """
+    Decorator that records the duration and outcome of an async method as a pipeline stage.
+    """
+    def decorator(method: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                result = await method(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                record_stage(stage, time.perf_counter() - started, outcome)
+        return wrapper
+    return decorator
+
+class StageTimer:
+    """
+    Context manager form of `timed_stage`, for spans inside a method.
+    """
+    __slots__ = ("stage", "_started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self) -> "StageTimer":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        record_stage(self.stage, time.perf_counter() - self._started, "ok" if exc_type is None else "error")
+
+_claim_logger = logging.getLogger("claims")
+_json_logs_enabled = False
+
+class _JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {"ts": round(record.created, 3), "level": record.levelname.lower(), "event": record.getMessage()}
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, default=str)
+
+def configure_json_logs(enabled: bool) -> None:
+    """
+    Turns structured per-claim JSON log lines (on stderr) on or off.
+    """
+    global _json_logs_enabled
+    _json_logs_enabled = enabled
+    if enabled and not _claim_logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(_JSONFormatter())
+        _claim_logger.addHandler(handler)
+        _claim_logger.setLevel(logging.INFO)
+        _claim_logger.propagate = False
+
+def log_event(event: str, **fields: Any) -> None:
+    """
+    Emits a JSON log line tagged with the current correlation id. A no-op unless enabled.
+    """
+    if not _json_logs_enabled:
+        return
+    fields["correlation_id"] = correlation_id.get()
+    _claim_logger.info(event, extra={"fields": fields})
+
+def render_metrics(scheduler_stats: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Renders all metrics, sampling the LLM scheduler's gauges first when its stats are given.
+    """
+    if scheduler_stats is not None:
+        LLM_SCHEDULER_QUEUE_DEPTH.set(scheduler_stats["queue_depth"])
+        LLM_SCHEDULER_IN_FLIGHT.set(scheduler_stats["in_flight"])
+    return REGISTRY.render()
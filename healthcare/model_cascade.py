@@ -0,0 +1,138 @@
+# model_cascade.py
+import re
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Type, TypeVar
+
+from metrics import LLM_CASCADE_TOTAL
+from rule_extractors import FieldCandidate, normalize_date
+from schemas import DischargeSummaryData, DocumentSpecificData, missing_required_fields
+
+T = TypeVar("T")
+
+# Why an answer was not accepted
+INVALID_OUTPUT = "invalid_output"  # malformed or failed schema validation
+MISSING_FIELDS = "missing_fields"  # required fields empty, as ValidationAgent would report
+INCONSISTENT = "inconsistent"  # contradicts itself or the rule-based extractors
+
+class ModelCascade:
+    """
+    Tries an agent's LLM call on a list of models, cheapest first, and moves to the next model
+    only when the answer is not good enough: `check` returns a reason (INVALID_OUTPUT,
+    MISSING_FIELDS, INCONSISTENT) or None to accept it. The last model's answer is kept whatever
+    `check` says, unless it is invalid and an earlier model's was not.
+
+    `rule_agreement_confidence` is the agent's threshold for the consistency check: an LLM value
+    that disagrees with a rule-based candidate at least this confident counts as inconsistent.
+    """
+    def __init__(self, agent: str, models: Sequence[str], rule_agreement_confidence: float = 0.5):
+        if not models:
+            raise ValueError(f"Model cascade for {agent} needs at least one model.")
+        self.agent = agent
+        self.models = list(models)
+        self.rule_agreement_confidence = rule_agreement_confidence
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._answered_by: Dict[str, int] = {}
+        self._escalations: Dict[str, int] = {}
+
+    async def run(self, call: Callable[[str], Awaitable[T]], check: Callable[[T], Optional[str]]) -> T:
+        """
+        Runs `call(model)` on each model in turn until `check` accepts the result.
+        """
+        fallback: Optional[T] = None
+        for model in self.models[:-1]:
+            result = await call(model)
+            reason = check(result)
+            if reason is None:
+                self._record(model, "accepted", None)
+                return result
+            self._record(model, "escalated", reason)
+            if reason != INVALID_OUTPUT:
+                fallback = result
+
+        model = self.models[-1]
+        result = await call(model)
+        reason = check(result)
+        self._record(model, "accepted" if reason is None else "kept", reason)
+        if reason == INVALID_OUTPUT and fallback is not None:
+            return fallback
+        return result
+
+    def _record(self, model: str, outcome: str, reason: Optional[str]) -> None:
+        LLM_CASCADE_TOTAL.inc(agent=self.agent, model=model, outcome=outcome, reason=reason or "")
+        with self._lock:
+            if outcome == "escalated":
+                self._escalations[reason] = self._escalations.get(reason, 0) + 1
+            else:
+                self._calls += 1
+                self._answered_by[model] = self._answered_by.get(model, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            escalated = sum(self._escalations.values())
+            return {
+                "models": self.models,
+                "calls": self._calls,
+                "answered_by": dict(self._answered_by),
+                "escalations": escalated,
+                "escalations_by_reason": dict(self._escalations),
+                # Escalations per call; above 1 is possible with three or more models
+                "escalation_rate": round(escalated / self._calls, 4) if self._calls else 0.0,
+            }
+
+_DATE_FIELDS = {"date_of_service", "admission_date", "discharge_date"}
+_WORD = re.compile(r"[a-z0-9]+")
+
+def _agrees(field: str, value: Any, rule_value: Any) -> bool:
+    if field == "total_amount":
+        try:
+            return abs(float(value) - float(rule_value)) < 0.01
+        except (TypeError, ValueError):
+            return False
+    if field in _DATE_FIELDS:
+        return normalize_date(str(value)) == rule_value
+    # Names and phrases agree when one's words contain the other's (e.g. with or without the branch)
+    words, rule_words = set(_WORD.findall(str(value).lower())), set(_WORD.findall(str(rule_value).lower()))
+    return bool(words) and (words <= rule_words or rule_words <= words)
+
+def check_extraction(
+    data_class: Type[DocumentSpecificData],
+    extracted: Dict[str, Any],
+    values: Dict[str, Any],
+    candidates: Dict[str, FieldCandidate],
+    rule_agreement_confidence: float,
+) -> Optional[str]:
+    """
+    Escalation check for an extraction agent's LLM answer. `extracted` is the answer ({} when it
+    was malformed or failed validation), `values` the confident rule values it completes and
+    `candidates` every rule match. Returns the reason to escalate, or None to accept.
+    """
+    if not extracted:
+        return INVALID_OUTPUT
+    merged = dict(values)
+    merged.update({field: value for field, value in extracted.items() if value is not None and field not in values})
+    data = data_class(**merged)
+    if missing_required_fields(data):
+        return MISSING_FIELDS
+
+    for field, value in extracted.items():
+        if value is None or field in values:
+            continue
+        if field in _DATE_FIELDS and normalize_date(str(value)) != value:
+            return INCONSISTENT
+        if field == "total_amount" and float(value) <= 0:
+            return INCONSISTENT
+        candidate = candidates.get(field)
+        if candidate is not None and candidate.confidence >= rule_agreement_confidence \
+                and not _agrees(field, value, candidate.value):
+            return INCONSISTENT
+    if isinstance(data, DischargeSummaryData) and data.discharge_date < data.admission_date:
+        return INCONSISTENT
+    return None
+
+def parse_models(value: Optional[str], default: str) -> List[str]:
+    """
+    Parses a comma-separated model list such as "gemini-2.0-flash-lite,gemini-2.0-flash".
+    """
+    models = [model.strip() for model in (value or "").split(",") if model.strip()]
+    return models or [default]
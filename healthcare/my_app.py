@@ -1,8 +1,293 @@
 # main.py
-from fastapi import FastAPI
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+from fastapi import FastAPI, File, Form, HTTPException, Query, Request, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from dotenv import load_dotenv
 
-app = FastAPI()
+from builders import build_claim_session_store, build_job_queue, build_orchestrator, build_upload_spooler
+from claim_sessions import ClaimSessionManager, ClaimSessionNotFoundError
+from metrics import configure_json_logs, correlation_id, log_event, new_correlation_id, render_metrics
+from job_queue import ClaimJobWorkerPool, QueueFullError
+from orchestrator import shape_raw_text
+from schemas import (
+    BulkClaimSubmissionResponse, ClaimJobStatus, ClaimProcessingResponse, ClaimSessionResponse, ClaimStreamEvent,
+    RawTextMode,
+)
+from uploads import SpooledUpload, UploadSpooler, UploadTooLargeError
+
+load_dotenv()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_json_logs(os.getenv("CLAIM_JSON_LOGS", "").lower() in ("1", "true", "yes"))
+    app.state.upload_spooler = build_upload_spooler()
+    app.state.orchestrator = build_orchestrator(app.state.upload_spooler)
+    app.state.job_queue = build_job_queue(app.state.upload_spooler)
+    app.state.job_workers = ClaimJobWorkerPool(
+        app.state.job_queue, app.state.orchestrator, concurrency=int(os.getenv("JOB_WORKERS", "4"))
+    )
+    app.state.job_workers.start()
+    app.state.claim_sessions = ClaimSessionManager(app.state.orchestrator, build_claim_session_store())
+    try:
+        yield
+    finally:
+        await app.state.job_workers.stop()
+        app.state.job_queue.close()
+        app.state.claim_sessions.close()
+        # Drain the shared LLM connection pool on shutdown
+        await app.state.orchestrator.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+@app.middleware("http")
+async def correlation_id_middleware(request: Request, call_next):
+    # Reuse the caller's id so their logs and ours can be joined; otherwise start a new one
+    request_id = request.headers.get("x-correlation-id") or new_correlation_id()
+    correlation_id.set(request_id)
+    response = await call_next(request)
+    response.headers["X-Correlation-ID"] = request_id
+    return response
+
+@app.middleware("http")
+async def request_size_middleware(request: Request, call_next):
+    # Refuse oversized bodies before the multipart parser spools them; bodies without a
+    # Content-Length are still capped file by file by the upload spooler
+    content_length = request.headers.get("content-length")
+    max_request_bytes = app.state.upload_spooler.max_request_bytes
+    if content_length and content_length.isdigit() and int(content_length) > max_request_bytes:
+        return JSONResponse(
+            status_code=413, content={"detail": f"Request body exceeds the limit of {max_request_bytes} bytes."}
+        )
+    return await call_next(request)
 
 @app.get("/")
 async def read_root():
-    return {"message": "Hello from main.py simple app!"}
\ No newline at end of file
+    return {"message": "Hello from main.py simple app!"}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    orchestrator = app.state.orchestrator
+    return {
+        "documents": await asyncio.to_thread(orchestrator.document_cache.stats) if orchestrator.document_cache else None,
+        "llm_responses": await asyncio.to_thread(orchestrator.llm_client.cache.stats) if orchestrator.llm_client.cache else None,
+    }
+
+@app.get("/duplicates/stats")
+async def duplicate_index_stats():
+    duplicate_index = app.state.orchestrator.validation_agent.duplicate_index
+    return duplicate_index.stats() if duplicate_index is not None else None
+
+@app.get("/prompts/stats")
+async def prompt_compaction_stats():
+    orchestrator = app.state.orchestrator
+    return {
+        agent.text_preprocessor.name: agent.text_preprocessor.stats
+        for agent in (orchestrator.bill_agent, orchestrator.discharge_agent, orchestrator.combined_extraction_agent)
+    }
+
+@app.get("/llm/circuit/stats")
+async def llm_circuit_stats():
+    return app.state.orchestrator.llm_client.circuit_stats()
+
+@app.get("/llm/cascade/stats")
+async def llm_cascade_stats():
+    orchestrator = app.state.orchestrator
+    return {
+        agent.model_cascade.agent: agent.model_cascade.stats()
+        for agent in (
+            orchestrator.document_classifier_agent, orchestrator.bill_agent,
+            orchestrator.discharge_agent, orchestrator.combined_extraction_agent,
+        )
+    }
+
+@app.get("/llm/scheduler/stats")
+async def llm_scheduler_stats():
+    return app.state.orchestrator.llm_client.scheduler.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(
+        render_metrics(app.state.orchestrator.llm_client.scheduler.stats()),
+        media_type="text/plain; version=0.0.4",
+    )
+
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+def _shape_response(result: ClaimProcessingResponse, raw_text: RawTextMode, raw_text_max_chars: int) -> ClaimProcessingResponse:
+    if raw_text == RawTextMode.FULL:
+        return result
+    return result.model_copy(update={
+        "documents": [shape_raw_text(document, raw_text, raw_text_max_chars) for document in result.documents]
+    })
+
+def _format_stream_event(event: ClaimStreamEvent, stream_format: str) -> str:
+    payload = json.dumps({key: value for key, value in event.model_dump(mode="json").items() if value is not None})
+    if stream_format == "sse":
+        return f"event: {event.event}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+async def _stream_claim(
+    files: List[SpooledUpload], claim_id: Optional[str], stream_format: str, raw_text: RawTextMode, raw_text_max_chars: int
+) -> AsyncIterator[str]:
+    try:
+        async for event in app.state.orchestrator.process_claim_stream(files, claim_id):
+            if event.document is not None:
+                event = event.model_copy(update={"document": shape_raw_text(event.document, raw_text, raw_text_max_chars)})
+            yield _format_stream_event(event, stream_format)
+    except Exception as e:
+        # The status line has already been sent, so report the failure in-band; anything other
+        # than a ValueError is unexpected and is only described in the log
+        print(f"Error streaming claim (correlation id {correlation_id.get()}): {e!r}")
+        log_event("claim_failed", error=repr(e))
+        detail = str(e) if isinstance(e, ValueError) else "Internal error while processing the claim."
+        yield _format_stream_event(ClaimStreamEvent(event="error", detail=detail), stream_format)
+
+@app.post("/process-claim", response_model=ClaimProcessingResponse)
+async def process_claim(
+    files: List[UploadFile] = File(...),
+    claim_id: Optional[str] = Form(None, description="Claim identifier used for duplicate bill detection."),
+    stream: Optional[str] = Query(None, pattern="^(ndjson|sse)$", description="Stream one record per document as it finishes."),
+    raw_text: RawTextMode = Query(RawTextMode.FULL, description="Include, omit, truncate or hash each document's raw text."),
+    raw_text_max_chars: int = Query(2000, ge=0, description="Length kept when raw_text=truncate."),
+):
+    if stream is not None:
+        if not files:
+            raise HTTPException(status_code=400, detail="No files provided for claim processing.")
+        # Spool before the response starts so size limits can still be answered with a 413
+        try:
+            uploads = await app.state.orchestrator.spool_uploads(files)
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        return StreamingResponse(
+            _stream_claim(uploads, claim_id, stream, raw_text, raw_text_max_chars),
+            media_type=STREAM_MEDIA_TYPES[stream],
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            background=BackgroundTask(UploadSpooler.remove, uploads),
+        )
+    try:
+        result = await app.state.orchestrator.process_claim(files, claim_id)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _shape_response(result, raw_text, raw_text_max_chars)
+
+
+@app.post("/claims/jobs", response_model=ClaimJobStatus, status_code=202)
+async def submit_claim_job(files: List[UploadFile] = File(...), tenant_id: str = Form("default")):
+    try:
+        job = await app.state.job_queue.submit(files, tenant_id)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    app.state.job_workers.notify()
+    return job
+
+@app.post("/claims/jobs/bulk", response_model=BulkClaimSubmissionResponse, status_code=202)
+async def submit_claim_jobs_bulk(
+    files: List[UploadFile] = File(...),
+    claim_keys: List[str] = Form(..., description="Claim key for each file, in the same order as `files`."),
+    tenant_id: str = Form("default"),
+):
+    if len(claim_keys) != len(files):
+        raise HTTPException(status_code=400, detail="Provide exactly one claim key per uploaded file.")
+    claims = {}
+    for claim_key, file in zip(claim_keys, files):
+        claims.setdefault(claim_key, []).append(file)
+    try:
+        jobs = await app.state.job_queue.submit_many(list(claims.values()), tenant_id)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    app.state.job_workers.notify()
+    return BulkClaimSubmissionResponse(jobs=jobs)
+
+@app.get("/claims/jobs/{job_id}", response_model=ClaimJobStatus)
+async def get_claim_job(job_id: str):
+    job = await asyncio.to_thread(app.state.job_queue.get_status, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Claim job {job_id} not found.")
+    return job
+
+@app.get("/claims/jobs/{job_id}/result", response_model=ClaimProcessingResponse)
+async def get_claim_job_result(
+    job_id: str,
+    raw_text: RawTextMode = Query(RawTextMode.FULL),
+    raw_text_max_chars: int = Query(2000, ge=0),
+):
+    job = await asyncio.to_thread(app.state.job_queue.get_status, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Claim job {job_id} not found.")
+    result = await asyncio.to_thread(app.state.job_queue.get_result, job_id)
+    if result is None:
+        raise HTTPException(status_code=409, detail=f"Claim job {job_id} is {job.status}; no result available.")
+    return _shape_response(result, raw_text, raw_text_max_chars)
+
+@app.post("/claims/sessions", response_model=ClaimSessionResponse, status_code=201)
+async def create_claim_session(
+    files: List[UploadFile] = File(...),
+    claim_id: Optional[str] = Form(None, description="Claim identifier used for duplicate bill detection."),
+    raw_text: RawTextMode = Query(RawTextMode.FULL),
+    raw_text_max_chars: int = Query(2000, ge=0),
+):
+    try:
+        result = await app.state.claim_sessions.create(files, claim_id)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _shape_response(result, raw_text, raw_text_max_chars)
+
+@app.patch("/claims/sessions/{session_id}", response_model=ClaimSessionResponse)
+async def update_claim_session(
+    session_id: str,
+    files: List[UploadFile] = File([], description="New documents; a file named like an existing document replaces it."),
+    remove: List[str] = Form([], description="Filenames of documents to remove."),
+    raw_text: RawTextMode = Query(RawTextMode.FULL),
+    raw_text_max_chars: int = Query(2000, ge=0),
+):
+    try:
+        result = await app.state.claim_sessions.update(session_id, files, remove)
+    except ClaimSessionNotFoundError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _shape_response(result, raw_text, raw_text_max_chars)
+
+@app.get("/claims/sessions/{session_id}", response_model=ClaimSessionResponse)
+async def get_claim_session(
+    session_id: str,
+    raw_text: RawTextMode = Query(RawTextMode.FULL),
+    raw_text_max_chars: int = Query(2000, ge=0),
+):
+    try:
+        session = await app.state.claim_sessions.get(session_id)
+    except ClaimSessionNotFoundError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    result = ClaimSessionResponse(
+        session_id=session.session_id,
+        documents=[entry.document for entry in session.documents],
+        validation=session.validation,
+        claim_decision=session.claim_decision,
+    )
+    return _shape_response(result, raw_text, raw_text_max_chars)
+
+@app.delete("/claims/sessions/{session_id}", status_code=204)
+async def delete_claim_session(session_id: str):
+    try:
+        await app.state.claim_sessions.delete(session_id)
+    except ClaimSessionNotFoundError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
@@ -1,14 +1,27 @@
 # orchestrator.py
 import asyncio
-from typing import List
+import hashlib
+import time
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
 from fastapi import UploadFile
 
 from ai_client import LLMClient
-from pdf_parser import extract_text_from_pdf
+from cache import ResultCache
+from duplicate_index import DuplicateIndex
+from llm_resilience import ProviderDegradedError, deadline_scope
+from metrics import (
+    CLAIM_SECONDS, DOCUMENTS_TOTAL, StageTimer, claim_trace, log_event,
+)
+from model_cascade import ModelCascade
+from pdf_parser import LazyPDFDocument, PDFParserPool
 from schemas import (
     DocumentType, ProcessedDocument, ClaimProcessingResponse,
-    BillData, DischargeSummaryData, ValidationResult, ClaimDecision
+    BillData, DischargeSummaryData, ValidationResult, ClaimDecision, DocumentSpecificData,
+    ClaimStreamEvent, RawTextMode,
 )
+from text_preprocessor import bill_preprocessor, combined_preprocessor, discharge_preprocessor
+from uploads import SpooledUpload, UploadSpooler
+from agents.combined_extraction_agent import CombinedExtractionAgent
 from agents.document_classifier_agent import DocumentClassifierAgent
 from agents.text_extraction_agent import TextExtractionAgent
 from agents.bill_agent import BillAgent
@@ -16,66 +29,326 @@ from agents.discharge_agent import DischargeAgent
 from agents.validation_agent import ValidationAgent
 from agents.claim_decision_agent import ClaimDecisionAgent
 
+# Only these document types need their full text; the others are decided from the first pages
+TYPES_WITH_EXTRACTION = {DocumentType.BILL, DocumentType.DISCHARGE_SUMMARY}
+
+# Pipeline modes for per-document processing:
+# - "two_step": classify, then run the extraction agent for the chosen type (up to two LLM calls)
+# - "combined": one LLM call that classifies and extracts, falling back to "two_step" when the
+#   response is malformed or ambiguous
+PIPELINE_MODES = ("two_step", "combined")
+
+def shape_raw_text(document: ProcessedDocument, mode: RawTextMode, max_chars: int = 2000) -> ProcessedDocument:
+    """
+    Returns the document with its raw text kept, omitted, cut to `max_chars`, or replaced by its
+    SHA-256. Anything but FULL also reports the full text's length.
+    """
+    if mode == RawTextMode.FULL or document.raw_text is None:
+        return document
+    raw_text = document.raw_text
+    update = {"raw_text": None, "raw_text_length": len(raw_text)}
+    if mode == RawTextMode.HASH:
+        update["raw_text_sha256"] = hashlib.sha256(raw_text.encode("utf-8")).hexdigest()
+    elif mode == RawTextMode.TRUNCATE:
+        update["raw_text"] = raw_text[:max_chars]
+        update["raw_text_truncated"] = len(raw_text) > max_chars
+    return document.model_copy(update=update)
+
 class ClaimOrchestrator:
     """
     Orchestrates the entire claim processing pipeline, managing the flow between different agents.
     """
-    def __init__(self):
-        self.llm_client = LLMClient()
-        self.text_extraction_agent = TextExtractionAgent()
-        self.document_classifier_agent = DocumentClassifierAgent(self.llm_client)
-        self.bill_agent = BillAgent(self.llm_client)
-        self.discharge_agent = DischargeAgent(self.llm_client)
-        self.validation_agent = ValidationAgent()
+    def __init__(
+        self,
+        llm_client: Optional[LLMClient] = None,
+        document_cache: Optional[ResultCache] = None,
+        classifier_confidence_threshold: float = 0.6,
+        pipeline_mode: str = "two_step",
+        pdf_parser_pool: Optional[PDFParserPool] = None,
+        rule_confidence_threshold: float = 0.7,
+        upload_spooler: Optional[UploadSpooler] = None,
+        duplicate_index: Optional[DuplicateIndex] = None,
+        bill_prompt_max_tokens: Optional[int] = 3000,
+        discharge_prompt_max_tokens: Optional[int] = 3000,
+        combined_prompt_max_tokens: Optional[int] = 4000,
+        claim_deadline_seconds: Optional[float] = None,
+        model_cascades: Optional[Dict[str, ModelCascade]] = None,
+    ):
+        if pipeline_mode not in PIPELINE_MODES:
+            raise ValueError(f"Unknown pipeline mode '{pipeline_mode}'. Expected one of: {', '.join(PIPELINE_MODES)}.")
+        self.pipeline_mode = pipeline_mode
+        # LLM calls of one claim must finish within this many seconds (None = no claim deadline)
+        self.claim_deadline_seconds = claim_deadline_seconds
+        self.llm_client = llm_client if llm_client is not None else LLMClient()
+        # Maps the SHA-256 of the PDF bytes to a finished ProcessedDocument
+        self.document_cache = document_cache
+        # Uploads are streamed to disk and parsed from there instead of being held in memory
+        self.upload_spooler = upload_spooler if upload_spooler is not None else UploadSpooler()
+        self.text_extraction_agent = TextExtractionAgent(pdf_parser_pool)
+        # Per-agent model cascades keyed by "classifier", "bill", "discharge_summary" and "combined";
+        # agents without one use the client's model only
+        model_cascades = model_cascades or {}
+        self.document_classifier_agent = DocumentClassifierAgent(
+            self.llm_client, confidence_threshold=classifier_confidence_threshold,
+            model_cascade=model_cascades.get("classifier"),
+        )
+        # Document text in extraction prompts is compacted and cut to a per-agent token budget (None = no cut)
+        self.bill_agent = BillAgent(
+            self.llm_client, rule_confidence_threshold=rule_confidence_threshold,
+            text_preprocessor=bill_preprocessor(bill_prompt_max_tokens),
+            model_cascade=model_cascades.get("bill"),
+        )
+        self.discharge_agent = DischargeAgent(
+            self.llm_client, rule_confidence_threshold=rule_confidence_threshold,
+            text_preprocessor=discharge_preprocessor(discharge_prompt_max_tokens),
+            model_cascade=model_cascades.get("discharge_summary"),
+        )
+        self.combined_extraction_agent = CombinedExtractionAgent(
+            self.llm_client, text_preprocessor=combined_preprocessor(combined_prompt_max_tokens),
+            model_cascade=model_cascades.get("combined"),
+            rule_extractors={
+                DocumentType.BILL: self.bill_agent.rule_extractor,
+                DocumentType.DISCHARGE_SUMMARY: self.discharge_agent.rule_extractor,
+            },
+            rule_confidence_threshold=rule_confidence_threshold,
+        )
+        self.validation_agent = ValidationAgent(duplicate_index)
         self.claim_decision_agent = ClaimDecisionAgent()
 
-    async def _process_single_document(self, file: UploadFile) -> ProcessedDocument:
+    async def aclose(self) -> None:
         """
-        Processes a single uploaded document through text extraction, classification,
-        and structured data extraction.
+        Releases resources held by the pipeline, such as the LLM connection pool.
         """
-        filename = file.filename if file.filename else "unknown_file"
-        print(f"Processing document: {filename}")
+        await self.llm_client.aclose()
+        self.text_extraction_agent.shutdown()
+        if self.document_cache is not None:
+            self.document_cache.close()
+        if self.llm_client.cache is not None:
+            self.llm_client.cache.close()
+        if self.validation_agent.duplicate_index is not None:
+            self.validation_agent.duplicate_index.close()
 
-        # 1. Extract raw text from PDF
-        raw_text = await self.text_extraction_agent.extract(file)
-        
-        # 2. Classify the document type
-        doc_type = await self.document_classifier_agent.classify(raw_text, filename)
-        
-        structured_data = None
+    async def _cached_document(self, content_hash: str, filename: str) -> Optional[ProcessedDocument]:
+        """
+        Rebuilds a ProcessedDocument from the document cache, keeping the current upload's filename.
+        """
+        cached = await self.document_cache.aget(content_hash)
+        if cached is None:
+            return None
+        doc_type = DocumentType(cached["type"])
+        data = cached.get("data")
+        if data is not None:
+            data = BillData(**data) if doc_type == DocumentType.BILL else DischargeSummaryData(**data)
+        return ProcessedDocument(type=doc_type, data=data, raw_text=cached["raw_text"], filename=filename)
+
+    async def _extract_structured_data(self, doc_type: DocumentType, raw_text: str) -> Optional[DocumentSpecificData]:
+        """
+        Runs the extraction agent that matches the document type, if any.
+        """
         if doc_type == DocumentType.BILL:
-            structured_data = await self.bill_agent.process(raw_text)
+            return await self.bill_agent.process(raw_text)
         elif doc_type == DocumentType.DISCHARGE_SUMMARY:
-            structured_data = await self.discharge_agent.process(raw_text)
+            return await self.discharge_agent.process(raw_text)
         # Add more conditions for other document types like ID_CARD if needed
-        
-        return ProcessedDocument(
-            type=doc_type,
-            data=structured_data,
-            raw_text=raw_text,
-            filename=filename
-        )
+        return None
 
-    async def process_claim(self, files: List[UploadFile]) -> ClaimProcessingResponse:
+    async def _classify_and_extract(self, document: LazyPDFDocument, filename: str) -> Tuple[DocumentType, Optional[DocumentSpecificData]]:
         """
-        Main method to process multiple claim documents.
+        Determines the document type and extracts its structured data according to the pipeline mode.
+        Classification only parses the first pages; the full text is parsed only when it is needed.
+        """
+        leading_text = await self.text_extraction_agent.extract_leading_text(document, filename)
+
+        if self.pipeline_mode == "combined":
+            # A confident local classification already leaves a single LLM call, so only
+            # documents the local classifier is unsure about use the combined call
+            doc_type = self.document_classifier_agent.classify_locally(leading_text, filename)
+            if doc_type is None:
+                full_text = await self.text_extraction_agent.extract_full_text(document, filename)
+                combined = await self.combined_extraction_agent.process(full_text, filename)
+                if combined is not None:
+                    return combined
+                print(f"Combined extraction was ambiguous for {filename}. Falling back to two-step processing.")
+                doc_type = await self.document_classifier_agent.classify(leading_text, filename)
+        else:
+            doc_type = await self.document_classifier_agent.classify(leading_text, filename)
+
+        if doc_type not in TYPES_WITH_EXTRACTION:
+            return doc_type, None
+        full_text = await self.text_extraction_agent.extract_full_text(document, filename)
+        return doc_type, await self._extract_structured_data(doc_type, full_text)
+
+    async def _process_single_document(self, upload: SpooledUpload) -> ProcessedDocument:
+        """
+        Processes a single uploaded document through text extraction, classification,
+        and structured data extraction.
+        """
+        filename = upload.filename
+        print(f"Processing document: {filename}")
+        started = time.perf_counter()
+
+        with StageTimer("document"):
+            # The content hash was computed while the upload was spooled
+            content_hash = upload.sha256
+            if self.document_cache is not None:
+                with StageTimer("document_cache_lookup"):
+                    cached_document = await self._cached_document(content_hash, filename)
+                if cached_document is not None:
+                    print(f"Document cache hit for {filename} ({content_hash[:12]})")
+                    DOCUMENTS_TOTAL.inc(type=cached_document.type.value, source="cache")
+                    log_event("document_processed", filename=filename, type=cached_document.type.value, source="cache",
+                              duration_ms=round((time.perf_counter() - started) * 1000, 1))
+                    return cached_document
+
+            # 1. Open the PDF as a lazy, page-indexed document
+            document = self.text_extraction_agent.open(upload)
+            try:
+                # 2. Classify the document type and extract its structured data
+                doc_type, structured_data = await self._classify_and_extract(document, filename)
+            except ProviderDegradedError as e:
+                # Report the document as unprocessed rather than deciding the claim on empty data
+                DOCUMENTS_TOTAL.inc(type=DocumentType.UNKNOWN.value, source="provider_degraded")
+                log_event("document_processed", filename=filename, source="provider_degraded", error=str(e),
+                          duration_ms=round((time.perf_counter() - started) * 1000, 1))
+                return ProcessedDocument(
+                    type=DocumentType.UNKNOWN, raw_text=document.parsed_text(), filename=filename, error=str(e)
+                )
+            finally:
+                document.close()
+
+            # ID cards and unknown documents only carry the text of the pages that were parsed
+            processed_document = ProcessedDocument(
+                type=doc_type,
+                data=structured_data,
+                raw_text=document.parsed_text(),
+                filename=filename
+            )
+            # An all-empty extraction usually means the LLM call failed, so don't make it sticky
+            extraction_failed = structured_data is not None and not any(structured_data.model_dump().values())
+            if self.document_cache is not None and not extraction_failed:
+                await self.document_cache.aset(
+                    content_hash, processed_document.model_dump(mode="json", exclude={"filename"})
+                )
+
+        DOCUMENTS_TOTAL.inc(type=doc_type.value, source="pipeline")
+        log_event("document_processed", filename=filename, type=doc_type.value, source="pipeline",
+                  pages_parsed=document.parsed_page_count, extraction_failed=extraction_failed,
+                  duration_ms=round((time.perf_counter() - started) * 1000, 1))
+        return processed_document
+
+    async def spool_uploads(self, files: Sequence[Union[UploadFile, SpooledUpload]]) -> List[SpooledUpload]:
+        """
+        Streams any in-memory uploads to disk, enforcing the upload size limits. Already spooled
+        uploads are passed through. Raises UploadTooLargeError (a ValueError) over the limits.
+        """
+        to_spool = [file for file in files if not isinstance(file, SpooledUpload)]
+        if not to_spool:
+            return list(files)
+        with StageTimer("spool_uploads"):
+            spooled = iter(await self.upload_spooler.spool(to_spool))
+        return [file if isinstance(file, SpooledUpload) else next(spooled) for file in files]
+
+    async def process_documents(self, files: Sequence[Union[UploadFile, SpooledUpload]]) -> List[ProcessedDocument]:
+        """
+        Processes documents concurrently without assessing the claim, e.g. the changed documents
+        of a claim session. Results are in input order.
+        """
+        uploads = await self.spool_uploads(files)
+        with deadline_scope(self.claim_deadline_seconds):
+            tasks = [asyncio.create_task(self._process_single_document(upload)) for upload in uploads]
+        try:
+            return list(await asyncio.gather(*tasks))
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.upload_spooler.remove(upload for upload, file in zip(uploads, files) if upload is not file)
+
+    async def assess_claim(
+        self, processed_documents: List[ProcessedDocument], claim_id: Optional[str] = None
+    ) -> Tuple[ValidationResult, ClaimDecision]:
+        """
+        Validates an already processed set of documents and decides the claim. Without a
+        `claim_id` its bills are checked against the duplicate index but not added to it.
+        """
+        validation_result = await self.validation_agent.validate(processed_documents, claim_id)
+        return validation_result, await self.claim_decision_agent.decide(validation_result, processed_documents)
+
+    async def process_claim_stream(
+        self, files: Sequence[Union[UploadFile, SpooledUpload]], claim_id: Optional[str] = None
+    ) -> AsyncIterator[ClaimStreamEvent]:
+        """
+        Processes the claim documents concurrently and yields each one as soon as it is done,
+        followed by the validation result and the claim decision.
+        Uploads spooled here are deleted when the stream ends; ones passed in spooled are not.
+        `claim_id` identifies the claim in the duplicate index; without one its bills are checked
+        against the index but not added to it.
         """
         if not files:
             raise ValueError("No files provided for claim processing.")
 
-        # Process each document concurrently
-        processing_tasks = [self._process_single_document(file) for file in files]
-        processed_documents: List[ProcessedDocument] = await asyncio.gather(*processing_tasks)
+        with claim_trace() as stage_seconds:
+            started = time.perf_counter()
+            log_event("claim_started", documents=len(files))
+            outcome = "error"
+            tasks: List[asyncio.Task] = []
+            uploads: List[SpooledUpload] = []
+            try:
+                uploads = await self.spool_uploads(files)
+                # Process each document concurrently; the tasks inherit the claim's LLM deadline
+                with deadline_scope(self.claim_deadline_seconds):
+                    tasks = [asyncio.create_task(self._process_single_document(upload)) for upload in uploads]
+                index_of = {task: index for index, task in enumerate(tasks)}
+                processed_documents: List[Optional[ProcessedDocument]] = [None] * len(files)
+                pending = set(tasks)
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in sorted(done, key=index_of.get):
+                        index = index_of[task]
+                        processed_documents[index] = task.result()
+                        yield ClaimStreamEvent(event="document", index=index, document=processed_documents[index])
+
+                # 3. Validate the extracted data
+                validation_result: ValidationResult = await self.validation_agent.validate(processed_documents, claim_id)
+                yield ClaimStreamEvent(event="validation", validation=validation_result)
 
-        # 3. Validate the extracted data
-        validation_result: ValidationResult = await self.validation_agent.validate(processed_documents)
+                # 4. Make a final claim decision
+                claim_decision: ClaimDecision = await self.claim_decision_agent.decide(validation_result, processed_documents)
+                outcome = claim_decision.status
+                yield ClaimStreamEvent(event="claim_decision", claim_decision=claim_decision)
+            except (GeneratorExit, asyncio.CancelledError):
+                # The consumer went away, e.g. a streaming client disconnected
+                outcome = "aborted"
+                raise
+            finally:
+                # A failed or abandoned claim should not keep parsing and calling the LLM
+                for task in tasks:
+                    task.cancel()
+                self.upload_spooler.remove(upload for upload, file in zip(uploads, files) if upload is not file)
+                duration = time.perf_counter() - started
+                CLAIM_SECONDS.observe(duration, outcome=outcome if outcome in ("error", "aborted") else "ok")
+                log_event(
+                    "claim_finished", outcome=outcome, duration_ms=round(duration * 1000, 1),
+                    stage_ms={stage: round(seconds * 1000, 1) for stage, seconds in stage_seconds.items()},
+                )
 
-        # 4. Make a final claim decision
-        claim_decision: ClaimDecision = await self.claim_decision_agent.decide(validation_result)
+    async def process_claim(
+        self, files: Sequence[Union[UploadFile, SpooledUpload]], claim_id: Optional[str] = None
+    ) -> ClaimProcessingResponse:
+        """
+        Main method to process multiple claim documents.
+        """
+        processed_documents: List[Optional[ProcessedDocument]] = [None] * len(files)
+        validation_result, claim_decision = None, None
+        async for event in self.process_claim_stream(files, claim_id):
+            if event.event == "document":
+                processed_documents[event.index] = event.document
+            elif event.event == "validation":
+                validation_result = event.validation
+            elif event.event == "claim_decision":
+                claim_decision = event.claim_decision
 
         return ClaimProcessingResponse(
             documents=processed_documents,
             validation=validation_result,
             claim_decision=claim_decision
-        )
\ No newline at end of file
+        )
@@ -1,19 +1,311 @@
 # pdf_parser.py
 from PyPDF2 import PdfReader
+import asyncio
 import io
+import mmap
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
-def extract_text_from_pdf(file_content: bytes) -> str:
+# A PDF given as its bytes or, preferably, as the path of a file on disk. Paths are memory-mapped
+# rather than read, and only the path is sent to parser worker processes.
+PDFSource = Union[bytes, str]
+
+# Joins page texts for the extraction agents: a form feed on its own line, so the last line of a
+# page never runs into the first line of the next and the text can be split back into pages.
+# Text returned to API clients (raw_text) keeps the original join without separators.
+PAGE_SEPARATOR = "\n\f"
+
+def available_cpu_count() -> int:
     """
-    Extracts text from a PDF file's binary content.
-    Assumes the PDF is text-based and not an image-only PDF.
+    Returns the number of CPUs this process may run on (respects container/affinity limits).
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def open_pdf_source(source: PDFSource) -> Tuple[BinaryIO, Callable[[], None]]:
     """
+    Returns a seekable stream over the PDF and a function that releases it. Files are
+    memory-mapped, so pages are read from the OS page cache instead of a private copy.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source), lambda: None
+    f = open(source, "rb")
+    try:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        # Empty files cannot be mapped; let PdfReader report them as invalid
+        return f, f.close
+    f.close()
+    return mapped, mapped.close
+
+# Each parser worker keeps the readers of the last few files it opened, so the page ranges of
+# one document that land on the same worker do not each re-read its xref table and page tree
+WORKER_READER_CACHE_SIZE = 4
+_worker_readers: "OrderedDict[Tuple[str, int, int], Tuple[PdfReader, Callable[[], None]]]" = OrderedDict()
+
+def _open_reader(source: PDFSource) -> Tuple[PdfReader, Callable[[], None]]:
+    # Returns a reader and the function to call when done with it; cached readers stay open
+    if not isinstance(source, str):
+        stream, release = open_pdf_source(source)
+        return PdfReader(stream), release
+    stat = os.stat(source)
+    key = (source, stat.st_size, stat.st_mtime_ns)
+    if key in _worker_readers:
+        _worker_readers.move_to_end(key)
+        return _worker_readers[key][0], lambda: None
+    stream, release = open_pdf_source(source)
     try:
-        pdf_file = io.BytesIO(file_content)
-        reader = PdfReader(pdf_file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() or "" # Use .extract_text() and handle None
-        return text
+        reader = PdfReader(stream)
+    except Exception:
+        release()
+        raise
+    _worker_readers[key] = (reader, release)
+    while len(_worker_readers) > WORKER_READER_CACHE_SIZE:
+        _, (_, evicted_release) = _worker_readers.popitem(last=False)
+        evicted_release()
+    return reader, lambda: None
+
+def extract_page_range(source: PDFSource, start: int, stop: Optional[int] = None) -> Tuple[int, List[str]]:
+    """
+    Extracts the text of pages [start, stop) and returns (total_page_count, page_texts).
+    Runs inside the parser worker processes, so it must stay a picklable module-level function.
+    """
+    try:
+        reader, release = _open_reader(source)
+        try:
+            page_count = len(reader.pages)
+            stop = page_count if stop is None else min(stop, page_count)
+            # Use .extract_text() and handle None
+            return page_count, [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+        finally:
+            release()
     except Exception as e:
         print(f"Error extracting text from PDF: {e}")
-        raise ValueError(f"Could not extract text from PDF: {e}")
\ No newline at end of file
+        raise ValueError(f"Could not extract text from PDF: {e}")
+
+def extract_text_from_pdf(source: PDFSource) -> str:
+    """
+    Extracts text from a PDF file's binary content or path.
+    Assumes the PDF is text-based and not an image-only PDF.
+    """
+    document = LazyPDFDocument(source)
+    try:
+        return document.text()
+    finally:
+        document.close()
+
+class LazyPDFDocument:
+    """
+    Page-indexed view of a PDF that parses pages only when they are asked for and caches
+    each page's text once parsed. Pages can be parsed in-process with `page_text()` or
+    filled in by `PDFParserPool.load_pages()`. Call `close()` when done with it.
+
+    `parse_deadline` (a `time.monotonic()` value) is set by the first `load_pages()` call, so the
+    parser pool's timeout covers all of the document's parsing rather than each call.
+    """
+    def __init__(self, source: PDFSource):
+        self.source = source
+        self.parse_deadline: Optional[float] = None
+        self._reader: Optional[PdfReader] = None
+        self._release: Optional[Callable[[], None]] = None
+        self._page_count: Optional[int] = None
+        self._pages: Dict[int, str] = {}
+
+    def _get_reader(self) -> PdfReader:
+        if self._reader is None:
+            try:
+                stream, self._release = open_pdf_source(self.source)
+                self._reader = PdfReader(stream)
+            except Exception as e:
+                self.close()
+                print(f"Error extracting text from PDF: {e}")
+                raise ValueError(f"Could not extract text from PDF: {e}")
+            self._page_count = len(self._reader.pages)
+        return self._reader
+
+    def close(self) -> None:
+        """
+        Releases the in-process reader and its memory map, if one was opened. Cached page text stays.
+        """
+        self._reader = None
+        if self._release is not None:
+            self._release()
+            self._release = None
+
+    @property
+    def page_count_known(self) -> bool:
+        return self._page_count is not None
+
+    @property
+    def page_count(self) -> int:
+        if self._page_count is None:
+            self._get_reader()
+        return self._page_count
+
+    def set_page_count(self, page_count: int) -> None:
+        self._page_count = page_count
+
+    def cache_pages(self, start: int, texts: List[str]) -> None:
+        """
+        Stores already-parsed text for the pages starting at `start`.
+        """
+        for offset, text in enumerate(texts):
+            self._pages[start + offset] = text
+
+    def is_parsed(self, index: int) -> bool:
+        return index in self._pages
+
+    @property
+    def parsed_page_count(self) -> int:
+        return len(self._pages)
+
+    def missing_ranges(self, start: int, stop: int, max_range_length: int) -> List[Tuple[int, int]]:
+        """
+        Returns [start, stop) ranges of pages that have not been parsed yet, each at most
+        `max_range_length` pages long.
+        """
+        ranges: List[Tuple[int, int]] = []
+        index = start
+        while index < stop:
+            if index in self._pages:
+                index += 1
+                continue
+            range_start = index
+            while index < stop and index not in self._pages and index - range_start < max_range_length:
+                index += 1
+            ranges.append((range_start, index))
+        return ranges
+
+    def page_text(self, index: int) -> str:
+        """
+        Returns the text of one page, parsing it in-process if it is not cached yet.
+        """
+        if index not in self._pages:
+            try:
+                # Use .extract_text() and handle None
+                self._pages[index] = self._get_reader().pages[index].extract_text() or ""
+            except Exception as e:
+                print(f"Error extracting text from PDF: {e}")
+                raise ValueError(f"Could not extract text from PDF: {e}")
+        return self._pages[index]
+
+    def iter_pages(self, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+        """
+        Yields page texts one at a time, parsing each page on demand.
+        """
+        stop = self.page_count if stop is None else min(stop, self.page_count)
+        for index in range(start, stop):
+            yield self.page_text(index)
+
+    def text(self, max_pages: Optional[int] = None, separator: str = "") -> str:
+        """
+        Returns the text of the first `max_pages` pages (all pages by default), joined with `separator`.
+        """
+        return separator.join(self.iter_pages(0, max_pages))
+
+    def parsed_text(self, separator: str = "") -> str:
+        """
+        Returns the text of the pages parsed so far, joined with `separator`, without parsing anything new.
+        """
+        return separator.join(self._pages[index] for index in sorted(self._pages))
+
+class PDFParserPool:
+    """
+    Parses PDFs in a bounded process pool so CPU-bound PyPDF2 work never blocks the event loop.
+
+    The first requested range (at most `pages_per_task` pages) also reports the page count;
+    the remaining pages are split into page ranges parsed in parallel. All `load_pages` calls for
+    one document share a budget of `timeout_seconds`, counted from the first; on timeout the
+    document's queued page ranges are cancelled.
+    """
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        pages_per_task: int = 8,
+        timeout_seconds: Optional[float] = 60.0,
+    ):
+        self.max_workers = max_workers or available_cpu_count()
+        self.pages_per_task = pages_per_task
+        self.timeout_seconds = timeout_seconds
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def _load_pages(self, document: LazyPDFDocument, start: int, stop: Optional[int]) -> None:
+        executor = self._get_executor()
+        futures: List[Future] = []
+        try:
+            if not document.page_count_known:
+                # The first range also tells us how many pages there are
+                first_stop = start + self.pages_per_task if stop is None else min(stop, start + self.pages_per_task)
+                futures.append(executor.submit(extract_page_range, document.source, start, first_stop))
+                page_count, texts = await asyncio.wrap_future(futures[-1])
+                document.set_page_count(page_count)
+                document.cache_pages(start, texts)
+
+            stop = document.page_count if stop is None else min(stop, document.page_count)
+            ranges = document.missing_ranges(start, stop, self.pages_per_task)
+            range_futures = [
+                executor.submit(extract_page_range, document.source, range_start, range_stop)
+                for range_start, range_stop in ranges
+            ]
+            futures.extend(range_futures)
+            results = await asyncio.gather(*[asyncio.wrap_future(future) for future in range_futures])
+            for (range_start, _), (_, texts) in zip(ranges, results):
+                document.cache_pages(range_start, texts)
+        finally:
+            # On timeout or failure, drop the ranges still queued; a range already running
+            # finishes in its worker
+            for future in futures:
+                future.cancel()
+
+    async def load_pages(self, document: LazyPDFDocument, start: int = 0, stop: Optional[int] = None) -> None:
+        """
+        Parses the not-yet-cached pages in [start, stop) of the document (all remaining pages
+        by default) without blocking the event loop.
+        """
+        if document.page_count_known:
+            end = document.page_count if stop is None else min(stop, document.page_count)
+            if not document.missing_ranges(start, end, self.pages_per_task):
+                return
+        remaining = None
+        if self.timeout_seconds is not None:
+            if document.parse_deadline is None:
+                document.parse_deadline = time.monotonic() + self.timeout_seconds
+            remaining = document.parse_deadline - time.monotonic()
+        try:
+            if remaining is not None and remaining <= 0:
+                raise asyncio.TimeoutError()
+            await asyncio.wait_for(self._load_pages(document, start, stop), timeout=remaining)
+        except asyncio.TimeoutError:
+            raise ValueError(f"PDF parsing timed out after {self.timeout_seconds} seconds.")
+        except BrokenProcessPool as e:
+            # A worker died (e.g. out of memory); start a fresh pool for the next document
+            self.shutdown()
+            raise ValueError(f"PDF parser worker crashed: {e}")
+
+    async def extract_text(self, source: PDFSource) -> str:
+        """
+        Extracts the text of every page of the PDF without blocking the event loop.
+        Pass a path rather than bytes so the workers read the file instead of receiving a copy.
+        """
+        document = LazyPDFDocument(source)
+        await self.load_pages(document)
+        return document.parsed_text()
+
+    def shutdown(self, wait: bool = False) -> None:
+        """
+        Stops the worker processes; with `wait`, returns only once they have exited.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
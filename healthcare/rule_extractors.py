@@ -0,0 +1,243 @@
+# rule_extractors.py
+import datetime
+import re
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Pattern, Tuple
+
+MONTHS = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3, "apr": 4, "april": 4,
+    "may": 5, "jun": 6, "june": 6, "jul": 7, "july": 7, "aug": 8, "august": 8,
+    "sep": 9, "sept": 9, "september": 9, "oct": 10, "october": 10, "nov": 11, "november": 11,
+    "dec": 12, "december": 12,
+}
+
+# (pattern, order of the captured groups). Indian documents write dates day first.
+# PyPDF2 often glues a date to its label ("Discharge02-Feb-2025"), so digits are bounded by
+# look-arounds rather than \b.
+DATE_PATTERNS: List[Tuple[Pattern, str]] = [
+    (re.compile(r"(?<!\d)(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})(?!\d)"), "ymd"),
+    (re.compile(r"(?<!\d)(\d{1,2})[-/.](\d{1,2})[-/.](\d{4}|\d{2})(?!\d)"), "dmy"),
+    (re.compile(r"(?<!\d)(\d{1,2})(?:st|nd|rd|th)?[-/. ]*([a-z]{3,9})[-/., ]*(\d{4}|\d{2})(?!\d)", re.IGNORECASE), "dMy"),
+    (re.compile(r"\b([a-z]{3,9})\.?\s*(\d{1,2})(?:st|nd|rd|th)?,?\s*(\d{4})(?!\d)", re.IGNORECASE), "Mdy"),
+]
+
+# Digits with either Western ("1,234,567.00") or Indian ("12,34,567.00") grouping, or none at all
+AMOUNT_PATTERN = re.compile(r"(?<![\d,])(\d{1,3}(?:,\d{3})+|\d{1,3}(?:,\d{2})*,\d{3}|\d+)(\.\d{1,2})?(?![\d,])")
+
+# Confidence of an amount that is only part of the number next to the label, e.g. from
+# irregular grouping; low enough that the LLM is asked instead
+PARTIAL_AMOUNT_CONFIDENCE = 0.3
+
+# Fields whose LLM answers are parsed the same way as the rules' matches before being merged
+DATE_FIELDS = ("date_of_service", "admission_date", "discharge_date")
+AMOUNT_FIELDS = ("total_amount",)
+
+HONORIFIC_PATTERN = re.compile(r"^(?:mr|mrs|ms|miss|master|baby|dr|smt|shri|sri)\b\.?\s*", re.IGNORECASE)
+# Labels that commonly follow the name on the same line of a PDF header block
+NAME_STOP_PATTERN = re.compile(
+    r"\s*\b(?:age|sex|gender|uhid|run\s*on|date|ip\s*no|mrn|reg(?:istration)?|bill|doa|dod|ward|bed|s/o|d/o|w/o)\b.*$",
+    re.IGNORECASE,
+)
+
+def parse_amount(text: str) -> Optional[float]:
+    """
+    Parses the first amount in `text`, accepting Indian ("1,23,456.00") and Western digit grouping.
+    """
+    match = AMOUNT_PATTERN.search(text)
+    if match is None:
+        return None
+    return float(match.group(1).replace(",", "") + (match.group(2) or ""))
+
+def _to_iso_date(year: int, month: int, day: int) -> Optional[str]:
+    if year < 100:
+        year += 2000
+    try:
+        return datetime.date(year, month, day).isoformat()
+    except ValueError:
+        return None
+
+def normalize_date(text: str) -> Optional[str]:
+    """
+    Returns the first date found in `text` as YYYY-MM-DD, or None. Numeric dates are read day first.
+    """
+    # The date closest to the label wins, whatever its format
+    matches = sorted(
+        (match.start(), order, match.groups())
+        for pattern, order in DATE_PATTERNS
+        for match in pattern.finditer(text)
+    )
+    for _, order, (a, b, c) in matches:
+        if order == "ymd":
+            result = _to_iso_date(int(a), int(b), int(c))
+        elif order == "dmy":
+            # Fall back to month first for dates like 12/25/2025
+            result = _to_iso_date(int(c), int(b), int(a)) or _to_iso_date(int(c), int(a), int(b))
+        elif order == "dMy":
+            month = MONTHS.get(b.lower())
+            result = _to_iso_date(int(c), month, int(a)) if month else None
+        else:
+            month = MONTHS.get(a.lower())
+            result = _to_iso_date(int(c), month, int(b)) if month else None
+        if result is not None:
+            return result
+    return None
+
+def normalize_llm_values(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns a copy of an LLM answer with its dates as YYYY-MM-DD and amounts given as text
+    ("Rs. 1,23,456.00") as numbers. Values that do not parse become None.
+    """
+    values = dict(data)
+    for field in DATE_FIELDS:
+        if values.get(field) is not None:
+            values[field] = normalize_date(str(values[field]))
+    for field in AMOUNT_FIELDS:
+        if isinstance(values.get(field), str):
+            values[field] = parse_amount(values[field])
+    return values
+
+def clean_person_name(text: str) -> Optional[str]:
+    name = NAME_STOP_PATTERN.sub("", text)
+    name = HONORIFIC_PATTERN.sub("", name.strip())
+    name = " ".join(name.replace(".", " ").split()).strip(" ,:-")
+    return name if len(name) >= 2 else None
+
+def clean_phrase(text: str) -> Optional[str]:
+    phrase = " ".join(text.split()).strip(" ,.:-")
+    return phrase if len(phrase) >= 3 else None
+
+class FieldCandidate(NamedTuple):
+    """A value found for a field by the rules, with a confidence in [0, 1]."""
+    value: object
+    confidence: float
+
+def parse_amount_token(text: str) -> Optional[object]:
+    """
+    Parses the number captured after an amount label. If the amount found does not span the
+    whole number, returns it as a low-confidence FieldCandidate instead of a plain value.
+    """
+    token = text.strip().rstrip(",")
+    match = AMOUNT_PATTERN.search(token)
+    if match is None:
+        return None
+    amount = float(match.group(1).replace(",", "") + (match.group(2) or ""))
+    if match.group(0) != token:
+        return FieldCandidate(amount, PARTIAL_AMOUNT_CONFIDENCE)
+    return amount
+
+# field -> [(pattern with a `value` group, base confidence, parser)]. Parsers return None to drop a match,
+# or a FieldCandidate to cap the rule's confidence for that match.
+FieldRule = Tuple[str, int, float, Callable[[str], Optional[object]]]
+
+# Label followed by separators; the value window after it is handed to the parser
+_LABEL_TAIL = r"[^\S\n]*(?:\([^)\n]{0,10}\))?[^\S\n]*[:\-.]*[^\S\n]*"
+
+BILL_FIELD_RULES: Dict[str, List[FieldRule]] = {
+    "hospital_name": [
+        (r"hospital\s*name" + _LABEL_TAIL + r"(?P<value>[^\n]{3,80})", re.IGNORECASE, 0.9, clean_phrase),
+        # Letterhead line such as "SIR GANGA RAM HOSPITAL, Rajinder Nagar"
+        (r"^[^\S\n]*(?!Hospital\s*Name|HOSPITAL\s*NAME)(?P<value>(?:[A-Z][A-Za-z.&']*[^\S\n]+){1,5}"
+         r"(?:HOSPITALS?|Hospitals?|MEDICAL\s+CENT(?:RE|ER)|Medical\s+Cent(?:re|er)|MEDICITY|Medicity|"
+         r"NURSING\s+HOME|Nursing\s+Home|CLINIC|Clinic)\b(?:[^\S\n]*\([A-Za-z .]{2,30}\))?)",
+         re.MULTILINE, 0.75, clean_phrase),
+    ],
+    "total_amount": [
+        (r"(?:grand\s*total|net\s*payable|amount\s*payable|total\s*payable)" + _LABEL_TAIL
+         + r"(?:rs\.?|inr|₹)?[^\S\n]*(?P<value>\d[\d,]*(?:\.\d{1,2})?)", re.IGNORECASE, 0.9, parse_amount_token),
+        (r"(?:net\s*amount|total\s*amount|bill\s*amount|total\s*bill)" + _LABEL_TAIL
+         + r"(?:rs\.?|inr|₹)?[^\S\n]*(?P<value>\d[\d,]*(?:\.\d{1,2})?)", re.IGNORECASE, 0.8, parse_amount_token),
+    ],
+    "date_of_service": [
+        (r"(?:date\s*of\s*service|service\s*date)" + _LABEL_TAIL + r"(?P<value>[^\n]{6,30})", re.IGNORECASE, 0.9, normalize_date),
+        (r"(?:bill|invoice)\s*date" + _LABEL_TAIL + r"(?P<value>[^\n]{6,30})", re.IGNORECASE, 0.8, normalize_date),
+        (r"(?:date\s*of\s*admission|admission\s*date|admitted\s*on|\bdoa\b)" + _LABEL_TAIL + r"(?P<value>[^\n]{6,30})",
+         re.IGNORECASE, 0.75, normalize_date),
+    ],
+}
+
+DISCHARGE_FIELD_RULES: Dict[str, List[FieldRule]] = {
+    "patient_name": [
+        (r"patient'?s?\s*name" + _LABEL_TAIL + r"(?P<value>[A-Za-z][A-Za-z.' ]{1,60})(?!\w)", re.IGNORECASE, 0.9, clean_person_name),
+        (r"^[^\S\n]*name[^\S\n]*:[^\S\n]*(?P<value>[A-Za-z][A-Za-z.' ]{1,60})(?!\w)", re.IGNORECASE | re.MULTILINE, 0.75, clean_person_name),
+    ],
+    "diagnosis": [
+        (r"^[^\S\n]*final\s*diagnosis" + _LABEL_TAIL + r"(?P<value>[^\n]{3,200})", re.IGNORECASE | re.MULTILINE, 0.8, clean_phrase),
+        # A bare "Diagnosis" heading is often followed by free text that needs judgement
+        (r"^[^\S\n]*(?:provisional\s*|primary\s*)?diagnosis" + _LABEL_TAIL + r"(?P<value>[^\n]{3,200})",
+         re.IGNORECASE | re.MULTILINE, 0.65, clean_phrase),
+    ],
+    "admission_date": [
+        (r"(?:date\s*(?:&|and)?\s*(?:time\s*)?of\s*admission|admission\s*date|admitted\s*on|\bdoa\b)" + _LABEL_TAIL
+         + r"(?P<value>[^\n]{6,30})", re.IGNORECASE, 0.9, normalize_date),
+    ],
+    "discharge_date": [
+        (r"(?:date\s*(?:&|and)?\s*(?:time\s*)?of\s*discharge|discharge\s*date|discharged\s*on|\bdod\b)" + _LABEL_TAIL
+         + r"(?P<value>[^\n]{6,30})", re.IGNORECASE, 0.9, normalize_date),
+    ],
+}
+
+class RuleBasedExtractor:
+    """
+    Finds field values by labelled regex rules and scores them.
+
+    Every match is a vote for its parsed value. A field's confidence is the base confidence of
+    its best rule scaled by how much of the total vote the winning value got, so a value repeated
+    on every page stays high while conflicting values (e.g. two bills in one PDF) drop below the
+    caller's threshold.
+    """
+    def __init__(self, field_rules: Dict[str, List[FieldRule]], max_matches_per_rule: int = 50):
+        self.max_matches_per_rule = max_matches_per_rule
+        # Case-insensitive rules run case-sensitively against lower-cased text, which is several
+        # times faster than re.IGNORECASE; their values are then sliced from the original text.
+        self._rules: Dict[str, List[Tuple[Pattern, bool, float, Callable[[str], Optional[object]]]]] = {
+            field: [
+                (re.compile(pattern, flags & ~re.IGNORECASE), bool(flags & re.IGNORECASE), confidence, parser)
+                for pattern, flags, confidence, parser in rules
+            ]
+            for field, rules in field_rules.items()
+        }
+
+    @property
+    def fields(self) -> List[str]:
+        return list(self._rules)
+
+    def extract(self, text: str) -> Dict[str, FieldCandidate]:
+        """
+        Returns the best candidate for every field the rules found.
+        """
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # A few non-ASCII characters change length when lower-cased; spans would not line up
+            text = lowered
+        candidates: Dict[str, FieldCandidate] = {}
+        for field, rules in self._rules.items():
+            votes: Dict[object, float] = {}
+            best_confidence: Dict[object, float] = {}
+            # Spelling of each string value as found by its most trusted rule
+            display: Dict[object, object] = {}
+            for pattern, case_insensitive, confidence, parser in rules:
+                for count, match in enumerate(pattern.finditer(lowered if case_insensitive else text)):
+                    if count >= self.max_matches_per_rule:
+                        break
+                    value = parser(text[match.start("value"):match.end("value")])
+                    if value is None:
+                        continue
+                    match_confidence = confidence
+                    if isinstance(value, FieldCandidate):
+                        value, match_confidence = value.value, min(confidence, value.confidence)
+                    key = value.lower() if isinstance(value, str) else value
+                    votes[key] = votes.get(key, 0.0) + match_confidence
+                    if match_confidence > best_confidence.get(key, 0.0):
+                        best_confidence[key] = match_confidence
+                        display[key] = value
+            if not votes:
+                continue
+            winner = max(votes, key=votes.get)
+            share = votes[winner] / sum(votes.values())
+            candidates[field] = FieldCandidate(display[winner], round(best_confidence[winner] * share, 3))
+        return candidates
+
+def bill_extractor() -> RuleBasedExtractor:
+    return RuleBasedExtractor(BILL_FIELD_RULES)
+
+def discharge_extractor() -> RuleBasedExtractor:
+    return RuleBasedExtractor(DISCHARGE_FIELD_RULES)
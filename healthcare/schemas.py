@@ -11,6 +11,13 @@ class DocumentType(str, enum.Enum):
     DISCHARGE_SUMMARY = "discharge_summary"
     UNKNOWN = "unknown"
 
+class RawTextMode(str, enum.Enum):
+    """How much of each document's raw text to include in a response."""
+    FULL = "full"
+    OMIT = "omit"
+    TRUNCATE = "truncate"
+    HASH = "hash"
+
 # Define Pydantic models for structured data extracted from documents
 class BillData(BaseModel):
     """Schema for data extracted from a medical bill."""
@@ -28,12 +35,31 @@ class DischargeSummaryData(BaseModel):
 # A union type for the data field in ProcessedDocument, allowing different structured data types
 DocumentSpecificData = Union[BillData, DischargeSummaryData]
 
+# Fields a document needs for its claim to pass validation, with the names used in messages
+REQUIRED_FIELDS: Dict[type, Dict[str, str]] = {
+    BillData: {"hospital_name": "hospital name", "total_amount": "total amount", "date_of_service": "date of service"},
+    DischargeSummaryData: {
+        "patient_name": "patient name", "diagnosis": "diagnosis",
+        "admission_date": "admission date", "discharge_date": "discharge date",
+    },
+}
+
+def missing_required_fields(data: DocumentSpecificData) -> List[str]:
+    """
+    Returns the required fields of the extracted data that are empty.
+    """
+    return [field for field in REQUIRED_FIELDS[type(data)] if not getattr(data, field)]
+
 class ProcessedDocument(BaseModel):
     """Schema for a single processed document, including its type and extracted structured data."""
     type: DocumentType = Field(..., description="The classified type of the document.")
     data: Optional[DocumentSpecificData] = Field(None, description="Structured data extracted from the document.")
-    raw_text: str = Field(..., description="The raw text extracted from the PDF document.")
+    raw_text: Optional[str] = Field(None, description="The raw text extracted from the PDF document (see RawTextMode).")
     filename: str = Field(..., description="The original filename of the document.")
+    raw_text_length: Optional[int] = Field(None, description="Length of the full raw text, when it was omitted, truncated or hashed.")
+    raw_text_sha256: Optional[str] = Field(None, description="SHA-256 of the full raw text, when it was omitted, truncated or hashed.")
+    raw_text_truncated: bool = Field(False, description="Whether raw_text was cut to the requested length.")
+    error: Optional[str] = Field(None, description="Why the document could not be processed, e.g. the LLM provider was degraded.")
 
 class ValidationResult(BaseModel):
     """Schema for the validation outcome of all processed documents."""
@@ -42,11 +68,62 @@ class ValidationResult(BaseModel):
 
 class ClaimDecision(BaseModel):
     """Schema for the final claim decision."""
-    status: str = Field(..., description="The status of the claim (e.g., 'approved', 'rejected').")
+    status: str = Field(..., description="The status of the claim: 'approved', 'rejected', or 'provider_degraded' when the LLM provider could not process every document.")
     reason: str = Field(..., description="The reason for the claim decision.")
 
 class ClaimProcessingResponse(BaseModel):
     """Overall response schema for the claim processing endpoint."""
     documents: List[ProcessedDocument] = Field(..., description="List of all processed documents with their extracted data.")
     validation: ValidationResult = Field(..., description="Result of the validation checks.")
-    claim_decision: ClaimDecision = Field(..., description="The final decision regarding the claim.")
\ No newline at end of file
+    claim_decision: ClaimDecision = Field(..., description="The final decision regarding the claim.")
+
+class ClaimJobStatus(BaseModel):
+    """Status of an asynchronous claim processing job."""
+    job_id: str = Field(..., description="Identifier of the job.")
+    tenant_id: str = Field(..., description="Tenant (e.g. TPA) that submitted the claim.")
+    status: str = Field(..., description="One of 'queued', 'running', 'succeeded' or 'failed'.")
+    attempts: int = Field(..., description="Number of processing attempts made so far.")
+    max_attempts: int = Field(..., description="Maximum number of processing attempts.")
+    created_at: float = Field(..., description="Submission time as a Unix timestamp.")
+    updated_at: float = Field(..., description="Time of the last status change as a Unix timestamp.")
+    error: Optional[str] = Field(None, description="Error from the most recent failed attempt, if any.")
+
+class BulkClaimSubmissionResponse(BaseModel):
+    """Response for a bulk claim submission: one job per claim, in submission order."""
+    jobs: List[ClaimJobStatus] = Field(..., description="The queued jobs.")
+
+class ClaimStreamEvent(BaseModel):
+    """
+    One record of a streamed claim response: a 'document' as soon as it is processed (in completion
+    order, with its upload index), then 'validation' and 'claim_decision', or 'error' if processing failed.
+    """
+    event: str = Field(..., description="One of 'document', 'validation', 'claim_decision' or 'error'.")
+    index: Optional[int] = Field(None, description="Position of the document in the upload.")
+    document: Optional[ProcessedDocument] = None
+    validation: Optional[ValidationResult] = None
+    claim_decision: Optional[ClaimDecision] = None
+    detail: Optional[str] = Field(None, description="Error message for 'error' records.")
+
+class ClaimSessionDocument(BaseModel):
+    """A document held by a claim session, with the hash used to spot unchanged re-uploads."""
+    sha256: str = Field(..., description="SHA-256 of the uploaded file.")
+    document: ProcessedDocument
+
+class ClaimSession(BaseModel):
+    """Stored state of a claim session: its current documents and latest assessment."""
+    session_id: str
+    claim_id: str = Field(..., description="Claim identifier used for duplicate bill detection.")
+    created_at: float
+    updated_at: float
+    documents: List[ClaimSessionDocument] = Field(default_factory=list)
+    validation: Optional[ValidationResult] = None
+    claim_decision: Optional[ClaimDecision] = None
+
+class ClaimSessionResponse(ClaimProcessingResponse):
+    """Claim processing response for a session, listing which documents this request processed."""
+    session_id: str = Field(..., description="Identifier of the claim session.")
+    processed: List[str] = Field(default_factory=list, description="Filenames run through the pipeline by this request.")
+    reused: List[str] = Field(
+        default_factory=list,
+        description="Filenames whose earlier results this request kept unchanged; failed documents are never reused.",
+    )
@@ -0,0 +1,78 @@
+# tests/test_claim_sessions.py
+import asyncio
+import io
+
+from fastapi import UploadFile
+
+from claim_sessions import ClaimSessionManager
+from orchestrator import ClaimOrchestrator
+from schemas import BillData, DischargeSummaryData, DocumentType, ProcessedDocument
+from uploads import SpooledUpload
+
+BILL = ProcessedDocument(
+    type=DocumentType.BILL,
+    data=BillData(hospital_name="City Hospital", total_amount=125000.0, date_of_service="2025-02-03"),
+    filename="bill.pdf",
+)
+DISCHARGE = ProcessedDocument(
+    type=DocumentType.DISCHARGE_SUMMARY,
+    data=DischargeSummaryData(
+        patient_name="Asha Rao", diagnosis="Dengue fever", admission_date="2025-02-03", discharge_date="2025-02-07"
+    ),
+    filename="discharge.pdf",
+)
+
+def _manager(degraded):
+    """
+    Session manager whose pipeline returns fixed documents; filenames in `degraded` fail once.
+    """
+    orchestrator = ClaimOrchestrator()
+    documents = {document.filename: document for document in (BILL, DISCHARGE)}
+    calls = []
+
+    async def process_single_document(upload: SpooledUpload) -> ProcessedDocument:
+        calls.append(upload.filename)
+        if upload.filename in degraded:
+            degraded.remove(upload.filename)
+            return ProcessedDocument(type=DocumentType.UNKNOWN, filename=upload.filename, error="Provider degraded.")
+        return documents[upload.filename].model_copy(update={"filename": upload.filename})
+
+    orchestrator._process_single_document = process_single_document
+    return ClaimSessionManager(orchestrator), calls
+
+def _files(*filenames):
+    return [UploadFile(file=io.BytesIO(filename.split(".")[0].encode("utf-8")), filename=filename) for filename in filenames]
+
+def test_only_documents_kept_from_earlier_requests_are_reported_as_reused():
+    manager, calls = _manager(degraded=[])
+
+    async def run():
+        created = await manager.create(_files("bill.pdf"))
+        assert (created.processed, created.reused) == (["bill.pdf"], [])
+        updated = await manager.update(created.session_id, _files("discharge.pdf"))
+        assert (updated.processed, updated.reused) == (["discharge.pdf"], ["bill.pdf"])
+        assert updated.claim_decision.status == "approved"
+        # Uploading unchanged bytes reuses the earlier result
+        resubmitted = await manager.update(created.session_id, _files("bill.pdf"), remove=["discharge.pdf"])
+        assert (resubmitted.processed, resubmitted.reused) == ([], ["bill.pdf"])
+
+    asyncio.run(run())
+    assert calls == ["bill.pdf", "discharge.pdf"]
+
+def test_failed_documents_are_never_reused():
+    manager, calls = _manager(degraded=["discharge.pdf"])
+
+    async def run():
+        created = await manager.create(_files("bill.pdf", "discharge.pdf"))
+        assert created.claim_decision.status == "provider_degraded"
+        # Not reported as reused while it stays in the session
+        kept = await manager.update(created.session_id, remove=[])
+        assert (kept.processed, kept.reused) == ([], ["bill.pdf"])
+        assert kept.claim_decision.status == "provider_degraded"
+        # Uploading the same bytes again processes the document instead of reusing the failure
+        retried = await manager.update(created.session_id, _files("discharge.pdf"))
+        assert (retried.processed, retried.reused) == (["discharge.pdf"], ["bill.pdf"])
+        assert retried.claim_decision.status == "approved"
+
+    asyncio.run(run())
+    assert calls == ["bill.pdf", "discharge.pdf", "discharge.pdf"]
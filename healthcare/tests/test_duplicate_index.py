@@ -0,0 +1,73 @@
+# tests/test_duplicate_index.py
+from duplicate_index import DuplicateIndex, bill_key, simhash
+from schemas import BillData
+
+FINGERPRINT = 0x9E3779B97F4A7C15
+
+BILL_TEXT = " ".join(
+    f"{service} charges for day {day} amount {day * 1250}.00"
+    for day in range(1, 9)
+    for service in ("room", "nursing")
+) + " city hospital final bill grand total 1,25,000.00 patient asha rao"
+
+def _flip(fingerprint: int, *bits: int) -> int:
+    for bit in bits:
+        fingerprint ^= 1 << bit
+    return fingerprint
+
+def test_fingerprint_within_max_distance_is_found_through_the_lsh_bands():
+    index = DuplicateIndex(max_distance=4)
+    index.add_many([("C-1", "bill.pdf", None, FINGERPRINT)])
+    # Four flipped bits, each in a different band; the fifth band still matches
+    matches = index.find(None, _flip(FINGERPRINT, 0, 13, 26, 39))
+    assert [(match.kind, match.claim_id, match.distance) for match in matches] == [("near", "C-1", 4)]
+
+def test_fingerprint_beyond_max_distance_is_not_found():
+    index = DuplicateIndex(max_distance=4)
+    index.add_many([("C-1", "bill.pdf", None, FINGERPRINT)])
+    # One flipped bit in every band: no band is shared
+    assert index.find(None, _flip(FINGERPRINT, 0, 13, 26, 39, 52)) == []
+    # Five flipped bits in one band: that band is shared but the distance is too large
+    assert index.find(None, _flip(FINGERPRINT, 0, 1, 2, 3, 4)) == []
+
+def test_lightly_edited_bill_text_is_a_near_duplicate():
+    index = DuplicateIndex()
+    index.add_many([("C-1", "bill.pdf", None, simhash(BILL_TEXT))])
+    edited = BILL_TEXT.replace("patient asha rao", "patient asha k rao")
+    matches = index.find(None, simhash(edited))
+    assert [(match.kind, match.claim_id) for match in matches] == [("near", "C-1")]
+
+    other = " ".join(f"pharmacy item {item} quantity {item % 3 + 1} rate {item * 40}" for item in range(1, 20))
+    assert index.find(None, simhash(other)) == []
+
+def test_short_text_is_not_fingerprinted():
+    assert simhash("city hospital final bill") is None
+
+def test_bill_key_ignores_hospital_name_noise():
+    first = BillData(hospital_name="Max Hospitals Pvt. Ltd. (Saket)", total_amount=125000, date_of_service="2025-02-03")
+    second = BillData(hospital_name="MAX HOSPITAL", total_amount=125000.0, date_of_service="2025-02-03")
+    assert bill_key(first) == bill_key(second) == "max hospital|125000.00|2025-02-03"
+    assert bill_key(BillData(hospital_name="Max Hospital", total_amount=125000.0)) is None
+
+def test_claims_own_bills_are_not_duplicates():
+    index = DuplicateIndex()
+    key = "city hospital|125000.00|2025-02-03"
+    assert index.find_and_add("C-1", [("bill.pdf", key, FINGERPRINT)]) == [[]]
+    # Re-validating the same claim neither matches nor re-indexes its bill
+    assert index.find_and_add("C-1", [("bill.pdf", key, FINGERPRINT)]) == [[]]
+    assert index.stats()["bills"] == 1
+    [[exact]] = index.find_and_add("C-2", [("copy.pdf", key, FINGERPRINT)])
+    assert (exact.kind, exact.claim_id, exact.filename) == ("exact", "C-1", "bill.pdf")
+
+def test_sqlite_index_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "duplicates.sqlite3")
+    first, second = DuplicateIndex(path), DuplicateIndex(path)
+    try:
+        first.add_many([("C-1", "bill.pdf", None, FINGERPRINT)])
+        assert [match.claim_id for match in second.find(None, _flip(FINGERPRINT, 7))] == ["C-1"]
+    finally:
+        first.close()
+        second.close()
+    reopened = DuplicateIndex(path)
+    assert reopened.stats()["bills"] == 1
+    reopened.close()
@@ -0,0 +1,62 @@
+# tests/test_duplicate_resubmission.py
+import asyncio
+
+from duplicate_index import DuplicateIndex
+from orchestrator import ClaimOrchestrator
+from schemas import BillData, DischargeSummaryData, DocumentType, ProcessedDocument
+from uploads import SpooledUpload
+
+BILL = ProcessedDocument(
+    type=DocumentType.BILL,
+    data=BillData(hospital_name="City Hospital", total_amount=125000.0, date_of_service="2025-02-03"),
+    raw_text="City Hospital final bill grand total 1,25,000.00 date of service 03/02/2025",
+    filename="bill.pdf",
+)
+DISCHARGE = ProcessedDocument(
+    type=DocumentType.DISCHARGE_SUMMARY,
+    data=DischargeSummaryData(
+        patient_name="Asha Rao", diagnosis="Dengue fever", admission_date="2025-02-03", discharge_date="2025-02-07"
+    ),
+    raw_text="Discharge summary Asha Rao dengue fever admitted 03/02/2025 discharged 07/02/2025",
+    filename="discharge.pdf",
+)
+
+def _orchestrator() -> ClaimOrchestrator:
+    orchestrator = ClaimOrchestrator(duplicate_index=DuplicateIndex())
+    documents = {document.filename: document for document in (BILL, DISCHARGE)}
+
+    async def process_single_document(upload: SpooledUpload) -> ProcessedDocument:
+        return documents[upload.filename]
+
+    orchestrator._process_single_document = process_single_document
+    return orchestrator
+
+def _submit(orchestrator: ClaimOrchestrator, tmp_path, filenames, claim_id=None):
+    uploads = []
+    for filename in filenames:
+        path = tmp_path / filename
+        path.write_bytes(filename.encode("utf-8"))
+        uploads.append(SpooledUpload(filename, str(path), path.stat().st_size, filename, owned=False))
+    return asyncio.run(orchestrator.process_claim(uploads, claim_id)).claim_decision
+
+def test_unnamed_claim_missing_a_document_is_accepted_when_resubmitted_complete(tmp_path):
+    orchestrator = _orchestrator()
+    rejected = _submit(orchestrator, tmp_path, ["bill.pdf"])
+    assert rejected.status == "rejected"
+    assert "discharge_summary" in rejected.reason
+
+    accepted = _submit(orchestrator, tmp_path, ["bill.pdf", "discharge.pdf"])
+    assert accepted.status == "approved", accepted.reason
+
+def test_named_claim_resubmitted_with_the_missing_document_is_accepted(tmp_path):
+    orchestrator = _orchestrator()
+    assert _submit(orchestrator, tmp_path, ["bill.pdf"], claim_id="C-1").status == "rejected"
+    accepted = _submit(orchestrator, tmp_path, ["bill.pdf", "discharge.pdf"], claim_id="C-1")
+    assert accepted.status == "approved", accepted.reason
+
+def test_bill_reused_under_another_claim_id_is_flagged(tmp_path):
+    orchestrator = _orchestrator()
+    assert _submit(orchestrator, tmp_path, ["bill.pdf", "discharge.pdf"], claim_id="C-1").status == "approved"
+    flagged = _submit(orchestrator, tmp_path, ["bill.pdf", "discharge.pdf"], claim_id="C-2")
+    assert flagged.status == "rejected"
+    assert "of claim C-1" in flagged.reason
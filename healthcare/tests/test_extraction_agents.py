@@ -0,0 +1,45 @@
+# tests/test_extraction_agents.py
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from agents.bill_agent import BillAgent
+from agents.discharge_agent import DischargeAgent
+
+class FakeLLMClient:
+    """Answers every structured request with a fixed response and records the prompts."""
+    model_name = "fake-model"
+
+    def __init__(self, response: Dict[str, Any]):
+        self.response = response
+        self.prompts: List[str] = []
+
+    async def generate_structured_json(self, prompt: str, schema: Dict[str, Any], model_name: Optional[str] = None) -> Dict[str, Any]:
+        self.prompts.append(prompt)
+        return dict(self.response)
+
+def test_bill_agent_normalises_llm_date_and_amount():
+    llm_client = FakeLLMClient(
+        {"hospital_name": "City Hospital", "total_amount": "Rs. 1,23,456.00", "date_of_service": "03/02/2025"}
+    )
+    bill = asyncio.run(BillAgent(llm_client).process("A bill without any recognisable labels"))
+    assert llm_client.prompts
+    assert bill.total_amount == 123456.0
+    assert bill.date_of_service == "2025-02-03"
+
+def test_bill_agent_keeps_rule_value_when_llm_date_does_not_parse():
+    llm_client = FakeLLMClient({"total_amount": 4500, "date_of_service": "sometime in February"})
+    agent = BillAgent(llm_client, rule_confidence_threshold=0.8)
+    bill = asyncio.run(agent.process("CITY HOSPITAL\nAdmission Date: 3 Feb 2025\n"))
+    assert "Date of Service" in llm_client.prompts[0]
+    assert bill.total_amount == 4500
+    # The admission-date match is below the threshold, so it only fills in for the LLM
+    assert bill.date_of_service == "2025-02-03"
+
+def test_discharge_agent_normalises_llm_dates():
+    llm_client = FakeLLMClient({
+        "patient_name": "Asha Rao", "diagnosis": "Dengue fever",
+        "admission_date": "3rd Feb 2025", "discharge_date": "07.02.2025",
+    })
+    summary = asyncio.run(DischargeAgent(llm_client).process("A summary without any recognisable labels"))
+    assert summary.admission_date == "2025-02-03"
+    assert summary.discharge_date == "2025-02-07"
@@ -0,0 +1,158 @@
+# tests/test_llm_resilience.py
+import asyncio
+import json
+import time
+import types
+
+import httpx
+import pytest
+
+import llm_resilience
+from ai_client import LLMClient
+from llm_resilience import CircuitBreaker, ProviderDegradedError
+
+MODEL = "gemini-2.0-flash"
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(llm_resilience, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+def _gemini_response(data) -> httpx.Response:
+    return httpx.Response(200, json={"candidates": [{"content": {"parts": [{"text": json.dumps(data)}]}}]})
+
+def _client(handler, **kwargs) -> LLMClient:
+    client = LLMClient(api_url_base="http://llm.test/v1beta/models", retry_base_seconds=0.0, **kwargs)
+    client._http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, recovery_seconds=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()  # a success resets the count
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.retry_after() == 30.0
+    assert breaker.stats()["rejected_calls"] == 1
+
+def test_half_open_breaker_closes_after_a_successful_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_seconds=30)
+    breaker.record_failure()
+    clock.now += 29.9
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now += 0.1
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # one probe at a time
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+def test_half_open_breaker_reopens_after_a_failed_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_seconds=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_after() == 30.0
+    assert breaker.stats()["times_opened"] == 2
+
+def test_half_open_breaker_lets_a_new_probe_through_when_the_last_never_reported(clock):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_seconds=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    clock.now += 30
+    assert breaker.allow()
+
+def test_open_circuit_fails_calls_without_reaching_the_provider():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        return httpx.Response(503)
+
+    async def run():
+        client = _client(handler, max_retries=1, circuit_breaker_factory=lambda: CircuitBreaker(failure_threshold=2))
+        try:
+            with pytest.raises(ProviderDegradedError, match="after 2 attempts"):
+                await client.generate_structured_json("prompt", {"type": "object"})
+            with pytest.raises(ProviderDegradedError, match="circuit"):
+                await client.generate_structured_json("prompt", {"type": "object"})
+            # Each model has its own breaker
+            with pytest.raises(ProviderDegradedError, match="after 2 attempts"):
+                await client.generate_structured_json("prompt", {"type": "object"}, model_name="other-model")
+            return client.circuit_stats()
+        finally:
+            await client.aclose()
+
+    stats = asyncio.run(run())
+    assert len(calls) == 4
+    assert stats[MODEL]["state"] == CircuitBreaker.OPEN
+    assert stats[MODEL]["rejected_calls"] == 1
+    assert stats["other-model"]["state"] == CircuitBreaker.OPEN
+
+def _hedging_client(handler) -> LLMClient:
+    client = _client(handler, hedge_percentile=0.5, hedge_min_delay_seconds=0.05)
+    for _ in range(20):
+        client._latency_tracker(MODEL).record(0.05)
+    return client
+
+def test_slow_attempt_is_hedged_and_the_first_answer_wins():
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            await asyncio.sleep(2.0)
+            return _gemini_response({"answer": "primary"})
+        return _gemini_response({"answer": "hedge"})
+
+    async def run():
+        client = _hedging_client(handler)
+        started = time.monotonic()
+        try:
+            return await client.generate_structured_json("prompt", {"type": "object"}), time.monotonic() - started
+        finally:
+            await client.aclose()
+
+    result, elapsed = asyncio.run(run())
+    assert result == {"answer": "hedge"}
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.05
+    assert elapsed < 1.0
+
+def test_fast_attempt_is_not_hedged():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return _gemini_response({"answer": "primary"})
+
+    async def run():
+        client = _hedging_client(handler)
+        try:
+            result = await client.generate_structured_json("prompt", {"type": "object"})
+            await asyncio.sleep(0.1)
+            return result
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()) == {"answer": "primary"}
+    assert len(calls) == 1
@@ -0,0 +1,108 @@
+# tests/test_llm_scheduler.py
+import asyncio
+import json
+import time
+import types
+
+import httpx
+
+import llm_scheduler
+from ai_client import LLMClient
+from llm_scheduler import LLMRequestScheduler, RequestClass, RequestStage, TokenBucket, llm_request_class
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+def _gemini_response(data) -> httpx.Response:
+    return httpx.Response(200, json={"candidates": [{"content": {"parts": [{"text": json.dumps(data)}]}}]})
+
+def test_token_bucket_refills_at_its_rate_up_to_capacity(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_scheduler, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    bucket = TokenBucket(rate_per_minute=60)  # one token per second, 60 at most
+
+    bucket.consume(60)
+    assert bucket.wait_time(1) == 1.0
+    clock.now += 0.5
+    assert bucket.wait_time(1) == 0.5
+    clock.now += 0.5
+    assert bucket.wait_time(1) == 0.0
+
+    clock.now += 3600
+    assert bucket.wait_time(60) == 0.0
+    bucket.consume(60)
+    # Requests larger than the bucket wait for a full bucket rather than forever
+    assert bucket.wait_time(500) == 60.0
+
+def test_token_bucket_adjust_debits_actual_usage(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_scheduler, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    bucket = TokenBucket(rate_per_minute=600)  # ten tokens per second
+
+    bucket.consume(600)
+    bucket.adjust(50)  # the call used 50 tokens more than estimated
+    assert bucket.wait_time(10) == 6.0
+
+def test_interactive_requests_are_admitted_before_batch_requests():
+    async def run():
+        scheduler = LLMRequestScheduler(max_concurrency=1)
+        await scheduler.acquire(1)
+        order = []
+
+        async def call(name, request_class, stage):
+            llm_request_class.set(request_class)
+            async with scheduler.slot(1, stage):
+                order.append(name)
+
+        tasks = [
+            asyncio.create_task(call("batch", RequestClass.BATCH, RequestStage.CLASSIFICATION)),
+            asyncio.create_task(call("extraction", RequestClass.INTERACTIVE, RequestStage.EXTRACTION)),
+            asyncio.create_task(call("classification", RequestClass.INTERACTIVE, RequestStage.CLASSIFICATION)),
+        ]
+        await asyncio.sleep(0.01)
+        scheduler.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ["classification", "extraction", "batch"]
+
+def test_pause_holds_back_admissions():
+    async def run():
+        scheduler = LLMRequestScheduler(max_concurrency=4)
+        scheduler.pause(0.2)
+        started = time.monotonic()
+        async with scheduler.slot(1):
+            waited = time.monotonic() - started
+        return waited, scheduler.stats()
+
+    waited, stats = asyncio.run(run())
+    assert waited >= 0.2
+    assert stats["rate_limited_pauses"] == 1
+    assert stats["in_flight"] == 0
+
+def test_rate_limited_response_pauses_the_scheduler_and_is_retried():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"retry-after": "0.2"})
+        return _gemini_response({"ok": True})
+
+    async def run():
+        client = LLMClient(api_url_base="http://llm.test/v1beta/models")
+        client._http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await client.generate_structured_json("prompt", {"type": "object"}), client.scheduler.stats()
+        finally:
+            await client.aclose()
+
+    result, stats = asyncio.run(run())
+    assert result == {"ok": True}
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.2
+    assert stats["rate_limited_pauses"] == 1
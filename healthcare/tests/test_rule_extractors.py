@@ -0,0 +1,54 @@
+# tests/test_rule_extractors.py
+import pytest
+
+from rule_extractors import (
+    PARTIAL_AMOUNT_CONFIDENCE, FieldCandidate, bill_extractor, normalize_date, normalize_llm_values, parse_amount,
+    parse_amount_token,
+)
+
+@pytest.mark.parametrize("text, expected", [
+    ("Grand Total: 1,23,456.00", 123456.0),
+    ("Grand Total: 12,34,567.50", 1234567.5),
+    ("Grand Total: 1,234,567.50", 1234567.5),
+    ("Grand Total: 123,456", 123456.0),
+    ("Rs. 4500", 4500.0),
+    ("no amount here", None),
+])
+def test_parse_amount_accepts_indian_and_western_grouping(text, expected):
+    assert parse_amount(text) == expected
+
+def test_irregularly_grouped_amount_is_a_low_confidence_candidate():
+    assert parse_amount_token("1,23,456.00") == 123456.0
+    partial = parse_amount_token("12,3456.00")
+    assert isinstance(partial, FieldCandidate) and partial.confidence == PARTIAL_AMOUNT_CONFIDENCE
+
+@pytest.mark.parametrize("text, expected", [
+    ("2025-02-03", "2025-02-03"),
+    ("03/02/2025", "2025-02-03"),
+    ("03.02.25", "2025-02-03"),
+    ("12/25/2025", "2025-12-25"),
+    ("3rd Feb 2025", "2025-02-03"),
+    ("Discharge02-Feb-2025 10:30", "2025-02-02"),
+    ("February 3, 2025", "2025-02-03"),
+    ("31/02/2025", None),
+    ("not a date", None),
+])
+def test_normalize_date_reads_numeric_dates_day_first(text, expected):
+    assert normalize_date(text) == expected
+
+def test_bill_rules_find_indian_total_and_day_first_date():
+    candidates = bill_extractor().extract(
+        "SIR GANGA RAM HOSPITAL\nBill Date: 03/02/2025\nNet Payable (Rs.): 1,23,456.00\n"
+    )
+    assert candidates["total_amount"].value == 123456.0
+    assert candidates["date_of_service"].value == "2025-02-03"
+    assert candidates["hospital_name"].value == "SIR GANGA RAM HOSPITAL"
+
+def test_normalize_llm_values_parses_dates_and_amounts_like_the_rules():
+    values = normalize_llm_values({
+        "hospital_name": "City Hospital", "total_amount": "Rs. 1,23,456.00", "date_of_service": "03/02/2025",
+    })
+    assert values == {"hospital_name": "City Hospital", "total_amount": 123456.0, "date_of_service": "2025-02-03"}
+    assert normalize_llm_values({"total_amount": 4500, "admission_date": "unknown", "discharge_date": None}) == {
+        "total_amount": 4500, "admission_date": None, "discharge_date": None,
+    }
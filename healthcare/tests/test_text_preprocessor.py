@@ -0,0 +1,36 @@
+# tests/test_text_preprocessor.py
+import os
+
+from pdf_parser import PAGE_SEPARATOR, LazyPDFDocument
+from text_preprocessor import TextPreprocessor
+
+TEST_PDF = os.path.join(
+    os.path.dirname(__file__), "..", "..", "test_pdfs", "25020602669-2_20250427_120745-yashodha.pdf"
+)
+
+def test_raw_text_has_no_page_separators():
+    document = LazyPDFDocument(TEST_PDF)
+    try:
+        pages = list(document.iter_pages())
+        assert document.text() == "".join(pages)
+        assert "\f" not in document.text()
+        assert document.text(separator=PAGE_SEPARATOR).count("\f") == len(pages) - 1
+    finally:
+        document.close()
+
+def test_lines_on_several_pages_are_kept_once():
+    page = "City Hospital\nFinal Bill\nRoom Charges 500\nTotal 500"
+    text = PAGE_SEPARATOR.join([page] * 3)
+    lines = TextPreprocessor("test", max_tokens=None).compact(text).text.splitlines()
+    assert lines.count("City Hospital") == 1
+    assert lines.count("Room Charges 500") == 1
+
+def test_lines_repeated_on_one_page_are_kept():
+    page = "City Hospital\nRoom Charges 500\nRoom Charges 500\nRoom Charges 500\nTotal 1500"
+    lines = TextPreprocessor("test", max_tokens=None).compact(page).text.splitlines()
+    assert lines.count("Room Charges 500") == 3
+
+def test_pages_do_not_fuse_lines():
+    text = PAGE_SEPARATOR.join(["Page one ends here", "Page two starts here"])
+    lines = TextPreprocessor("test", max_tokens=None).compact(text).text.splitlines()
+    assert lines == ["Page one ends here", "Page two starts here"]
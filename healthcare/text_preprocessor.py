@@ -0,0 +1,183 @@
+# text_preprocessor.py
+import re
+from typing import Dict, List, NamedTuple, Optional, Pattern, Sequence, Set, Tuple
+
+from llm_scheduler import estimate_tokens
+from metrics import PROMPT_TEXT_TOKENS_TOTAL
+
+_SPACE_RUN = re.compile(r"[^\S\n]+")
+_LETTER = re.compile(r"[a-z]")
+# Page texts are joined with a form feed (see pdf_parser.PAGE_SEPARATOR)
+_PAGE_BREAK = "\f"
+
+# Lines that never carry a field we extract: page furniture, disclaimers, contact details,
+# separators and pharmacy batch/HSN detail lines
+BOILERPLATE_PATTERNS: List[Pattern] = [re.compile(pattern) for pattern in (
+    r"^page\s*\d+\s*(?:of|/)\s*\d+",
+    r"^[\W_]+$",
+    r"computer[\s-]*generated",
+    r"does\s*not\s*require\s*(?:a\s*)?signature",
+    r"authori[sz]ed\s*signatory",
+    r"^e\.?\s*&\s*o\.?\s*e",
+    r"terms\s*(?:and|&)\s*conditions",
+    r"^disclaimer\b",
+    r"^(?:ph(?:one)?|tel|fax|mob(?:ile)?|e-?mail|website|web|www\.)\b",
+    r"^(?:gstin|cin|pan|sac\s*code|hsn)\b",
+    r"^\(?\s*(?:batch|hsn)\s*[:(]",
+)]
+
+# (pattern, weight) per agent: lines matching these are kept first when trimming to the budget
+BILL_SECTION_RULES: List[Tuple[str, float]] = [
+    (r"grand\s*total|net\s*payable|amount\s*payable|total\s*payable|net\s*amount|bill\s*amount|total\s*bill|total\s*amount", 3.0),
+    (r"hospital|medical\s*cent(?:re|er)|medicity|nursing\s*home|clinic", 2.0),
+    (r"bill\s*date|invoice\s*date|date\s*of\s*service|service\s*date|admission\s*date|date\s*of\s*admission|\bdoa\b", 2.0),
+    (r"\btotal\b|\bdate\b|bill\s*no|invoice", 1.0),
+]
+
+DISCHARGE_SECTION_RULES: List[Tuple[str, float]] = [
+    (r"diagnosis", 3.0),
+    (r"patient'?s?\s*name|^name\b", 3.0),
+    (r"admission|admitted|\bdoa\b|discharge\s*date|date\s*of\s*discharge|discharged\s*on|\bdod\b", 3.0),
+    (r"\bdate\b|\bage\b", 1.0),
+]
+
+class CompactText(NamedTuple):
+    """Compacted text with its estimated token counts before and after compaction."""
+    text: str
+    tokens_before: int
+    tokens_after: int
+
+class TextPreprocessor:
+    """
+    Shrinks document text before it goes into an LLM prompt:
+
+    1. collapses runs of whitespace and drops blank lines;
+    2. keeps only the first copy of lines found on `min_pages` or more pages (page headers and
+       footers, letterhead), ignoring number- and date-only lines, which are usually data; lines
+       repeated within one page, such as itemised charges, are left alone;
+    3. drops boilerplate lines (page numbers, disclaimers, contact details, separators);
+    4. if the text is still over `max_tokens`, keeps the first `head_lines` lines (letterhead and
+       patient block), then the lines around the highest-weighted `section_rules` matches, then
+       the rest from the top until the budget is spent; lines are emitted in document order with
+       "..." marking what was cut.
+
+    Rule-based extraction should keep running on the full text; this is only for prompts.
+    """
+    def __init__(
+        self,
+        name: str,
+        section_rules: Sequence[Tuple[str, float]] = (),
+        max_tokens: Optional[int] = 3000,
+        head_lines: int = 12,
+        context_before: int = 1,
+        context_after: int = 2,
+        min_pages: int = 3,
+    ):
+        self.name = name
+        self.section_rules = [(re.compile(pattern), weight) for pattern, weight in section_rules]
+        self.max_tokens = max_tokens
+        self.head_lines = head_lines
+        self.context_before = context_before
+        self.context_after = context_after
+        self.min_pages = min_pages
+        self.stats = {"documents": 0, "trimmed": 0, "tokens_before": 0, "tokens_after": 0}
+
+    def _clean_lines(self, text: str) -> List[str]:
+        pages = []
+        for page in text.split(_PAGE_BREAK):
+            lines = [_SPACE_RUN.sub(" ", line).strip() for line in page.splitlines()]
+            pages.append([line for line in lines if line])
+
+        # Number of distinct pages each line is on
+        page_counts: Dict[str, int] = {}
+        for lines in pages:
+            for key in {line.lower() for line in lines}:
+                page_counts[key] = page_counts.get(key, 0) + 1
+        seen: Set[str] = set()
+        kept = []
+        for lines in pages:
+            for line in lines:
+                key = line.lower()
+                if page_counts[key] >= self.min_pages and len(_LETTER.findall(key)) >= 4:
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                if any(pattern.search(key) for pattern in BOILERPLATE_PATTERNS):
+                    continue
+                kept.append(line)
+        return kept
+
+    def _trim(self, lines: List[str], max_tokens: int) -> Tuple[List[str], bool]:
+        # One extra token per line covers the newline and any "..." marker
+        costs = [estimate_tokens(line) + 1 for line in lines]
+        if sum(costs) <= max_tokens:
+            return lines, False
+
+        # Windows around section matches, strongest first and earliest first among equals
+        windows: List[Tuple[float, int]] = []
+        for index, line in enumerate(lines):
+            key = line.lower()
+            weight = max((weight for pattern, weight in self.section_rules if pattern.search(key)), default=0.0)
+            if weight > 0:
+                windows.append((weight, index))
+        windows.sort(key=lambda window: (-window[0], window[1]))
+
+        selected: Set[int] = set()
+        budget = max_tokens
+        spans = [range(min(self.head_lines, len(lines)))] + [
+            range(max(0, index - self.context_before), min(len(lines), index + self.context_after + 1))
+            for _, index in windows
+        ]
+        # Whatever budget is left goes to the remaining lines in document order
+        spans.append(range(len(lines)))
+        for span in spans:
+            for index in span:
+                if index in selected:
+                    continue
+                cost = costs[index]
+                if cost > budget:
+                    break
+                selected.add(index)
+                budget -= cost
+            if budget <= 0:
+                break
+
+        trimmed: List[str] = []
+        previous = -1
+        for index in sorted(selected):
+            if index != previous + 1:
+                trimmed.append("...")
+            trimmed.append(lines[index])
+            previous = index
+        return trimmed, True
+
+    def compact(self, text: str, max_tokens: Optional[int] = None) -> CompactText:
+        """
+        Returns the compacted text and its token counts before and after. `max_tokens` overrides
+        the preprocessor's budget for this call.
+        """
+        tokens_before = estimate_tokens(text)
+        lines = self._clean_lines(text)
+        budget = max_tokens if max_tokens is not None else self.max_tokens
+        trimmed = False
+        if budget is not None:
+            lines, trimmed = self._trim(lines, budget)
+        compacted = "\n".join(lines)
+        tokens_after = estimate_tokens(compacted)
+
+        self.stats["documents"] += 1
+        self.stats["trimmed"] += int(trimmed)
+        self.stats["tokens_before"] += tokens_before
+        self.stats["tokens_after"] += tokens_after
+        PROMPT_TEXT_TOKENS_TOTAL.inc(tokens_before, agent=self.name, stage="before")
+        PROMPT_TEXT_TOKENS_TOTAL.inc(tokens_after, agent=self.name, stage="after")
+        return CompactText(compacted, tokens_before, tokens_after)
+
+def bill_preprocessor(max_tokens: Optional[int] = 3000) -> TextPreprocessor:
+    return TextPreprocessor("bill", BILL_SECTION_RULES, max_tokens)
+
+def discharge_preprocessor(max_tokens: Optional[int] = 3000) -> TextPreprocessor:
+    return TextPreprocessor("discharge_summary", DISCHARGE_SECTION_RULES, max_tokens)
+
+def combined_preprocessor(max_tokens: Optional[int] = 4000) -> TextPreprocessor:
+    return TextPreprocessor("combined", BILL_SECTION_RULES + DISCHARGE_SECTION_RULES, max_tokens)
@@ -0,0 +1,131 @@
+# uploads.py
+import asyncio
+import hashlib
+import os
+import tempfile
+from typing import Any, BinaryIO, Iterable, List, Optional, Tuple, Union
+from fastapi import UploadFile
+
+CHUNK_SIZE = 1024 * 1024
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds the per-file or per-request size limit."""
+
+class SpooledUpload:
+    """
+    An uploaded file spooled to disk. Parsers open it by `path`, so the bytes never have to
+    sit in the API process's memory, and `sha256` was computed while the upload streamed in.
+    """
+    __slots__ = ("filename", "path", "size", "sha256", "owned")
+
+    def __init__(self, filename: str, path: str, size: int, sha256: str, owned: bool = True):
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        # Owned files are temporary and deleted by `UploadSpooler.remove`
+        self.owned = owned
+
+    @classmethod
+    async def from_path(cls, path: str, filename: Optional[str] = None) -> "SpooledUpload":
+        """
+        Wraps a file that is already on disk (e.g. a queued job's file) without copying it.
+        """
+        size, digest = await asyncio.to_thread(_hash_file, path)
+        return cls(filename or os.path.basename(path), path, size, digest, owned=False)
+
+def _hash_file(path: str) -> Tuple[int, str]:
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
+def _write_chunk(out: BinaryIO, digest: Any, chunk: bytes) -> None:
+    digest.update(chunk)
+    out.write(chunk)
+
+class UploadSpooler:
+    """
+    Streams uploads to temporary files in fixed-size chunks, hashing them on the way, so memory
+    use does not grow with upload size. Files larger than `max_file_bytes`, or requests whose
+    files add up to more than `max_request_bytes`, are rejected with UploadTooLargeError.
+    """
+    def __init__(
+        self,
+        spool_dir: Optional[str] = None,
+        max_file_bytes: int = 50 * 1024 * 1024,
+        max_request_bytes: int = 200 * 1024 * 1024,
+        chunk_size: int = CHUNK_SIZE,
+    ):
+        self.spool_dir = spool_dir
+        self.max_file_bytes = max_file_bytes
+        self.max_request_bytes = max_request_bytes
+        self.chunk_size = chunk_size
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+
+    async def _spool_file(self, file: UploadFile, path: str, request_bytes: int) -> SpooledUpload:
+        filename = file.filename if file.filename else "unknown_file"
+        digest = hashlib.sha256()
+        size = 0
+        # File I/O and hashing run in a worker thread so a slow disk does not stall the event loop
+        out = await asyncio.to_thread(open, path, "wb")
+        try:
+            while chunk := await file.read(self.chunk_size):
+                size += len(chunk)
+                if size > self.max_file_bytes:
+                    raise UploadTooLargeError(
+                        f"File {filename} exceeds the upload limit of {self.max_file_bytes} bytes."
+                    )
+                if request_bytes + size > self.max_request_bytes:
+                    raise UploadTooLargeError(
+                        f"Uploaded files exceed the per-request limit of {self.max_request_bytes} bytes."
+                    )
+                await asyncio.to_thread(_write_chunk, out, digest, chunk)
+        finally:
+            await asyncio.to_thread(out.close)
+        return SpooledUpload(filename, path, size, digest.hexdigest())
+
+    async def spool(self, files: List[UploadFile], directory: Optional[str] = None) -> List[SpooledUpload]:
+        """
+        Spools all files of one request, as `<position>.pdf` in `directory` when given and as
+        temporary files otherwise. Nothing is left on disk if a limit is exceeded.
+        """
+        uploads: List[SpooledUpload] = []
+        request_bytes = 0
+        try:
+            for position, file in enumerate(files):
+                if directory is not None:
+                    path = os.path.join(directory, f"{position}.pdf")
+                else:
+                    fd, path = tempfile.mkstemp(prefix="claim_upload_", suffix=".pdf", dir=self.spool_dir)
+                    os.close(fd)
+                try:
+                    upload = await self._spool_file(file, path, request_bytes)
+                except BaseException:
+                    _unlink(path)
+                    raise
+                uploads.append(upload)
+                request_bytes += upload.size
+        except BaseException:
+            self.remove(uploads)
+            raise
+        return uploads
+
+    @staticmethod
+    def remove(uploads: Iterable[Union[SpooledUpload, UploadFile]]) -> None:
+        """
+        Deletes the temporary files of owned uploads; anything else is left alone.
+        """
+        for upload in uploads:
+            if isinstance(upload, SpooledUpload) and upload.owned:
+                _unlink(upload.path)
+
+def _unlink(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass